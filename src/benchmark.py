@@ -0,0 +1,773 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import io
+import os
+import sys
+import json
+import platform
+import random
+import string
+import filecmp
+import asyncio
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from contextlib import redirect_stdout
+from time import perf_counter
+from itertools import accumulate
+from urllib.parse import urlencode
+
+from definitions import ROOT_DIR
+from classes.reuters import Reuters
+from classes.spimi import SPIMI
+from classes.bm25 import BM25
+from classes.vectorized_bm25 import VectorizedBM25
+from classes.sgml_reader import SGMLReader
+from classes.tokenizer import Tokenizer
+from classes.query import AndQuery, OrQuery
+from classes.compaction import Compaction
+from classes.query_cache import QueryCache
+from classes.stemmed_index import StemmedIndex
+from classes.corpus_generator import CorpusGenerator
+from classes.query_server import QueryServer
+from classes.batch_query import BatchQuery
+from classes.profiler import Profiler
+from main import fan_in
+
+
+def generate_blocks(spimi, number_of_blocks, docs_per_block, tokens_per_doc, vocabulary_size, seed=0):
+    """
+    Write synthetic block files, so that the merge can be timed without parsing the Reuters files.
+    Terms are random strings, drawn with a Zipfian distribution (the n-th most frequent term appears about 1/n as often as
+    the most frequent one), like the words of a real corpus.
+    :param spimi: SPIMI object whose output directory will contain the block files.
+    :param number_of_blocks: number of block files to write.
+    :param docs_per_block: number of documents per block file.
+    :param tokens_per_doc: number of tokens per document.
+    :param vocabulary_size: number of distinct terms.
+    :param seed: seed of the random number generator, so that runs can be compared.
+    :return: list of the block files, in the order in which they were written.
+    """
+    generator = random.Random(seed)
+    vocabulary = ["".join(generator.choices(string.ascii_lowercase, k=generator.randint(2, 12))) for _ in range(vocabulary_size)]
+    cumulative_weights = list(accumulate(1 / rank for rank in range(1, vocabulary_size + 1)))
+
+    block_files = []
+    document_id = 0
+    for _ in range(number_of_blocks):
+        dictionary = {}
+        for _ in range(docs_per_block):
+            document_id += 1
+            term_frequencies = {}
+            for term in generator.choices(vocabulary, cum_weights=cumulative_weights, k=tokens_per_doc):
+                term_frequencies[term] = term_frequencies.get(term, 0) + 1
+            for term, term_frequency in term_frequencies.items():
+                spimi.add_to_postings_list(dictionary.setdefault(term, []), document_id, term_frequency)
+        block_files.append(spimi.write_block(dictionary))
+    return block_files
+
+
+def time_merge(output_directory, merge_workers, arguments):
+    """
+    Generate the block files, then time how long it takes to merge them into an index file.
+    :param output_directory: directory in which block files and the index file will be generated.
+    :param merge_workers: number of processes merging the block files.
+    :param arguments: parsed command line arguments.
+    :return: tuple of (path of the index file, merge time in seconds).
+    """
+    spimi = SPIMI(reuters=None, merge_fan_in=arguments.fan_in, postings_codec=arguments.postings_codec,
+                  merge_workers=merge_workers, output_directory=output_directory)
+    block_files = generate_blocks(spimi, arguments.blocks, arguments.docs, arguments.tokens, arguments.vocabulary)
+
+    start = perf_counter()
+    spimi.merge_blocks(block_files).close()
+    return spimi.output_index, perf_counter() - start
+
+
+def benchmark_merge(arguments):
+    """
+    Compare the merge of the block files done by a single process with the merge done by range of terms, by several
+    processes. Both have to produce the exact same index file.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        serial_index, serial_time = time_merge(os.path.join(directory, "serial"), 1, arguments)
+        parallel_index, parallel_time = time_merge(os.path.join(directory, "parallel"), arguments.merge_workers, arguments)
+
+        print("Serial merge:   %.3f s" % serial_time)
+        print("Parallel merge: %.3f s with %d workers (%d CPU(s) available)"
+              % (parallel_time, arguments.merge_workers, os.cpu_count()))
+        print("Speedup:        %.2fx" % (serial_time / parallel_time))
+        print("Index files are %s." % ("identical" if filecmp.cmp(serial_index, parallel_index, shallow=False) else "DIFFERENT"))
+
+
+def read_with_beautiful_soup(file):
+    """
+    Read the documents of a reuters file the way Reuters.parse_file() used to, with BeautifulSoup.
+    :param file: path of the reuters file.
+    :return: list of tuples of (document ID, text), in the order in which they appear in the file (an empty text for
+             documents without a TEXT tag, like SGMLReader).
+    """
+    from bs4 import BeautifulSoup
+
+    with open(file, encoding="ISO-8859-1") as sgm_file:
+        soup = BeautifulSoup(sgm_file, "html.parser")
+    return [(int(document['newid']), document.find("text").text if document.find("text") else "")
+            for document in soup.find_all("reuters")]
+
+
+def time_reader(reader, reuters_files):
+    """
+    Read every document of the reuters files, keeping track of the time it takes and of the peak memory used.
+    :param reader: function returning an iterable of tuples of (document ID, text) for a reuters file.
+    :param reuters_files: list of paths of the reuters files.
+    :return: tuple of (list of documents, time in seconds, peak memory in bytes).
+    """
+    documents = []
+    peak_memory = 0
+    total_time = 0
+    for file in reuters_files:
+        tracemalloc.start()
+        start = perf_counter()
+        for document in reader(file):
+            documents.append(document)
+        total_time += perf_counter() - start
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return documents, total_time, peak_memory
+
+
+def benchmark_sgml(arguments):
+    """
+    Compare the streaming SGMLReader with the BeautifulSoup reader it replaced. Both have to find the same documents,
+    with the same text, or the exit status is 1. Memory is measured while reading a file, on top of the documents
+    collected so far.
+    """
+    reuters_directory = os.path.join(ROOT_DIR, "reuters21578")
+    reuters_files = sorted(os.path.join(reuters_directory, file) for file in os.listdir(reuters_directory)
+                           if file.endswith(".sgm"))[:arguments.reuters]
+
+    expected_documents, soup_time, soup_memory = time_reader(read_with_beautiful_soup, reuters_files)
+    documents, reader_time, reader_memory = time_reader(SGMLReader, reuters_files)
+
+    print("BeautifulSoup: %.3f s, peak of %s MB per file" % (soup_time, "{:,.2f}".format(soup_memory / 2 ** 20)))
+    print("SGMLReader:    %.3f s, peak of %s MB per file" % (reader_time, "{:,.2f}".format(reader_memory / 2 ** 20)))
+    print("Speedup:       %.2fx" % (soup_time / reader_time))
+
+    mismatches = [document_id for (document_id, text), expected in zip(documents, expected_documents)
+                  if (document_id, text) != expected]
+    if len(documents) != len(expected_documents) or mismatches:
+        print("Documents are DIFFERENT: %d vs. %d documents, first mismatch at NEWID %s."
+              % (len(documents), len(expected_documents), mismatches[0] if mismatches else None))
+        sys.exit(1)
+    else:
+        print("Documents are identical (%s documents)." % "{:,}".format(len(documents)))
+
+
+def time_tokenizer(tokenize, texts):
+    """
+    :param tokenize: function returning the list of tokens of a text.
+    :param texts: list of texts.
+    :return: tuple of (list of lists of tokens, time in seconds).
+    """
+    start = perf_counter()
+    tokens = [tokenize(text) for text in texts]
+    return tokens, perf_counter() - start
+
+
+def compare_tokenizers(name, expected_name, texts, tokens, expected_tokens, tokenizer_time, expected_time, examples):
+    """
+    Print the time two tokenizers took, and whether they split the texts into the same tokens.
+    :param name: name of the tokenizer.
+    :param expected_name: name of the tokenizer it's compared with.
+    :param texts: list of texts.
+    :param tokens: list of lists of tokens of the texts, by the tokenizer.
+    :param expected_tokens: list of lists of tokens of the texts, by the tokenizer it's compared with.
+    :param tokenizer_time: time the tokenizer took, in seconds.
+    :param expected_time: time the tokenizer it's compared with took, in seconds.
+    :param examples: number of mismatching texts printed.
+    :return: True if the tokens are identical.
+    """
+    number_of_tokens = sum(len(text_tokens) for text_tokens in expected_tokens)
+    print("%-22s %.3f s, %s tokens per second" % (expected_name + ":", expected_time, "{:,.0f}".format(number_of_tokens / expected_time)))
+    print("%-22s %.3f s, %s tokens per second" % (name + ":", tokenizer_time, "{:,.0f}".format(number_of_tokens / tokenizer_time)))
+    print("Speedup:               %.2fx" % (expected_time / tokenizer_time))
+
+    mismatches = [number for number, (text_tokens, expected) in enumerate(zip(tokens, expected_tokens)) if text_tokens != expected]
+    if not mismatches:
+        print("Tokens are identical (%s documents, %s tokens).\n" % ("{:,}".format(len(texts)), "{:,}".format(number_of_tokens)))
+        return True
+
+    print("Tokens are DIFFERENT for %s of %s documents." % ("{:,}".format(len(mismatches)), "{:,}".format(len(texts))))
+    for number in mismatches[:examples]:
+        # the first token that differs, with a few tokens of context
+        text_tokens, expected = tokens[number], expected_tokens[number]
+        position = next((position for position, (token, expected_token) in enumerate(zip(text_tokens, expected))
+                         if token != expected_token), min(len(text_tokens), len(expected)))
+        print("    %s: %s" % (name, text_tokens[max(position - 3, 0):position + 4]))
+        print("    %s: %s" % (expected_name, expected[max(position - 3, 0):position + 4]))
+    print()
+    return False
+
+
+def benchmark_tokenizer(arguments):
+    """
+    Compare the regular expressions of Tokenizer with nltk, on the text of the Reuters documents: a document as a single
+    sentence with NLTKWordTokenizer, whose rules they follow to the letter, then with word_tokenize(), which splits
+    sentences with punkt first (if its data is there). The regular expressions start with an empty cache.
+    The exit status is 1 if the tokens of a document differ from the ones of NLTKWordTokenizer. Sentences are only split
+    the way punkt mostly does, so differences with word_tokenize() are only reported.
+    """
+    from nltk.tokenize import NLTKWordTokenizer, word_tokenize
+
+    reuters_directory = os.path.join(ROOT_DIR, "reuters21578")
+    reuters_files = sorted(os.path.join(reuters_directory, file) for file in os.listdir(reuters_directory)
+                           if file.endswith(".sgm"))[:arguments.reuters]
+    texts = [text for file in reuters_files for _, text in SGMLReader(file)]
+
+    expected_tokens, expected_time = time_tokenizer(NLTKWordTokenizer().tokenize, texts)
+    tokens, tokenizer_time = time_tokenizer(Tokenizer().tokenize_sentence, texts)
+    identical = compare_tokenizers("Regular expressions", "NLTKWordTokenizer", texts, tokens, expected_tokens,
+                                   tokenizer_time, expected_time, arguments.examples)
+
+    try:
+        expected_tokens, expected_time = time_tokenizer(word_tokenize, texts)
+    except LookupError:
+        print("word_tokenize() needs the punkt data of nltk, sentences weren't compared.")
+    else:
+        tokens, tokenizer_time = time_tokenizer(Tokenizer().tokenize_with_regex, texts)
+        compare_tokenizers("Regular expressions", "word_tokenize", texts, tokens, expected_tokens, tokenizer_time,
+                           expected_time, arguments.examples)
+
+    if not identical:
+        sys.exit(1)
+
+
+def generate_queries(index, number_of_queries, terms_per_query, seed=0):
+    """
+    Generate OR-style queries out of the terms of an index, favoring terms that appear in many documents, like the
+    words people search for.
+    :param index: IndexReader of the index.
+    :param number_of_queries: number of queries to generate.
+    :param terms_per_query: number of terms per query.
+    :param seed: seed of the random number generator, so that runs can be compared.
+    :return: list of queries.
+    """
+    generator = random.Random(seed)
+    terms = [term for term in index if term.isalpha()]
+    weights = [index.get_document_frequency(term) for term in terms]
+    return [" ".join(generator.choices(terms, weights, k=terms_per_query)) for _ in range(number_of_queries)]
+
+
+def benchmark_bm25(arguments):
+    """
+    Compare the top k documents found by BM25.top_k() with the ones found by scoring every document (compute_bm25()).
+    Both have to find the same documents, with the same scores, in the same order (documents with the same score are
+    ranked by document ID).
+    The whole batch of queries is also ranked by VectorizedBM25, which has to rank the same documents in the same order,
+    with scores that match within float tolerance.
+    Finally, the index is reopened the way a restart would, with the document statistics stored next to it instead of
+    the Reuters files, and has to give the exact same rankings.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        reuters = Reuters(number_of_files=arguments.reuters)
+        with redirect_stdout(io.StringIO()):
+            start = perf_counter()
+            index = SPIMI(reuters=reuters, output_directory=directory).construct_index()
+            build_time = perf_counter() - start
+        bm25 = BM25(reuters=reuters, index=index, n=reuters.number_of_documents)
+        queries = generate_queries(index, arguments.queries, arguments.terms)
+
+        exhaustive_time = 0
+        top_k_time = 0
+        mismatches = 0
+        rankings = []
+        for query in queries:
+            start = perf_counter()
+            with redirect_stdout(io.StringIO()):
+                ranking = bm25.compute_bm25(query)
+            exhaustive_time += perf_counter() - start
+
+            start = perf_counter()
+            top_documents = bm25.top_k(query, arguments.top_k)
+            top_k_time += perf_counter() - start
+
+            if top_documents != ranking[:arguments.top_k]:
+                mismatches += 1
+            rankings.append(ranking)
+
+        vectorized_bm25 = VectorizedBM25(reuters=reuters, index=index, n=reuters.number_of_documents)
+        start = perf_counter()
+        vectorized_rankings = vectorized_bm25.compute_bm25_batch(queries)
+        vectorized_time = perf_counter() - start
+
+        vectorized_mismatches = 0
+        for ranking, vectorized_ranking in zip(rankings, vectorized_rankings):
+            if len(ranking) != len(vectorized_ranking) or any(document_id != vectorized_document_id or abs(score - vectorized_score) > 1e-9
+                                                              for (document_id, score), (vectorized_document_id, vectorized_score)
+                                                              in zip(ranking, vectorized_ranking)):
+                vectorized_mismatches += 1
+
+        with redirect_stdout(io.StringIO()):
+            start = perf_counter()
+            spimi = SPIMI(reuters=Reuters(number_of_files=arguments.reuters), output_directory=directory)
+            restarted_index = spimi.construct_index()
+            document_statistics = spimi.get_document_statistics()
+            restarted_bm25 = BM25(reuters=document_statistics, index=restarted_index, n=document_statistics.number_of_documents)
+            restart_time = perf_counter() - start
+            restart_mismatches = sum(restarted_bm25.compute_bm25(query) != ranking for query, ranking in zip(queries, rankings))
+        restarted_index.close()
+        index.close()
+
+    print("Index built in %.2f s, reopened in %.3f s" % (build_time, restart_time))
+    print("Exhaustive BM25: %.2f ms per query" % (exhaustive_time * 1000 / len(queries)))
+    print("Top %d BM25:     %.2f ms per query" % (arguments.top_k, top_k_time * 1000 / len(queries)))
+    print("Vectorized BM25: %.2f ms per query (whole batch at once)" % (vectorized_time * 1000 / len(queries)))
+    print("Speedup:         %.2fx (top k), %.2fx (vectorized)" % (exhaustive_time / top_k_time, exhaustive_time / vectorized_time))
+    print("Top k rankings are %s." % ("identical" if not mismatches else "DIFFERENT for %d queries" % mismatches))
+    print("Vectorized rankings are %s." % ("the same" if not vectorized_mismatches else "DIFFERENT for %d queries" % vectorized_mismatches))
+    print("Rankings after a restart are %s." % ("identical" if not restart_mismatches else "DIFFERENT for %d queries" % restart_mismatches))
+
+
+def run_queries(index, document_statistics, queries, k):
+    """
+    Run every query as an AND query, an OR query, and a top k BM25 query.
+    :param index: the index.
+    :param document_statistics: DocumentStatistics of the index.
+    :param queries: list of queries.
+    :param k: number of documents ranked by BM25.
+    :return: tuple of (list of results, one per query, time in seconds).
+    """
+    bm25 = BM25(reuters=document_statistics, index=index, n=document_statistics.number_of_documents)
+    start = perf_counter()
+    results = [(AndQuery(index).execute(query), OrQuery(index).execute(query), bm25.top_k(query, k)) for query in queries]
+    return results, perf_counter() - start
+
+
+def benchmark_segments(arguments):
+    """
+    Construct an index one batch of Reuters files at a time, each batch appended as a new segment, then compact it (see
+    Compaction) in the background, while the same queries keep running against the segments that were opened before.
+    Queries have to return the exact same results before, during, and after compaction.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        append_time = 0
+        for batch in range(1, arguments.segments + 1):
+            number_of_files = -(-arguments.reuters * batch // arguments.segments)
+            with redirect_stdout(io.StringIO()):
+                start = perf_counter()
+                spimi = SPIMI(reuters=Reuters(number_of_files=number_of_files), output_directory=directory, append=True)
+                spimi.construct_index().close()
+                append_time += perf_counter() - start
+
+        index = spimi.get_index()
+        document_statistics = spimi.get_document_statistics()
+        number_of_segments = len(spimi.segments["segments"])
+        queries = generate_queries(index, arguments.queries, arguments.terms)
+        results, segmented_time = run_queries(index, document_statistics, queries, arguments.top_k)
+
+        compaction = Compaction(spimi, merge_factor=arguments.merge_factor, max_bytes_per_second=arguments.max_bytes_per_second)
+        start = perf_counter()
+        with redirect_stdout(io.StringIO()):
+            compaction.start()
+            snapshot_results, _ = run_queries(index, document_statistics, queries, arguments.top_k)
+            compaction.thread.join()
+        compaction_time = perf_counter() - start
+        index.close()
+
+        compacted_index = spimi.get_index()
+        compacted_results, compacted_time = run_queries(compacted_index, spimi.get_document_statistics(), queries, arguments.top_k)
+        compacted_index.close()
+
+    print("Appended %d segment(s) in %.2f s" % (arguments.segments, append_time))
+    print("Compaction:         %d merge(s) in %.2f s, %d segment(s) left out of %d"
+          % (compaction.merges, compaction_time, len(spimi.segments["segments"]), number_of_segments))
+    print("Before compaction:  %.2f ms per query" % (segmented_time * 1000 / len(queries)))
+    print("After compaction:   %.2f ms per query" % (compacted_time * 1000 / len(queries)))
+    print("Results during compaction are %s." % ("identical" if snapshot_results == results else "DIFFERENT"))
+    print("Results after compaction are %s." % ("identical" if compacted_results == results else "DIFFERENT"))
+
+
+def benchmark_cache(arguments):
+    """
+    Run a workload in which a few queries come up over and over (drawn with a Zipfian distribution out of a pool of
+    distinct queries), with and without the query cache (see QueryCache). Both have to return the same results.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        with redirect_stdout(io.StringIO()):
+            spimi = SPIMI(reuters=Reuters(number_of_files=arguments.reuters), output_directory=directory)
+            spimi.construct_index().close()
+
+        index = StemmedIndex(spimi.get_index())
+        document_statistics = spimi.get_document_statistics()
+        bm25 = BM25(reuters=document_statistics, index=index, n=document_statistics.number_of_documents)
+
+        generator = random.Random(0)
+        distinct_queries = generate_queries(index, arguments.distinct_queries, arguments.terms)
+        cumulative_weights = list(accumulate(1 / rank for rank in range(1, len(distinct_queries) + 1)))
+        workload = [(generator.choice(["and", "or", "bm25"]), query)
+                    for query in generator.choices(distinct_queries, cum_weights=cumulative_weights, k=arguments.queries)]
+
+        def run_uncached(query_type, query):
+            if query_type == "bm25":
+                return bm25.top_k(query, arguments.top_k)
+            return (AndQuery if query_type == "and" else OrQuery)(index).execute(query)
+
+        start = perf_counter()
+        expected_results = [run_uncached(query_type, query) for query_type, query in workload]
+        uncached_time = perf_counter() - start
+
+        query_cache = QueryCache(spimi, cache_size=arguments.cache_size)
+        start = perf_counter()
+        results = [query_cache.execute(query_type, query, arguments.top_k if query_type == "bm25" else None)
+                   for query_type, query in workload]
+        cached_time = perf_counter() - start
+
+    print("Without cache: %.3f ms per query" % (uncached_time * 1000 / len(workload)))
+    print("With cache:    %.3f ms per query" % (cached_time * 1000 / len(workload)))
+    print("Speedup:       %.2fx" % (uncached_time / cached_time))
+    query_cache.print_statistics()
+    print("Results are %s." % ("identical" if results == expected_results else "DIFFERENT"))
+
+
+def time_phase(timings, phase, function, *arguments):
+    """
+    :param timings: dictionary of phase -> time in seconds, in which the time of the phase will be recorded.
+    :param phase: name of the phase.
+    :param function: function running the phase, whose output is discarded.
+    :param arguments: arguments of the function.
+    :return: whatever the function returned.
+    """
+    with redirect_stdout(io.StringIO()):
+        start = perf_counter()
+        result = function(*arguments)
+        timings[phase] = perf_counter() - start
+    return result
+
+
+def compare_with_baseline(report, baseline, threshold, minimum_time=0.05):
+    """
+    Compare the timings of a run with the ones of a previous run. A phase regressed if it took more than threshold %
+    longer than it did in the baseline. Phases that took less than minimum_time in both runs are compared, but never
+    count as regressions, since they're mostly noise. A phase of the baseline that's missing from the run (because it
+    was removed, renamed, or couldn't be timed) counts as a regression, since nothing says it didn't regress. A phase
+    that's new in the run is listed, but can't regress.
+    :param report: report of the run (see benchmark_suite()).
+    :param baseline: report of the previous run.
+    :param threshold: percentage by which a phase can be slower than in the baseline before it's a regression.
+    :param minimum_time: time in seconds under which a phase is too short to regress.
+    :return: list of tuples of (phase, baseline time, time, ratio, regressed?), with None for the times (and the
+             ratio) a run doesn't have.
+    """
+    timings = report["timings"]
+    baseline_timings = baseline.get("timings", {})
+    comparison = []
+    for phase in list(timings) + [phase for phase in baseline_timings if phase not in timings]:
+        time, baseline_time = timings.get(phase), baseline_timings.get(phase)
+        if time is None:
+            comparison.append((phase, baseline_time, None, None, True))
+        elif baseline_time is None:
+            comparison.append((phase, None, time, None, False))
+        else:
+            ratio = time / baseline_time if baseline_time else 1 if not time else float("inf")
+            regressed = ratio > 1 + threshold / 100 and max(time, baseline_time) >= minimum_time
+            comparison.append((phase, baseline_time, time, ratio, regressed))
+    return comparison
+
+
+def benchmark_suite(arguments):
+    """
+    Time every phase of the indexer, from parsing to querying, on a synthetic Reuters-style corpus (see
+    CorpusGenerator), so that runs can be reproduced offline, on corpora of any size:
+        - parse: stream and tokenize every document of the corpus.
+        - construct_index: the whole SPIMI inversion, parsing included, down to the index file.
+        - merge_blocks: the merge of the block files into the index file, within construct_index (timed by the
+          profiler of the SPIMI object, since the block files are deleted once they're merged).
+        - load: open the index and its document statistics again, the way a restart would.
+        - and, or: AND and OR queries.
+        - bm25, bm25_top_k: exhaustive BM25 ranking, and top k BM25.
+    The timings, along with throughputs, the parameters of the corpus, and the environment, are written to a JSON file.
+    If a baseline (the JSON file of a previous run) is given, every phase is compared with it, and the exit status is 1
+    if any of them regressed by more than the threshold.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_directory = arguments.corpus_directory or os.path.join(directory, "corpus")
+        corpus_generator = CorpusGenerator(corpus_directory, int(arguments.size * 2 ** 20), vocabulary_size=arguments.vocabulary,
+                                           seed=arguments.seed)
+        start = perf_counter()
+        reuters_files = corpus_generator.generate()
+        generation_time = perf_counter() - start
+        corpus_size = sum(os.path.getsize(file) for file in reuters_files)
+
+        timings = {}
+        reuters = Reuters(number_of_files=None, reuters_directory=corpus_directory)
+        time_phase(timings, "parse", lambda: sum(1 for _ in reuters.get_documents()))
+
+        index_directory = os.path.join(directory, "index")
+        reuters = Reuters(number_of_files=None, reuters_directory=corpus_directory)
+        spimi = SPIMI(reuters=reuters, output_directory=index_directory, profiler=Profiler())
+        time_phase(timings, "construct_index", spimi.construct_index).close()
+        # there's no merge if the index was reused
+        merge_time = next((phase["wall_time"] for phase in spimi.profiler.phases if phase["name"] == "merge"), None)
+        if merge_time is not None:
+            timings["merge_blocks"] = merge_time
+
+        def load():
+            restarted_spimi = SPIMI(reuters=Reuters(number_of_files=None, reuters_directory=corpus_directory),
+                                    output_directory=index_directory)
+            return restarted_spimi.construct_index(), restarted_spimi.get_document_statistics()
+        index, document_statistics = time_phase(timings, "load", load)
+
+        queries = generate_queries(index, arguments.queries, arguments.terms, arguments.seed)
+        bm25 = BM25(reuters=document_statistics, index=index, n=document_statistics.number_of_documents)
+        time_phase(timings, "and", lambda: [AndQuery(index).execute(query) for query in queries])
+        time_phase(timings, "or", lambda: [OrQuery(index).execute(query) for query in queries])
+        time_phase(timings, "bm25", lambda: [bm25.get_ranking(query) for query in queries])
+        time_phase(timings, "bm25_top_k", lambda: [bm25.top_k(query, arguments.top_k) for query in queries])
+        index.close()
+
+    report = {
+        "environment": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+                        "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count()},
+        "corpus": dict(corpus_generator.get_parameters(), files=len(reuters_files), bytes=corpus_size,
+                       documents=reuters.number_of_documents, tokens=reuters.number_of_tokens),
+        "queries": {"queries": len(queries), "terms": arguments.terms, "k": arguments.top_k},
+        "timings": timings,
+        "throughput": {
+            "parse_tokens_per_second": reuters.number_of_tokens / timings["parse"],
+            "parse_bytes_per_second": corpus_size / timings["parse"],
+            "construct_index_tokens_per_second": reuters.number_of_tokens / timings["construct_index"],
+            "queries_per_second": {phase: len(queries) / timings[phase] for phase in ["and", "or", "bm25", "bm25_top_k"]}
+        }
+    }
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=4)
+
+    print("Corpus of %s MB (%s documents, %s tokens, %d files), generated in %.2f s"
+          % ("{:,.1f}".format(corpus_size / 2 ** 20), "{:,}".format(reuters.number_of_documents),
+             "{:,}".format(reuters.number_of_tokens), len(reuters_files), generation_time))
+    for phase, time in timings.items():
+        print("    %-16s %10.3f s" % (phase, time))
+    print("Parsing:         %s tokens per second" % "{:,.0f}".format(report["throughput"]["parse_tokens_per_second"]))
+    print("Indexing:        %s tokens per second" % "{:,.0f}".format(report["throughput"]["construct_index_tokens_per_second"]))
+    print()
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            comparison = compare_with_baseline(report, json.load(file), arguments.threshold, arguments.minimum_time)
+        print("Compared with %s (threshold of %s%%):" % (arguments.baseline, "{:g}".format(arguments.threshold)))
+        for phase, baseline_time, time, ratio, regressed in comparison:
+            if time is None:
+                print("    %-16s %10.3f s -> %12s  MISSING, REGRESSION" % (phase, baseline_time, "-"))
+            elif baseline_time is None:
+                print("    %-16s %12s -> %10.3f s  new" % (phase, "-", time))
+            else:
+                print("    %-16s %10.3f s -> %10.3f s  %+7.1f%%%s"
+                      % (phase, baseline_time, time, (ratio - 1) * 100, "  REGRESSION" if regressed else ""))
+        regressions = sum(regressed for *_, regressed in comparison)
+        print("%d regression(s)." % regressions)
+        if regressions:
+            sys.exit(1)
+
+
+async def send_request(server, method, target, body=None, connection=None):
+    """
+    Send an HTTP request to the query server, and read its response.
+    :param server: QueryServer.
+    :param method: HTTP method.
+    :param target: path of the request, with its parameters.
+    :param body: object sent as JSON in the body of the request.
+    :param connection: tuple of (reader, writer) of an open connection, or None to open one.
+    :return: tuple of (HTTP status, response, connection).
+    """
+    if connection is None:
+        if server.unix_socket:
+            connection = await asyncio.open_unix_connection(server.unix_socket)
+        else:
+            connection = await asyncio.open_connection(*server.address[len("http://"):].rsplit(":", 1))
+    reader, writer = connection
+
+    body = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(("%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n" % (method, target, len(body))).encode("latin-1") + body)
+    await writer.drain()
+
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    status = int(head.split()[1])
+    content_length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+    return status, json.loads(await reader.readexactly(content_length)), connection
+
+
+async def run_clients(server, requests, clients):
+    """
+    Send requests to the query server from several clients at once, each one with its own connection, sending its next
+    request as soon as it gets the response to the previous one.
+    :param server: QueryServer.
+    :param requests: list of tuples of (query type, query).
+    :param clients: number of clients.
+    :return: tuple of (list of tuples of (HTTP status, response), one per request, list of latencies in seconds).
+    """
+    responses = [None] * len(requests)
+    latencies = [0] * len(requests)
+
+    async def client(client_number):
+        connection = None
+        for request_number in range(client_number, len(requests), clients):
+            query_type, query = requests[request_number]
+            start = perf_counter()
+            status, response, connection = await send_request(server, "GET", "/search?" + urlencode({"type": query_type, "q": query}), connection=connection)
+            latencies[request_number] = perf_counter() - start
+            responses[request_number] = status, response
+        if connection:
+            connection[1].close()
+
+    await asyncio.gather(*[client(client_number) for client_number in range(clients)])
+    return responses, latencies
+
+
+def benchmark_server(arguments):
+    """
+    Start the query server (see QueryServer) on localhost, send it AND, OR, and BM25 queries from several clients at
+    once, and compare its results with the ones of a QueryCache. Also checks a batch of queries sent at once, errors
+    (an invalid query type, and queries that aren't a list), and the health and metrics endpoints.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        with redirect_stdout(io.StringIO()):
+            spimi = SPIMI(reuters=Reuters(number_of_files=arguments.reuters), output_directory=directory)
+            spimi.construct_index().close()
+
+            server = QueryServer(QueryCache(spimi), port=0, workers=arguments.workers, threads=arguments.threads, k=arguments.top_k,
+                                 unix_socket=os.path.join(directory, "server.sock") if arguments.unix_socket else None,
+                                 batch_window=arguments.batch_window / 1000)
+            server.ready = threading.Event()
+            thread = threading.Thread(target=server.run)
+            thread.start()
+            server.ready.wait()
+
+        query_cache = QueryCache(spimi)
+        generator = random.Random(0)
+        requests = [(generator.choice(["and", "or", "bm25"]), query)
+                    for query in generate_queries(query_cache.index, arguments.queries, arguments.terms)]
+
+        async def session():
+            start = perf_counter()
+            responses, latencies = await run_clients(server, requests, arguments.clients)
+            total_time = perf_counter() - start
+
+            batch = [query for _, query in requests[:10]]
+            batch_response = (await send_request(server, "POST", "/search", {"type": "bm25", "queries": batch, "k": arguments.top_k}))[1]
+            error_status = (await send_request(server, "GET", "/search?type=xor&q=oil"))[0]
+            invalid_body_status = (await send_request(server, "POST", "/search", {"type": "bm25", "queries": 5}))[0]
+            health = (await send_request(server, "GET", "/health"))[1]
+            metrics = (await send_request(server, "GET", "/metrics"))[1]
+            return responses, latencies, total_time, batch, batch_response, error_status, invalid_body_status, health, metrics
+        (responses, latencies, total_time, batch, batch_response, error_status, invalid_body_status, health,
+         metrics) = asyncio.run(session())
+
+        server.stop()
+        thread.join()
+
+        def get_expected_results(query_type, query):
+            results = query_cache.execute(query_type, query, arguments.top_k if query_type == "bm25" else None)
+            return [list(result) for result in results] if query_type == "bm25" else results
+
+        mismatches = sum(status != 200 or response["results"] != get_expected_results(query_type, query)
+                         for (query_type, query), (status, response) in zip(requests, responses))
+        batch_mismatches = sum(response["results"] != get_expected_results("bm25", query)
+                               for query, response in zip(batch, batch_response["results"]))
+
+    latencies.sort()
+    print("Served %s queries from %d client(s) in %.3f s with %s: %s queries per second"
+          % ("{:,}".format(len(requests)), arguments.clients, total_time,
+             "%d worker process(es)" % arguments.workers if arguments.workers else "%d thread(s)" % arguments.threads,
+             "{:,.1f}".format(len(requests) / total_time)))
+    print("Latency: p50 %.3f ms, p95 %.3f ms, p99 %.3f ms" % tuple(BatchQuery.get_percentile(latencies, percentile) * 1000
+                                                                  for percentile in [50, 95, 99]))
+    print("Batches: %d, %.2f queries per batch on average" % (metrics["batches"], metrics["average_batch_size"]))
+    print("Health: %s (generation %d, %s documents)" % (health["status"], health["generation"], "{:,}".format(health["documents"])))
+    print("Invalid query type answered with status %d." % error_status)
+    print("Invalid list of queries answered with status %d." % invalid_body_status)
+    print("Results are %s." % ("identical" if not mismatches else "DIFFERENT for %d queries" % mismatches))
+    print("Results of a batch of queries are %s." % ("identical" if not batch_mismatches else "DIFFERENT for %d queries" % batch_mismatches))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark the parts of the indexer.")
+    subparsers = parser.add_subparsers(dest="benchmark")
+    subparsers.required = True
+
+    merge_parser = subparsers.add_parser("merge", help="time the merge of synthetic block files, serial vs. parallel")
+    merge_parser.add_argument("-b", "--blocks", type=int, help="number of block files", default=40)
+    merge_parser.add_argument("-d", "--docs", type=int, help="documents per block", default=500)
+    merge_parser.add_argument("-t", "--tokens", type=int, help="tokens per document", default=150)
+    merge_parser.add_argument("-v", "--vocabulary", type=int, help="number of distinct terms", default=100000)
+    merge_parser.add_argument("-f", "--fan-in", type=fan_in, help="maximum number of files merged at once", default=128)
+    merge_parser.add_argument("-mw", "--merge-workers", type=int, help="number of processes merging block files", default=4)
+    merge_parser.add_argument("-pc", "--postings-codec", help="encoding of the postings in the index file", choices=["vb", "gamma"], default="vb")
+    merge_parser.set_defaults(function=benchmark_merge)
+
+    sgml_parser = subparsers.add_parser("sgml", help="time the SGML reader against BeautifulSoup, and compare their output")
+    sgml_parser.add_argument("-r", "--reuters", type=int, help="number of Reuters files to read, choice from 1 to 22", choices=range(1, 23), default=22)
+    sgml_parser.set_defaults(function=benchmark_sgml)
+
+    tokenizer_parser = subparsers.add_parser("tokenizer", help="time the regular expressions of the tokenizer against nltk, and compare their tokens")
+    tokenizer_parser.add_argument("-r", "--reuters", type=int, help="number of Reuters files to tokenize, choice from 1 to 22", choices=range(1, 23), default=22)
+    tokenizer_parser.add_argument("-e", "--examples", type=int, help="number of mismatching documents printed", default=5)
+    tokenizer_parser.set_defaults(function=benchmark_tokenizer)
+
+    bm25_parser = subparsers.add_parser("bm25", help="time top k and vectorized BM25 against exhaustive BM25, and compare their rankings")
+    bm25_parser.add_argument("-r", "--reuters", type=int, help="number of Reuters files to index, choice from 1 to 22", choices=range(1, 23), default=22)
+    bm25_parser.add_argument("-q", "--queries", type=int, help="number of queries", default=100)
+    bm25_parser.add_argument("-t", "--terms", type=int, help="terms per query", default=10)
+    bm25_parser.add_argument("-k", "--top-k", type=int, help="number of documents ranked", default=10)
+    bm25_parser.set_defaults(function=benchmark_bm25)
+
+    segments_parser = subparsers.add_parser("segments", help="time queries before and after compacting an index made of appended segments")
+    segments_parser.add_argument("-r", "--reuters", type=int, help="number of Reuters files to index, choice from 1 to 22", choices=range(1, 23), default=22)
+    segments_parser.add_argument("-s", "--segments", type=int, help="number of segments appended", default=8)
+    segments_parser.add_argument("-mf", "--merge-factor", type=int, help="number of segments of a tier merged together", default=4)
+    segments_parser.add_argument("-io", "--max-bytes-per-second", type=int, help="maximum number of bytes read per second while compacting", default=None)
+    segments_parser.add_argument("-q", "--queries", type=int, help="number of queries", default=100)
+    segments_parser.add_argument("-t", "--terms", type=int, help="terms per query", default=3)
+    segments_parser.add_argument("-k", "--top-k", type=int, help="number of documents ranked", default=10)
+    segments_parser.set_defaults(function=benchmark_segments)
+
+    cache_parser = subparsers.add_parser("cache", help="time a workload of repeated queries with and without the query cache")
+    cache_parser.add_argument("-r", "--reuters", type=int, help="number of Reuters files to index, choice from 1 to 22", choices=range(1, 23), default=22)
+    cache_parser.add_argument("-q", "--queries", type=int, help="number of queries", default=2000)
+    cache_parser.add_argument("-dq", "--distinct-queries", type=int, help="number of distinct queries", default=200)
+    cache_parser.add_argument("-t", "--terms", type=int, help="terms per query", default=3)
+    cache_parser.add_argument("-k", "--top-k", type=int, help="number of documents ranked by BM25", default=10)
+    cache_parser.add_argument("-qc", "--cache-size", type=int, help="number of query results kept", default=1024)
+    cache_parser.set_defaults(function=benchmark_cache)
+
+    server_parser = subparsers.add_parser("server", help="send queries to the query server on localhost from several clients, and compare its results")
+    server_parser.add_argument("-r", "--reuters", type=int, help="number of Reuters files to index, choice from 1 to 22", choices=range(1, 23), default=22)
+    server_parser.add_argument("-q", "--queries", type=int, help="number of queries", default=1000)
+    server_parser.add_argument("-t", "--terms", type=int, help="terms per query", default=3)
+    server_parser.add_argument("-k", "--top-k", type=int, help="number of documents ranked by BM25", default=10)
+    server_parser.add_argument("-cl", "--clients", type=int, help="number of clients sending queries at once", default=16)
+    server_parser.add_argument("-sw", "--workers", type=int, help="number of worker processes running queries (0 for threads)", default=0)
+    server_parser.add_argument("-th", "--threads", type=int, help="number of threads running queries", default=4)
+    server_parser.add_argument("-bw", "--batch-window", type=float, help="time in milliseconds queries wait to be batched", default=2)
+    server_parser.add_argument("-us", "--unix-socket", action="store_true", help="listen on a Unix socket instead of a port", default=False)
+    server_parser.set_defaults(function=benchmark_server)
+
+    suite_parser = subparsers.add_parser("suite", help="time every phase on a synthetic corpus, and compare with a baseline")
+    suite_parser.add_argument("-s", "--size", type=float, help="size of the synthetic corpus in MB", default=10)
+    suite_parser.add_argument("-cd", "--corpus-directory", help="directory of the synthetic corpus, kept so that it's only generated once (defaults to a temporary directory)", default=None)
+    suite_parser.add_argument("-v", "--vocabulary", type=int, help="number of distinct words", default=50000)
+    suite_parser.add_argument("-sd", "--seed", type=int, help="seed of the corpus and the queries", default=0)
+    suite_parser.add_argument("-q", "--queries", type=int, help="number of queries", default=200)
+    suite_parser.add_argument("-t", "--terms", type=int, help="terms per query", default=3)
+    suite_parser.add_argument("-k", "--top-k", type=int, help="number of documents ranked by top k BM25", default=10)
+    suite_parser.add_argument("-o", "--output", help="JSON file in which the results will be written", default=None)
+    suite_parser.add_argument("-bl", "--baseline", help="JSON file of a previous run to compare with", default=None)
+    suite_parser.add_argument("-th", "--threshold", type=float, help="percentage by which a phase can be slower than in the baseline", default=10)
+    suite_parser.add_argument("-mt", "--minimum-time", type=float, help="time in seconds under which a phase is too short to regress", default=0.05)
+    suite_parser.set_defaults(function=benchmark_suite)
+
+    args = parser.parse_args()
+    args.function(args)
@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import sys
+import json
+from math import ceil
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchQuery:
+
+    def __init__(self, query_cache, query_type="bm25", k=10, threads=1):
+        """
+        Run a whole batch of queries of the same type, without any prompt, e.g. to load test the index, or as part of a
+        pipeline.
+
+        Queries go through a QueryCache, so the index (and its caches) is opened once, and shared by every query. With
+        more than one thread, queries are handed out to a pool of threads, which all read the same index. Results come
+        out in the same order as the queries, no matter which thread ran them.
+
+        :param query_cache: QueryCache of the index.
+        :param query_type: type of the queries: "and", "or", or "bm25".
+        :param k: number of documents ranked by BM25 (see BM25.top_k()).
+        :param threads: number of threads running queries.
+        """
+        self.query_cache = query_cache
+        self.query_type = query_type
+        self.k = k if query_type == "bm25" else None
+        self.threads = max(threads, 1)
+
+        self.latencies = []
+        self.total_time = 0
+
+    @staticmethod
+    def read_queries(queries_file):
+        """
+        :param queries_file: path of a file containing one query per line, or "-" to read them from the standard input.
+        :return: list of queries, without empty lines.
+        """
+        if queries_file == "-":
+            return [line.strip() for line in sys.stdin if line.strip()]
+        with open(queries_file, encoding="utf-8") as file:
+            return [line.strip() for line in file if line.strip()]
+
+    def run_query(self, query):
+        """
+        :param query: the query.
+        :return: tuple of (results of the query (see QueryCache.execute()), time it took in seconds).
+        """
+        start = perf_counter()
+        results = self.query_cache.execute(self.query_type, query, self.k)
+        return results, perf_counter() - start
+
+    def run(self, queries):
+        """
+        Run every query, and keep track of the time each one of them took.
+        :param queries: list of queries.
+        :return: list of results, one per query, in the same order as the queries.
+        """
+        start = perf_counter()
+        if self.threads == 1:
+            timed_results = [self.run_query(query) for query in queries]
+        else:
+            with ThreadPoolExecutor(self.threads) as executor:
+                timed_results = list(executor.map(self.run_query, queries))
+        self.total_time = perf_counter() - start
+
+        self.latencies = [latency for _, latency in timed_results]
+        return [results for results, _ in timed_results]
+
+    def write_results(self, output, queries, results, output_format="tsv"):
+        """
+        Write the results of the queries.
+            - tsv: one line per query, with the number of the query, the query, and its results separated by tabs.
+              Results are comma separated document IDs (document ID:score for BM25).
+            - json: one JSON object per line, with the number of the query, the query, and its results.
+        :param output: stream in which results will be written.
+        :param queries: list of queries.
+        :param results: list of results, one per query (see run()).
+        :param output_format: "tsv" or "json".
+        """
+        for query_number, (query, query_results) in enumerate(zip(queries, results), 1):
+            if output_format == "json":
+                output.write(json.dumps({"query_number": query_number, "query": query, "type": self.query_type,
+                                         "results": query_results}) + "\n")
+            else:
+                if self.query_type == "bm25":
+                    query_results = ["%d:%r" % (document_id, score) for document_id, score in query_results]
+                output.write("%d\t%s\t%s\n" % (query_number, query.replace("\t", " "), ",".join(map(str, query_results))))
+
+    @staticmethod
+    def get_percentile(sorted_values, percentile):
+        """
+        :param sorted_values: list of values, sorted in increasing order.
+        :param percentile: percentile, between 0 and 100.
+        :return: the value below which percentile % of the values are (nearest rank), or 0 if there are no values.
+        """
+        if not sorted_values:
+            return 0
+        return sorted_values[max(ceil(percentile / 100 * len(sorted_values)) - 1, 0)]
+
+    def get_statistics(self):
+        """
+        :return: dictionary with the number of queries, the time they took, the number of queries per second, and
+                 latency percentiles (in milliseconds) of the last batch.
+        """
+        latencies = sorted(self.latencies)
+        return {
+            "queries": len(latencies),
+            "threads": self.threads,
+            "time": self.total_time,
+            "queries_per_second": len(latencies) / self.total_time if self.total_time else 0,
+            "p50": self.get_percentile(latencies, 50) * 1000,
+            "p95": self.get_percentile(latencies, 95) * 1000,
+            "p99": self.get_percentile(latencies, 99) * 1000
+        }
+
+    def print_statistics(self, file=None):
+        """
+        Print the throughput and latency of the last batch.
+        :param file: stream in which the statistics will be printed (defaults to sys.stdout at the time of the call,
+                     which main.py redirects to the standard error in batch mode).
+        """
+        file = file or sys.stdout
+        statistics = self.get_statistics()
+        print("%s %s queries in %.3f s with %d thread(s): %s queries per second"
+              % ("{:,}".format(statistics["queries"]), self.query_type.upper(), statistics["time"], statistics["threads"],
+                 "{:,.1f}".format(statistics["queries_per_second"])), file=file)
+        print("Latency: p50 %.3f ms, p95 %.3f ms, p99 %.3f ms" % (statistics["p50"], statistics["p95"], statistics["p99"]), file=file)
@@ -1,10 +1,12 @@
 #! /usr/bin/env python3
 # coding: utf-8
 
+import heapq
 from math import log10
-from operator import itemgetter
+from itertools import accumulate
+from bisect import bisect_left
 
-from definitions import ps, word_tokenize, stopwords
+from definitions import word_tokenize, normalizer
 from classes.query import Query, OrQuery
 
 
@@ -15,6 +17,7 @@ class BM25:
         Initialize the Okapi BM25 (Best Matching) ranking function.
 
         :param reuters: Reuters object which will contain relevant information such as document length, average length.
+                        The DocumentStatistics stored with the index can be given instead (see SPIMI.get_document_statistics()).
         :param index: dictionary with terms as keys, and their postings list as values.
         :param n: Number of documents in the collection.
         :param k1: Positive parameter used to scale the document frequency scaling.
@@ -42,33 +45,37 @@ class BM25:
         self.L_ave = self.reuters.average_document_length
 
     def get_documents_of_term(self, term):
-        return set(self.Query.get_postings_list_of_one_term(term))
+        return set(self.Query.get_document_ids(self.Query.get_postings_list_of_one_term(term)))
 
     def get_document_frequency(self, term):
         """
-        Call the get_postings_list method of the Query class, and return its length.
+        Get the length of the term's postings list, which contains one posting per document.
         :param term: the term we want the frequency of.
         :return: the number of documents the term appears in, or df_t.
         """
         try:
-            postings_list = self.index[ps.stem(term)]
-            return len(set(postings_list))
+            return len(self.index[normalizer.stem(term)])
         except KeyError:
             return 0
 
     def get_frequency_of_term_in_doc(self, term, doc_id):
         """
-        Count the number of times a certain document ID appears in a term's postings list.
+        Find a document in a term's postings list (sorted by document ID) with a binary search, and get the term
+        frequency stored with it.
         :param term: the term.
         :param doc_id: the document we're looking at.
         :return: the number of times the term appears in the document.
         """
         try:
-            postings_list = self.index[ps.stem(term)]
-            return postings_list.count(doc_id)
+            postings_list = self.index[normalizer.stem(term)]
         except KeyError:
             return 0
 
+        position = bisect_left(postings_list, (doc_id,))
+        if position < len(postings_list) and postings_list[position][0] == doc_id:
+            return postings_list[position][1]
+        return 0
+
     def compute_idf_weight(self, term):
         """
         Get the inverse document frequency weight of a term.
@@ -81,31 +88,210 @@ class BM25:
         except ZeroDivisionError:
             return 0
 
-    def compute_numerator(self, term, doc_id):
-        return (self.K1 + 1) * self.get_frequency_of_term_in_doc(term, doc_id)
+    def compute_upper_bound(self, term, idf_weight):
+        """
+        Get the highest score a document can get from a term, without reading the term's postings.
 
-    def compute_denominator(self, term, doc_id):
-        return self.K1 * ((1 - self.B) + self.B * (self.document_lengths[doc_id] / self.L_ave)) + self.get_frequency_of_term_in_doc(term, doc_id)
+        The score of a term in a document goes up with the term frequency, and down with the length of the document.
+        So no document can get a higher score than one with the term's highest term frequency, and the length of the
+        shortest document the term appears in. Both are stored in the index (see IndexWriter). The bound is raised by a
+        tiny fraction, so that rounding errors never make it lower than an actual score.
 
-    def compute_bm25(self, query):
+        :param term: the term.
+        :param idf_weight: inverse document frequency weight of the term.
+        :return: upper bound of the term's score in any document.
+        """
+        key = normalizer.stem(term)
+        if hasattr(self.index, "get_term_bounds"):
+            max_term_frequency, min_document_length = self.index.get_term_bounds(key)
+        else:
+            max_term_frequency, min_document_length = max(term_frequency for _, term_frequency in self.index[key]), 0
+
+        denominator = self.K1 * ((1 - self.B) + self.B * (min_document_length / self.L_ave)) + max_term_frequency
+        return idf_weight * self.compute_numerator(max_term_frequency) / denominator * (1 + 1e-9)
+
+    def compute_numerator(self, term_frequency):
+        return (self.K1 + 1) * term_frequency
+
+    def compute_denominator(self, term_frequency, doc_id):
+        return self.K1 * ((1 - self.B) + self.B * (self.document_lengths[doc_id] / self.L_ave)) + term_frequency
+
+    def get_query_terms(self, query):
+        """
+        :param query: query to be conducted, or the list of its terms if it was already split by get_query_terms() (e.g.
+                      by QueryCache, to look its results up), which is then returned as it is.
+        :return: list of stemmed terms of the query, without stopwords.
+        """
+        if isinstance(query, list):
+            return query
+        return [normalizer.stem(term) for term in word_tokenize(query) if normalizer.casefold(term) not in normalizer.get_stopwords()]
+
+    def get_ranking(self, query):
         """
         Compute the Okapi BM25 ranking formula to rank retrieved documents by relevance.
+
+        Each query term's postings list is read once: the term frequency stored in every posting is used to add the
+        term's contribution to the score of that document. Documents that don't contain a term get no contribution from
+        it, so a scoring pass is linear in the total length of the postings lists.
+
+        Documents with the same score are ranked by document ID, like top_k() and VectorizedBM25 do, so that every
+        ranking function gives the same order.
+
+        :param query: query to be conducted, or the list of its terms (see get_query_terms()).
+        :return: list of tuples of (document ID, score), sorted by decreasing score, then by document ID.
+        """
+        terms = self.get_query_terms(query)
+        doc_ids = OrQuery(self.index).execute([normalizer.stem(term) for term in terms])
+        rank = {doc_id: 0 for doc_id in doc_ids}
+
+        for term in terms:
+            try:
+                postings_list = self.index[normalizer.stem(term)]
+            except KeyError:
+                continue
+
+            idf_weight = self.compute_idf_weight(term)
+            for doc_id, term_frequency in postings_list:
+                if doc_id in rank:
+                    rank[doc_id] += idf_weight * self.compute_numerator(term_frequency) / self.compute_denominator(term_frequency, doc_id)
+
+        return sorted(rank.items(), key=lambda document: (-document[1], document[0]))
+
+    def compute_bm25(self, query):
+        """
+        Rank the documents of a query (see get_ranking()), and print them.
         :param query: query to be conducted.
+        :return: list of tuples of (document ID, score), sorted by decreasing score.
         """
-        terms = [ps.stem(term) for term in word_tokenize(query) if term.casefold() not in stopwords]
-        query = " ".join(terms)
-        doc_ids = OrQuery(self.index).execute(query)
-        rank = {}
+        ranking = self.get_ranking(query)
+        self.print_ranking(ranking)
+        return ranking
+
+    @staticmethod
+    def print_ranking(ranking):
+        """
+        Print the documents returned by get_ranking().
+        :param ranking: list of tuples of (document ID, score), sorted by decreasing score.
+        """
+        print("{} documents found.".format(len(ranking)))
+        for k, v in ranking:
+            print("Document {} score: {}".format(k, v))
+        print()
+
+    def top_k(self, query, k=10):
+        """
+        Get the k best ranked documents of a query, without scoring every document that contains one of its terms.
+
+        Postings lists are read document-at-a-time, in increasing order of document ID, with one cursor per query term.
+        The k best documents found so far are kept in a heap, and the score of the worst of them is the threshold a
+        document has to beat to get in. This is the MaxScore algorithm:
+            - Terms are sorted by their upper bound (see compute_upper_bound()). The terms with the lowest upper bounds
+              whose upper bounds add up to no more than the threshold are non-essential: a document that only contains
+              those terms can't beat the threshold. Only the postings of the other terms, the essential ones, are
+              read in full, to pick the next document.
+            - The non-essential terms are then looked up in that document, from the highest upper bound to the lowest,
+              with a binary search of their postings. As soon as the score so far plus the upper bounds of the terms
+              that are left can't beat the threshold, the document is skipped.
+        The more documents are found, the higher the threshold gets, and the more terms become non-essential.
+
+        Scores are added up in the same order as compute_bm25() does, so they're the exact same. Documents with the
+        same score are ranked by document ID, like get_ranking() does, so the result is the start of its ranking.
+
+        This information has been taken from the paper:
+            - Query Evaluation: Strategies and Optimizations, by:
+                Howard Turtle, and James Flood
+
+        :param query: query to be conducted, or the list of its terms (see get_query_terms()).
+        :param k: number of documents to return.
+        :return: list of at most k tuples of (document ID, score), sorted by decreasing score, then by document ID.
+        """
+        postings_lists = []
+        idf_weights = []
+        upper_bounds = []
+        for term in self.get_query_terms(query):
+            try:
+                postings_list = self.index[normalizer.stem(term)]
+            except KeyError:
+                continue
+            if postings_list:
+                idf_weight = self.compute_idf_weight(term)
+                postings_lists.append(postings_list)
+                idf_weights.append(idf_weight)
+                upper_bounds.append(self.compute_upper_bound(term, idf_weight))
+
+        # cursors (numbered in query order) sorted by upper bound, and the sum of the upper bounds up to each one of them
+        cursors = sorted(range(len(postings_lists)), key=lambda cursor: upper_bounds[cursor])
+        cumulative_upper_bounds = list(accumulate(upper_bounds[cursor] for cursor in cursors))
+        positions = [0] * len(postings_lists)
+
+        # heap of tuples of (score, -document ID), with the worst of the k best documents found so far on top
+        top_documents = []
+        threshold = None
+        # position (in cursors) of the first essential term
+        first_essential = 0
+
+        while first_essential < len(cursors) and k > 0:
+            essential_cursors = cursors[first_essential:]
+
+            doc_id = None
+            for cursor in essential_cursors:
+                if positions[cursor] < len(postings_lists[cursor]):
+                    cursor_document_id = postings_lists[cursor][positions[cursor]][0]
+                    if doc_id is None or cursor_document_id < doc_id:
+                        doc_id = cursor_document_id
+            if doc_id is None:
+                break
+
+            scores = {}
+            for cursor in essential_cursors:
+                position = positions[cursor]
+                if position < len(postings_lists[cursor]) and postings_lists[cursor][position][0] == doc_id:
+                    term_frequency = postings_lists[cursor][position][1]
+                    scores[cursor] = idf_weights[cursor] * self.compute_numerator(term_frequency) / self.compute_denominator(term_frequency, doc_id)
+                    positions[cursor] = position + 1
+
+            skipped = False
+            if first_essential:
+                partial_score = sum(scores.values())
+                for cursor_number in range(first_essential - 1, -1, -1):
+                    if partial_score + cumulative_upper_bounds[cursor_number] <= threshold:
+                        skipped = True
+                        break
+                    cursor = cursors[cursor_number]
+                    position = bisect_left(postings_lists[cursor], (doc_id,), positions[cursor])
+                    positions[cursor] = position
+                    if position < len(postings_lists[cursor]) and postings_lists[cursor][position][0] == doc_id:
+                        term_frequency = postings_lists[cursor][position][1]
+                        scores[cursor] = idf_weights[cursor] * self.compute_numerator(term_frequency) / self.compute_denominator(term_frequency, doc_id)
+                        partial_score += scores[cursor]
+            if skipped:
+                continue
 
-        for doc_id in doc_ids:
             score = 0
-            for term in terms:
-                score += self.compute_idf_weight(term) * self.compute_numerator(term, doc_id) / self.compute_denominator(term, doc_id)
-            rank[doc_id] = score
+            for cursor in sorted(scores):
+                score += scores[cursor]
+
+            if len(top_documents) < k:
+                heapq.heappush(top_documents, (score, -doc_id))
+            elif score > threshold:
+                heapq.heapreplace(top_documents, (score, -doc_id))
+            else:
+                continue
+
+            if len(top_documents) == k:
+                threshold = top_documents[0][0]
+                while first_essential < len(cursors) and cumulative_upper_bounds[first_essential] <= threshold:
+                    first_essential += 1
 
-        sorted_rank = sorted(rank.items(), key=itemgetter(1), reverse=True)
+        return [(-negative_doc_id, score) for score, negative_doc_id in sorted(top_documents, reverse=True)]
 
-        print("{} documents found.".format(len(doc_ids)))
-        for k, v in sorted_rank:
+    @staticmethod
+    def print_top_k(top_documents):
+        """
+        Print the documents returned by top_k().
+        :param top_documents: list of tuples of (document ID, score), sorted by decreasing score.
+        """
+        print("Top {} documents.".format(len(top_documents)))
+        for k, v in top_documents:
             print("Document {} score: {}".format(k, v))
         print()
@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import os
+import json
+import hashlib
+
+from classes.index_writer import IndexWriter
+from classes.document_statistics import DocumentStatistics
+
+
+class BuildManifest:
+    """
+    Description of everything an index depends on: the version of the file formats, the options the Reuters files were
+    parsed with, and the checksum of every Reuters file.
+
+    The fingerprint of the manifest (a hash of its content) names the directory the index is constructed in, so that
+    indexes constructed with different options, or from different files, live side by side. The manifest is written in
+    that directory once the index is complete, and an index is only reused if its manifest is the same as the one of the
+    index we would construct (see SPIMI.is_index_valid()). An index constructed out of some of our files can also be
+    extended with the others (see extends()).
+    """
+
+    version = 1
+    file_name = "manifest.json"
+    checksum_chunk_size = 2 ** 20
+
+    def __init__(self, reuters, postings_codec="vb"):
+        """
+        :param reuters: Reuters object the index is constructed from.
+        :param postings_codec: encoding of the postings in the index file (see IndexWriter).
+        """
+        self.content = {
+            "version": self.version,
+            "index_version": IndexWriter.version,
+            "document_statistics_version": DocumentStatistics.version,
+            "options": {
+                "remove_stopwords": reuters.remove_stopwords,
+                "stem": reuters.stem,
+                "case_folding": reuters.case_folding,
+                "remove_numbers": reuters.remove_numbers,
+                "tokenizer": "regex" if reuters.regex_tokenizer else "nltk",
+                "postings_codec": postings_codec
+            },
+            "files": [{"name": os.path.basename(file), "size": os.path.getsize(file), "sha256": self.get_checksum(file)}
+                      for file in reuters.reuters_files]
+        }
+        self.fingerprint = hashlib.sha256(json.dumps(self.content, sort_keys=True).encode()).hexdigest()[:16]
+
+    @classmethod
+    def get_checksum(cls, file):
+        """
+        :param file: path of the file.
+        :return: SHA-256 checksum of the content of the file, in hexadecimal.
+        """
+        checksum = hashlib.sha256()
+        with open(file, "rb") as input_file:
+            for chunk in iter(lambda: input_file.read(cls.checksum_chunk_size), b""):
+                checksum.update(chunk)
+        return checksum.hexdigest()
+
+    def write(self, manifest_file):
+        """
+        :param manifest_file: path of the manifest file.
+        """
+        with open(manifest_file, "w") as file:
+            json.dump(self.content, file, indent=4, sort_keys=True)
+
+    @staticmethod
+    def read(manifest_file):
+        """
+        :param manifest_file: path of the manifest file of an existing index.
+        :return: content of the manifest, or None if it can't be read.
+        """
+        try:
+            with open(manifest_file) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def matches(self, manifest_file):
+        """
+        :param manifest_file: path of the manifest file of an existing index.
+        :return: True if the file contains the same manifest, False if it's different, or can't be read.
+        """
+        return self.read(manifest_file) == self.content
+
+    def extends(self, manifest_file):
+        """
+        Check whether the index of an existing manifest can be extended into ours, by indexing the files it's missing:
+        the versions and the options have to be the same, and every one of its files has to be one of ours, unchanged.
+        :param manifest_file: path of the manifest file of an existing index.
+        :return: number of files of the existing index, or None if it can't be extended.
+        """
+        content = self.read(manifest_file)
+        if not isinstance(content, dict) or "files" not in content:
+            return None
+        if {key: value for key, value in content.items() if key != "files"} != \
+                {key: value for key, value in self.content.items() if key != "files"}:
+            return None
+
+        files = [json.dumps(file, sort_keys=True) for file in self.content["files"]]
+        if not all(json.dumps(file, sort_keys=True) in files for file in content["files"]):
+            return None
+        return len(content["files"])
@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from collections.abc import Mapping
+
+from classes.lru_cache import LRUCache
+from classes.profiler import Profiler
+
+
+class CachedIndex(Mapping):
+
+    def __init__(self, index, cache_size=256, profiler=None):
+        """
+        View of an index which keeps the postings lists of the terms looked up the most recently (see LRUCache), so that
+        the terms of the queries users keep on repeating don't have to be decoded, or combined (see StemmedIndex and
+        SegmentedIndex), over and over. The indexes themselves don't keep postings lists, so the memory they take is
+        bounded by the number of postings lists kept here.
+        :param index: dictionary (or IndexReader, StemmedIndex, SegmentedIndex) containing terms and their postings.
+        :param cache_size: maximum number of postings lists kept.
+        :param profiler: Profiler to which the time spent fetching postings lists (kept or not) is added.
+        """
+        self.index = index
+        self.postings_lists = LRUCache(cache_size)
+        self.fetch = (profiler or Profiler(enabled=False)).time_function("fetch", self.get_postings_list)
+
+    def close(self):
+        """
+        Close the index it's a view of, if it can be (e.g. an IndexReader).
+        """
+        if hasattr(self.index, "close"):
+            self.index.close()
+
+    def get_document_frequency(self, term):
+        """
+        :param term: the term.
+        :return: the term's document frequency, or 0 if it isn't in the index.
+        """
+        if hasattr(self.index, "get_document_frequency"):
+            return self.index.get_document_frequency(term)
+        return len(self.index.get(term, []))
+
+    def get_term_bounds(self, term):
+        """
+        :param term: the term.
+        :return: tuple of (maximum term frequency, minimum document length), or (0, 0) if it isn't in the index.
+        """
+        if hasattr(self.index, "get_term_bounds"):
+            return self.index.get_term_bounds(term)
+        if term not in self.index:
+            return 0, 0
+        return max(term_frequency for _, term_frequency in self[term]), 0
+
+    def get_postings_list(self, term):
+        """
+        :param term: the term.
+        :return: the term's postings list, from the cache if it was kept.
+        """
+        postings_list = self.postings_lists.get(term)
+        if postings_list is None:
+            postings_list = self.index[term]
+            self.postings_lists.put(term, postings_list)
+        return postings_list
+
+    def __getitem__(self, term):
+        return self.fetch(term)
+
+    def __contains__(self, term):
+        return term in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,204 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import os
+import threading
+from math import log
+from time import perf_counter, sleep
+
+from classes.document_statistics import DocumentStatistics
+from classes.index_reader import IndexReader
+
+
+class Compaction:
+
+    def __init__(self, spimi, merge_factor=4, min_segment_size=2 ** 20, max_bytes_per_second=None):
+        """
+        Tiered compaction of the segments of an index (see SPIMI.construct_index()).
+
+        Every query looks up its terms in every segment, so the more segments an index has, the slower queries get.
+        Segments are grouped in tiers by size: tier 0 contains the segments smaller than merge_factor * min_segment_size,
+        tier 1 the ones up to merge_factor times bigger than that, and so on. As soon as a tier contains merge_factor
+        segments, they're merged into a single segment, which usually lands in the next tier. That way, every document
+        only gets merged about once per tier, i.e. a logarithmic number of times, instead of every time a segment is
+        added.
+
+        Segments are merged the same way block files are (see SPIMI.merge_blocks()): each segment is written out as a
+        run file, and the runs are merged into the index file of a new segment. The segment list is then replaced
+        atomically (see SPIMI.write_segments()). Indexes that were opened before keep using the segments they opened
+        (see SPIMI.get_index()), so queries always run against a consistent snapshot of the index, even while segments
+        are being merged. Files of the segments that were merged are only deleted by the next compaction, so that an
+        index which read the previous segment list can still open them.
+
+        :param spimi: SPIMI object of the index.
+        :param merge_factor: number of segments of a tier that are merged together.
+        :param min_segment_size: size (in bytes) under which all segments are in the lowest tier.
+        :param max_bytes_per_second: maximum number of bytes read per second, from the segments and then from the runs
+                                     they're written into while those are merged, so that compaction doesn't slow down
+                                     queries running at the same time too much, or None for no limit.
+        """
+        self.spimi = spimi
+        self.merge_factor = max(merge_factor, 2)
+        self.min_segment_size = min_segment_size
+        self.max_bytes_per_second = max_bytes_per_second
+        self.run_prefix = "COMPACTION"
+
+        self.lock = threading.Lock()
+        self.thread = None
+        self.bytes_read = 0
+        self.start_time = None
+
+        # number of merges done, and segment files which are no longer in the segment list
+        self.merges = 0
+        self.obsolete_files = []
+
+    def get_segment_size(self, segment):
+        """
+        :param segment: segment of the segment list.
+        :return: size (in bytes) of the index file of the segment.
+        """
+        return os.path.getsize(self.spimi.get_segment_index(self.spimi.output_directory, segment["number"]))
+
+    def get_tier(self, segment):
+        """
+        :param segment: segment of the segment list.
+        :return: tier of the segment, according to its size.
+        """
+        return int(log(max(self.get_segment_size(segment), self.min_segment_size) / self.min_segment_size, self.merge_factor))
+
+    def find_merge(self, segments):
+        """
+        Find segments to merge: the merge_factor smallest segments of the lowest tier that has enough of them.
+        :param segments: segment list (see SPIMI.read_segments()).
+        :return: list of segments to merge, or None if no tier has enough segments.
+        """
+        tiers = {}
+        for segment in segments["segments"]:
+            tiers.setdefault(self.get_tier(segment), []).append(segment)
+
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return sorted(tiers[tier], key=self.get_segment_size)[:self.merge_factor]
+        return None
+
+    def throttle(self, number_of_bytes):
+        """
+        Sleep for as long as it takes for the bytes read so far not to go over max_bytes_per_second.
+        :param number_of_bytes: number of bytes that were just read.
+        """
+        if not self.max_bytes_per_second:
+            return
+        self.bytes_read += number_of_bytes
+        ahead = self.bytes_read / self.max_bytes_per_second - (perf_counter() - self.start_time)
+        if ahead > 0:
+            sleep(ahead)
+
+    def write_run(self, segment, run_file):
+        """
+        Write the terms and postings of a segment into a run file, in the run format of the block files.
+        :param segment: segment of the segment list.
+        :param run_file: path of the run file.
+        :return: path of the run file.
+        """
+        run_format = self.spimi.run_format
+        index_reader = IndexReader(self.spimi.get_segment_index(self.spimi.output_directory, segment["number"]))
+        with run_format.open(run_file, "w") as file:
+            for term, postings_list in index_reader.items():
+                postings = run_format.encode(postings_list)
+                run_format.write(file, term, postings)
+                self.throttle(len(term) + len(postings))
+        index_reader.close()
+        return run_file
+
+    def merge_segments(self, segments, merged_segments):
+        """
+        Merge segments into a new segment, and replace them with it in the segment list.
+
+        The postings of a term are concatenated in the order of the runs they come from (see SPIMI.merge_runs()), so
+        the segments are merged in increasing order of document ID. Their documents were parsed from different files,
+        so their ranges of document IDs don't overlap, as long as document IDs are unique across Reuters files.
+
+        :param segments: segment list (see SPIMI.read_segments()).
+        :param merged_segments: list of the segments to merge.
+        :return: the new segment, or None if the ranges of document IDs of the segments overlap.
+        """
+        directory = self.spimi.output_directory
+        statistics = {segment["number"]: DocumentStatistics.read(self.spimi.get_segment_document_statistics(directory, segment["number"]))
+                      for segment in merged_segments}
+
+        def get_document_range(segment):
+            document_ids = [document_id for document_id, length in enumerate(statistics[segment["number"]].document_lengths) if length]
+            return (document_ids[0], document_ids[-1]) if document_ids else (0, 0)
+
+        merged_segments = sorted(merged_segments, key=get_document_range)
+        ranges = [get_document_range(segment) for segment in merged_segments]
+        if any(previous[1] >= following[0] for previous, following in zip(ranges, ranges[1:])):
+            print("Can't merge segments %s: their documents overlap." % ", ".join(str(segment["number"]) for segment in merged_segments))
+            return None
+
+        segment_number = max(segment["number"] for segment in segments["segments"]) + 1
+        run_files = [self.write_run(segment, "/".join([directory, "".join([self.run_prefix, str(segment["number"]), self.spimi.block_suffix])]))
+                     for segment in merged_segments]
+
+        document_statistics = DocumentStatistics.combine([statistics[segment["number"]] for segment in merged_segments])
+        document_lengths = {document_id: length for document_id, length in enumerate(document_statistics.document_lengths) if length}
+        self.spimi.merge_blocks(run_files, self.spimi.get_segment_index(directory, segment_number), document_lengths,
+                                self.throttle if self.max_bytes_per_second else None).close()
+        document_statistics.write(self.spimi.get_segment_document_statistics(directory, segment_number))
+
+        merged_segment = {
+            "number": segment_number,
+            "files": [file for segment in merged_segments for file in segment["files"]],
+            "documents": sum(segment["documents"] for segment in merged_segments)
+        }
+        numbers = {segment["number"] for segment in merged_segments}
+        position = min(position for position, segment in enumerate(segments["segments"]) if segment["number"] in numbers)
+        remaining_segments = [segment for segment in segments["segments"] if segment["number"] not in numbers]
+        remaining_segments.insert(position, merged_segment)
+
+        segments["generation"] += 1
+        segments["segments"] = remaining_segments
+        self.spimi.write_segments(self.spimi.output_segments, segments)
+
+        self.obsolete_files.extend(file for number in sorted(numbers)
+                                   for file in [self.spimi.get_segment_index(directory, number),
+                                                self.spimi.get_segment_document_statistics(directory, number)])
+        return merged_segment
+
+    def delete_obsolete_files(self):
+        """
+        Delete the files of the segments that were merged by a previous compaction.
+        """
+        while self.obsolete_files:
+            file = self.obsolete_files.pop()
+            if os.path.exists(file):
+                os.unlink(file)
+
+    def compact(self):
+        """
+        Merge segments, tier by tier, until no tier has merge_factor segments.
+        :return: number of merges done.
+        """
+        with self.lock:
+            self.delete_obsolete_files()
+            self.bytes_read = 0
+            self.start_time = perf_counter()
+
+            merges = 0
+            segments = self.spimi.read_segments(self.spimi.output_segments)
+            merged_segments = self.find_merge(segments)
+            while merged_segments and self.merge_segments(segments, merged_segments):
+                merges += 1
+                merged_segments = self.find_merge(segments)
+
+            self.merges += merges
+            return merges
+
+    def start(self):
+        """
+        Compact the index in a background thread. Queries can keep running in the meantime.
+        :return: the thread.
+        """
+        self.thread = threading.Thread(target=self.compact, daemon=True)
+        self.thread.start()
+        return self.thread
@@ -2,7 +2,7 @@
 # coding: utf-8
 
 from beautifultable import BeautifulTable
-from definitions import stopwords, ps
+from definitions import normalizer
 
 import random
 
@@ -27,7 +27,7 @@ class CompressionTable:
         self.terms_remove_150_stopwords = []
         self.terms_stemmed = []
 
-        self.stopwords = random.sample(stopwords, 150)
+        self.stopwords = random.sample(sorted(normalizer.get_stopwords()), 150)
         self.stopwords_30 = list(self.stopwords)[:30]
         self.stopwords_150 = list(self.stopwords)
 
@@ -60,7 +60,7 @@ class CompressionTable:
         Given a term, once we take out all commas & periods, if it's just a string of digits, it's considered a number.
         :return: row featuring information on index without numbers.
         """
-        self.terms_no_numbers = [term for term in self.terms if not term.replace(",", "").replace(".", "").isdigit()]
+        self.terms_no_numbers = [term for term in self.terms if not normalizer.is_number(term)]
 
         reduction_from_previous = self.get_reduction_percentage(self.terms, self.terms_no_numbers)
         total_reduction = reduction_from_previous
@@ -73,8 +73,8 @@ class CompressionTable:
         :return: row featuring information on index with all terms lowercased.
         """
         for term in self.terms_no_numbers:
-            if term.casefold() not in self.terms_case_folding:
-                self.terms_case_folding.append(term.casefold())
+            if normalizer.casefold(term) not in self.terms_case_folding:
+                self.terms_case_folding.append(normalizer.casefold(term))
 
         reduction_from_previous = self.get_reduction_percentage(self.terms_no_numbers, self.terms_case_folding)
         total_reduction = self.get_reduction_percentage(self.terms, self.terms_case_folding)
@@ -110,7 +110,7 @@ class CompressionTable:
         Stem all terms.
         :return: row featuring information on index with all terms stemmed.
         """
-        self.terms_stemmed = list(set([ps.stem(term) for term in self.terms_remove_150_stopwords]))
+        self.terms_stemmed = list(set([normalizer.stem(term) for term in self.terms_remove_150_stopwords]))
 
         reduction_from_previous = self.get_reduction_percentage(self.terms_remove_150_stopwords, self.terms_stemmed)
         total_reduction = self.get_reduction_percentage(self.terms, self.terms_stemmed)
@@ -127,3 +127,39 @@ class CompressionTable:
         """
         reduction_percentage = (len(current) - len(previous))/len(previous) * 100
         return "{0:.2f}".format(reduction_percentage)
+
+
+class IndexSizeTable:
+
+    def __init__(self, statistics):
+        """
+        Initialize the table and its headers with BeautifulTable.
+
+        :param statistics: sizes of the compressed index file and of its text equivalent (see IndexWriter.statistics).
+        """
+        self.statistics = statistics
+
+        self.table = BeautifulTable()
+        self.table.column_headers = ["", "text (bytes)", "compressed (bytes)", "∆ %"]
+
+    def generate_table(self):
+        """
+        Append table with the size of the dictionary, of the postings and of the whole index, stored as text (like
+        in a text block file) and compressed.
+        :return: table fully populated.
+        """
+        self.table.append_row(self.get_row("dictionary", self.statistics["text dictionary size"], self.statistics["dictionary size"]))
+        self.table.append_row(self.get_row("postings", self.statistics["text postings size"], self.statistics["postings size"]))
+        self.table.append_row(self.get_row("index", self.statistics["text dictionary size"] + self.statistics["text postings size"], self.statistics["index size"]))
+        return self.table
+
+    @staticmethod
+    def get_row(name, text_size, compressed_size):
+        """
+        :param name: part of the index.
+        :param text_size: size of that part as text.
+        :param compressed_size: size of that part once compressed.
+        :return: row featuring information on the size of that part of the index.
+        """
+        reduction_percentage = (compressed_size - text_size) / text_size * 100
+        return [name, "{:,}".format(text_size), "{:,}".format(compressed_size), "{0:.2f}".format(reduction_percentage)]
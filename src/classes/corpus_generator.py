@@ -0,0 +1,165 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import os
+import json
+import random
+from itertools import accumulate
+
+
+class CorpusGenerator:
+
+    syllables = ["ba", "con", "de", "ex", "fi", "gra", "in", "ker", "lo", "man", "nu", "or", "pre", "qua", "ro", "sta",
+                 "tri", "un", "ver", "wel", "zo", "al", "ter", "mi", "port", "sel", "char", "ment", "vi", "dus"]
+    suffixes = ["", "", "", "s", "ed", "ing", "er", "ly", "ation", "ness"]
+    cities = ["NEW YORK", "LONDON", "TOKYO", "WASHINGTON", "CHICAGO", "PARIS", "FRANKFURT", "SYDNEY", "TORONTO", "ZURICH"]
+    months = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+    def __init__(self, output_directory, size, vocabulary_size=50000, tokens_per_document=120,
+                 documents_per_file=1000, zipf_exponent=1.0, seed=0):
+        """
+        Generate Reuters-style SGML files out of random words, so that the indexer can be benchmarked offline, on
+        corpora of any size (from a few MB to several GB).
+
+        Files are named and laid out like the Reuters files (reut2-000.sgm, ...): every document is a REUTERS tag with a
+        NEWID attribute, whose TEXT tag contains a TITLE, a DATELINE and a BODY, with entities (&lt;, &amp;) and numeric
+        character references (&#3;), so that they go through the same code as the real ones (see SGMLReader).
+        Words are drawn with a Zipfian distribution (the n-th most frequent word appears about 1/n^s as often as the
+        most frequent one), like the words of a real corpus. Some of them are capitalized, inflected (so that stemming
+        has something to do), or numbers.
+
+        The same parameters always generate the same files. They're recorded in the directory, and files are only
+        generated again if they change (see generate()).
+
+        :param output_directory: directory in which the files will be generated.
+        :param size: size of the corpus, in bytes. Files are generated until the corpus reaches it.
+        :param vocabulary_size: number of distinct words.
+        :param tokens_per_document: average number of words per document.
+        :param documents_per_file: number of documents per file (the Reuters files have 1,000).
+        :param zipf_exponent: exponent s of the Zipfian distribution.
+        :param seed: seed of the random number generator.
+        """
+        self.output_directory = output_directory
+        self.size = size
+        self.vocabulary_size = vocabulary_size
+        self.tokens_per_document = tokens_per_document
+        self.documents_per_file = documents_per_file
+        self.zipf_exponent = zipf_exponent
+        self.seed = seed
+
+        self.parameters_file = os.path.join(self.output_directory, "corpus.json")
+        self.generator = random.Random(self.seed)
+        self.vocabulary = []
+        self.cumulative_weights = []
+
+    def get_parameters(self):
+        """
+        :return: dictionary of the parameters the corpus is generated with.
+        """
+        return {"size": self.size, "vocabulary_size": self.vocabulary_size, "tokens_per_document": self.tokens_per_document,
+                "documents_per_file": self.documents_per_file, "zipf_exponent": self.zipf_exponent, "seed": self.seed}
+
+    def generate_vocabulary(self):
+        """
+        Generate the distinct words, from the most frequent one to the least frequent one, along with the cumulative
+        weights of the Zipfian distribution they're drawn with.
+        """
+        words = set()
+        while len(words) < self.vocabulary_size:
+            word = "".join(self.generator.choices(self.syllables, k=self.generator.randint(1, 4)))
+            words.add(word + self.generator.choice(self.suffixes))
+        self.vocabulary = sorted(words)
+        self.generator.shuffle(self.vocabulary)
+        self.cumulative_weights = list(accumulate(1 / rank ** self.zipf_exponent for rank in range(1, self.vocabulary_size + 1)))
+
+    def generate_word(self, word):
+        """
+        :param word: word of the vocabulary.
+        :return: the word as it appears in the text: most of the time as it is, sometimes capitalized, or replaced by a
+                 number, an ampersand, or a company name.
+        """
+        draw = self.generator.random()
+        if draw < 0.9:
+            return word
+        if draw < 0.95:
+            return word.capitalize()
+        if draw < 0.98:
+            return self.generator.choice(["{:,}".format(self.generator.randint(1, 100000)), "%.1f" % (self.generator.random() * 100)])
+        if draw < 0.99:
+            return "&amp;"
+        return "&lt;%s&gt;" % word.upper()
+
+    def generate_document(self, document_id):
+        """
+        :param document_id: NEWID of the document.
+        :return: SGML of the document.
+        """
+        number_of_tokens = self.generator.randint(self.tokens_per_document // 2, self.tokens_per_document * 3 // 2)
+        words = [self.generate_word(word)
+                 for word in self.generator.choices(self.vocabulary, cum_weights=self.cumulative_weights, k=number_of_tokens)]
+
+        sentences = []
+        for start in range(0, len(words), 15):
+            sentence = words[start:start + 15]
+            sentence[0] = sentence[0][:1].upper() + sentence[0][1:]
+            sentences.append(" ".join(sentence) + ".")
+        title = " ".join(words[:5]).upper()
+
+        date = "%d-%s-1987 %02d:%02d:%02d.%02d" % (self.generator.randint(1, 28), self.generator.choice(self.months),
+                                                  self.generator.randint(0, 23), self.generator.randint(0, 59),
+                                                  self.generator.randint(0, 59), self.generator.randint(0, 99))
+        dateline = "%s, %s - " % (self.generator.choice(self.cities), date.split()[0].title())
+
+        return ("<REUTERS TOPICS=\"NO\" LEWISSPLIT=\"TRAIN\" CGISPLIT=\"TRAINING-SET\" OLDID=\"%d\" NEWID=\"%d\">\n"
+                "<DATE>%s</DATE>\n"
+                "<TOPICS></TOPICS>\n"
+                "<TEXT>&#2;\n"
+                "<TITLE>%s</TITLE>\n"
+                "<DATELINE>    %s</DATELINE><BODY>%s\n Reuter\n&#3;</BODY></TEXT>\n"
+                "</REUTERS>\n") % (document_id + 5000, document_id, date, title, dateline, "\n".join(sentences))
+
+    def get_files(self):
+        """
+        :return: sorted list of the paths of the generated files.
+        """
+        return sorted(os.path.join(self.output_directory, file) for file in os.listdir(self.output_directory) if file.endswith(".sgm"))
+
+    def generate(self):
+        """
+        Generate the files, unless they were already generated with the same parameters.
+        :return: sorted list of the paths of the generated files.
+        """
+        os.makedirs(self.output_directory, exist_ok=True)
+        try:
+            with open(self.parameters_file) as file:
+                if json.load(file) == self.get_parameters():
+                    return self.get_files()
+        except (OSError, ValueError):
+            pass
+
+        for file in self.get_files():
+            os.unlink(file)
+        if os.path.exists(self.parameters_file):
+            os.unlink(self.parameters_file)
+
+        self.generator.seed(self.seed)
+        self.generate_vocabulary()
+
+        corpus_size = 0
+        document_id = 0
+        file_number = 0
+        while corpus_size < self.size:
+            file = os.path.join(self.output_directory, "reut2-%03d.sgm" % file_number)
+            with open(file, "w", encoding="ISO-8859-1") as sgm_file:
+                sgm_file.write("<!DOCTYPE lewis SYSTEM \"lewis.dtd\">\n")
+                for _ in range(self.documents_per_file):
+                    document_id += 1
+                    sgm_file.write(self.generate_document(document_id))
+                    if corpus_size + sgm_file.tell() >= self.size:
+                        break
+                corpus_size += sgm_file.tell()
+            file_number += 1
+
+        with open(self.parameters_file, "w") as file:
+            json.dump(self.get_parameters(), file, indent=4)
+        return self.get_files()
@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import sys
+import struct
+from array import array
+
+
+class DocumentStatistics:
+    """
+    Statistics about the documents of an index, stored next to it, so that documents can be ranked (see BM25) without
+    parsing the Reuters files again.
+
+    The file contains a header (number of documents, number of tokens, average document length), followed by the length
+    of every document, indexed by document ID (4 bytes each, 0 for IDs without a document), in little-endian byte order.
+
+    A DocumentStatistics object can be given to BM25 in place of the Reuters object the statistics were gathered by:
+    both have document_lengths (which can be indexed by document ID) and average_document_length attributes.
+    """
+
+    magic = b"SPIMIDOC"
+    version = 1
+    # magic, version, number of documents, number of tokens, average document length
+    header = struct.Struct("<8sHIQd")
+
+    def __init__(self, document_lengths, number_of_documents, number_of_tokens):
+        """
+        :param document_lengths: array of the length of every document, indexed by document ID.
+        :param number_of_documents: number of documents.
+        :param number_of_tokens: number of tokens in all of the documents.
+        """
+        self.document_lengths = document_lengths
+        self.number_of_documents = number_of_documents
+        self.number_of_tokens = number_of_tokens
+        self.average_document_length = self.number_of_tokens / self.number_of_documents if self.number_of_documents else 0
+
+    @classmethod
+    def from_document_lengths(cls, document_lengths):
+        """
+        :param document_lengths: dictionary of document ID -> length of the document in words (see Reuters).
+        :return: DocumentStatistics of the documents.
+        """
+        lengths = array("I", bytes(4 * (max(document_lengths, default=-1) + 1)))
+        for document_id, length in document_lengths.items():
+            lengths[document_id] = length
+        return cls(lengths, len(document_lengths), sum(document_lengths.values()))
+
+    @classmethod
+    def combine(cls, statistics):
+        """
+        Combine the statistics of several sets of documents, with different document IDs (e.g. segments of an index).
+        :param statistics: list of DocumentStatistics.
+        :return: DocumentStatistics of all of the documents.
+        """
+        lengths = array("I", bytes(4 * max((len(document_statistics.document_lengths) for document_statistics in statistics), default=0)))
+        for document_statistics in statistics:
+            for document_id, length in enumerate(document_statistics.document_lengths):
+                if length:
+                    lengths[document_id] = length
+        return cls(lengths, sum(document_statistics.number_of_documents for document_statistics in statistics),
+                   sum(document_statistics.number_of_tokens for document_statistics in statistics))
+
+    @classmethod
+    def read(cls, statistics_file):
+        """
+        Load a file written by write().
+        :param statistics_file: path of the file.
+        :return: DocumentStatistics stored in the file.
+        """
+        with open(statistics_file, "rb") as file:
+            data = file.read()
+
+        magic, version, number_of_documents, number_of_tokens, _ = cls.header.unpack_from(data)
+        if magic != cls.magic or version != cls.version:
+            raise ValueError("%s is not a document statistics file of version %d." % (statistics_file, cls.version))
+
+        lengths = array("I", data[cls.header.size:])
+        if sys.byteorder == "big":
+            lengths.byteswap()
+        return cls(lengths, number_of_documents, number_of_tokens)
+
+    def write(self, statistics_file):
+        """
+        :param statistics_file: path of the file.
+        """
+        lengths = array("I", self.document_lengths)
+        if sys.byteorder == "big":
+            lengths.byteswap()
+
+        with open(statistics_file, "wb") as file:
+            file.write(self.header.pack(self.magic, self.version, self.number_of_documents, self.number_of_tokens,
+                                        self.average_document_length))
+            file.write(lengths.tobytes())
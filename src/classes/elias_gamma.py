@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+
+class EliasGamma:
+    """
+    Elias gamma encoding of positive integers.
+
+    A number is encoded as its length followed by its offset. The offset is the number in binary, with the leading 1
+    chopped off. The length is the length of the offset, in unary (that many 1s, followed by a 0).
+    For example, 13 (1101 in binary) has an offset of 101 and a length of 1110, so it is encoded as 1110101.
+
+    Codes are packed one after the other, and the last byte is padded with 1s. Since a run of 1s that isn't followed by a
+    0 is never a complete code, the padding is never mistaken for a number.
+
+    This information has been taken from the textbook:
+        - An Introduction to Information Retrieval (section 5.3.2), by:
+            Christopher D. Manning, Prabhakar Raghavan, and Hinrich Schütze
+    """
+
+    @staticmethod
+    def encode(numbers):
+        """
+        Encode a list of numbers, one after the other.
+        :param numbers: list of positive integers.
+        :return: bytes representing the numbers.
+        """
+        codes = []
+        for number in numbers:
+            offset = bin(number)[3:]
+            codes.append("1" * len(offset) + "0" + offset)
+        bits = "".join(codes)
+        bits += "1" * (-len(bits) % 8)
+
+        if not bits:
+            return b""
+        return int(bits, 2).to_bytes(len(bits) // 8, "big")
+
+    @staticmethod
+    def decode(data, start=0, end=None, count=None):
+        """
+        Decode the numbers found in a sequence of bytes.
+        :param data: bytes-like object containing gamma encoded numbers.
+        :param start: offset of the first byte to decode.
+        :param end: offset right after the last byte to decode (defaults to the end of data).
+        :param count: maximum number of numbers to decode (defaults to all of them).
+        :return: list of decoded numbers.
+        """
+        data = data[start:end]
+        if not data:
+            return []
+        bits = bin(int.from_bytes(data, "big"))[2:].zfill(len(data) * 8)
+
+        numbers = []
+        append = numbers.append
+        find = bits.find
+        position = 0
+        while count is None or len(numbers) < count:
+            zero = find("0", position)
+            if zero == -1:
+                break
+            position = 2 * zero - position + 1
+            append(int("1" + bits[zero + 1:position], 2))
+        return numbers
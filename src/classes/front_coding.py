@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from os.path import commonprefix
+
+from classes.variable_byte import VariableByte
+
+
+class FrontCoding:
+    """
+    Front coding of a block of sorted terms.
+
+    Consecutive terms in a sorted list often share a common prefix. The first term of a block is stored in full, and
+    every term after it only stores the length of the prefix it shares with the term before it, followed by the rest
+    of the term. For example, "automata", "automate", "automatic" and "automation" become:
+        8 automata | 7 1 e | 7 2 ic | 8 2 on
+    with every length stored using variable byte encoding.
+
+    This information has been taken from the textbook:
+        - An Introduction to Information Retrieval (section 5.2.2), by:
+            Christopher D. Manning, Prabhakar Raghavan, and Hinrich Schütze
+    """
+
+    @staticmethod
+    def encode(terms):
+        """
+        Front code a block of terms.
+        :param terms: sorted list of UTF-8 encoded terms (bytes).
+        :return: bytes representing the block.
+        """
+        encoded = [VariableByte.encode_number(len(terms[0])), terms[0]]
+        previous = terms[0]
+        for term in terms[1:]:
+            prefix_length = len(commonprefix([previous, term]))
+            encoded.append(VariableByte.encode([prefix_length, len(term) - prefix_length]))
+            encoded.append(term[prefix_length:])
+            previous = term
+        return b"".join(encoded)
+
+    @staticmethod
+    def decode(data, offset, count):
+        """
+        Decode a front coded block of terms.
+        :param data: bytes-like object containing the block.
+        :param offset: offset of the first byte of the block.
+        :param count: number of terms in the block.
+        :return: list of UTF-8 encoded terms (bytes).
+        """
+        length, offset = VariableByte.decode_number(data, offset)
+        term = bytes(data[offset:offset + length])
+        offset += length
+        terms = [term]
+
+        for _ in range(count - 1):
+            prefix_length, offset = VariableByte.decode_number(data, offset)
+            length, offset = VariableByte.decode_number(data, offset)
+            term = term[:prefix_length] + bytes(data[offset:offset + length])
+            offset += length
+            terms.append(term)
+
+        return terms
+
+    @staticmethod
+    def decode_first(data, offset):
+        """
+        Decode only the first term of a front coded block, which is stored in full.
+        :param data: bytes-like object containing the block.
+        :param offset: offset of the first byte of the block.
+        :return: UTF-8 encoded term (bytes).
+        """
+        length, offset = VariableByte.decode_number(data, offset)
+        return bytes(data[offset:offset + length])
@@ -0,0 +1,193 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import sys
+import mmap
+from array import array
+from itertools import accumulate
+from collections.abc import Mapping
+
+from classes.index_writer import IndexWriter
+from classes.front_coding import FrontCoding
+from classes.lru_cache import LRUCache
+
+
+class IndexReader(Mapping):
+
+    # position of a term that hasn't been looked up (None means that it isn't in the index)
+    unknown = object()
+
+    def __init__(self, index_file, term_cache_size=2 ** 16):
+        """
+        Read an index file written by IndexWriter, lazily.
+
+        The file is memory-mapped, and nothing but its header is read upfront. The pointers at the end of the file are
+        used in place, so opening an index takes about the same time no matter how big it is.
+        When a term is looked up, the dictionary is binary searched (see get_term_number()), and only that term's
+        postings are decoded. The positions of the terms looked up the most recently are kept (see LRUCache), but not
+        their postings, which are decoded again every time: keeping them is up to CachedIndex, which bounds how many
+        are kept. So memory doesn't grow with the number of terms looked up, or with the size of the index.
+
+        An IndexReader can be used like the dictionary returned by SPIMI.get_index() used to be: index[term] returns the
+        term's postings list, as a list of tuples of (document ID, term frequency), and raises a KeyError if the term
+        isn't in the index. The document frequency of a term is stored next to it, see get_document_frequency().
+
+        :param index_file: path of the index file.
+        :param term_cache_size: maximum number of positions of terms kept.
+        """
+        self.index_file = index_file
+        with open(self.index_file, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, codec_id, self.block_size, self.number_of_terms, self.dictionary_offset, term_pointers_offset,
+         document_frequencies_offset, max_term_frequencies_offset, min_document_lengths_offset,
+         postings_pointers_offset) = IndexWriter.header.unpack_from(self.data)
+
+        if magic != IndexWriter.magic or version != IndexWriter.version:
+            self.data.close()
+            raise ValueError("%s is not an index file of version %d." % (self.index_file, IndexWriter.version))
+
+        codec_name = {codec_id: codec_name for codec_name, codec_id in IndexWriter.codec_ids.items()}[codec_id]
+        self.codec = IndexWriter.codecs[codec_name]
+
+        self.term_pointers = self.read_array("I", term_pointers_offset, document_frequencies_offset)
+        self.document_frequencies = self.read_array("I", document_frequencies_offset, max_term_frequencies_offset)
+        self.max_term_frequencies = self.read_array("I", max_term_frequencies_offset, min_document_lengths_offset)
+        self.min_document_lengths = self.read_array("I", min_document_lengths_offset, postings_pointers_offset)
+        self.postings_pointers = self.read_array("Q", postings_pointers_offset, len(self.data))
+
+        # lexicon of the terms looked up the most recently (term -> position in the dictionary, or None if it isn't there)
+        self.term_numbers = LRUCache(term_cache_size)
+
+    def read_array(self, typecode, start, end):
+        """
+        Read one of the sections of pointers stored at the end of the index file.
+        On little-endian machines, the section is used in place, without being copied.
+        :param typecode: type of the values in the section (see the array module).
+        :param start: offset of the section.
+        :param end: offset right after the section.
+        :return: memoryview (or array, on big-endian machines) of the values.
+        """
+        if sys.byteorder == "little":
+            return memoryview(self.data)[start:end].cast(typecode)
+        values = array(typecode, self.data[start:end])
+        values.byteswap()
+        return values
+
+    def close(self):
+        """
+        Unmap the index file.
+        """
+        for pointers in [self.term_pointers, self.document_frequencies, self.max_term_frequencies, self.min_document_lengths,
+                         self.postings_pointers]:
+            if isinstance(pointers, memoryview):
+                pointers.release()
+        self.data.close()
+
+    def get_block(self, block_number):
+        """
+        Decode a block of the dictionary.
+        :param block_number: position of the block in the dictionary.
+        :return: list of UTF-8 encoded terms (bytes) in the block.
+        """
+        count = min(self.block_size, self.number_of_terms - block_number * self.block_size)
+        return FrontCoding.decode(self.data, self.dictionary_offset + self.term_pointers[block_number], count)
+
+    def get_term_number(self, term):
+        """
+        Find the position of a term in the dictionary.
+        First, binary search the blocks, using their first term (which is stored in full), to find the only block that
+        could contain the term. Then, decode that block and look for the term in it.
+        :param term: the term.
+        :return: position of the term in the dictionary, or None if it isn't in the index.
+        """
+        term_number = self.term_numbers.get(term, self.unknown)
+        if term_number is not self.unknown:
+            return term_number
+
+        term_number = None
+        encoded_term = term.encode("utf-8")
+
+        if self.number_of_terms:
+            low, high = 0, len(self.term_pointers) - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if FrontCoding.decode_first(self.data, self.dictionary_offset + self.term_pointers[middle]) <= encoded_term:
+                    low = middle
+                else:
+                    high = middle - 1
+
+            block = self.get_block(low)
+            if encoded_term in block:
+                term_number = low * self.block_size + block.index(encoded_term)
+
+        self.term_numbers.put(term, term_number)
+        return term_number
+
+    def get_terms(self):
+        """
+        Decode the dictionary, block by block.
+        :return: generator of the terms of the index, in alphabetical order.
+        """
+        for block_number in range(len(self.term_pointers)):
+            for term in self.get_block(block_number):
+                yield term.decode("utf-8")
+
+    def get_postings_list(self, term_number):
+        """
+        Decode the postings of a term.
+        :param term_number: position of the term in the dictionary.
+        :return: list of tuples of (document ID, term frequency), sorted by document ID.
+        """
+        document_frequency = self.document_frequencies[term_number]
+        numbers = self.codec.decode(self.data, self.postings_pointers[term_number], self.postings_pointers[term_number + 1],
+                                    2 * document_frequency)
+
+        return [(document_id - 1, term_frequency)
+                for document_id, term_frequency in zip(accumulate(numbers[:document_frequency]), numbers[document_frequency:])]
+
+    def get_document_frequency(self, term):
+        """
+        Get the number of documents a term appears in, without decoding its postings.
+        :param term: the term.
+        :return: the term's document frequency, or 0 if it isn't in the index.
+        """
+        term_number = self.get_term_number(term)
+        if term_number is None:
+            return 0
+        return self.document_frequencies[term_number]
+
+    def get_term_bounds(self, term):
+        """
+        Get the highest term frequency of a term, and the length of the shortest document it appears in, without
+        decoding its postings. Used to bound the score of the term (see BM25.top_k()).
+        :param term: the term.
+        :return: tuple of (maximum term frequency, minimum document length), or (0, 0) if it isn't in the index.
+        """
+        term_number = self.get_term_number(term)
+        if term_number is None:
+            return 0, 0
+        return self.max_term_frequencies[term_number], self.min_document_lengths[term_number]
+
+    def __getitem__(self, term):
+        term_number = self.get_term_number(term)
+        if term_number is None:
+            raise KeyError(term)
+        return self.get_postings_list(term_number)
+
+    def __contains__(self, term):
+        return self.get_term_number(term) is not None
+
+    def __iter__(self):
+        return self.get_terms()
+
+    def __len__(self):
+        return self.number_of_terms
+
+    def items(self):
+        """
+        Decode the whole index, term by term, without keeping the decoded postings lists.
+        :return: generator of tuples of (term, postings list), in alphabetical order.
+        """
+        for term_number, term in enumerate(self.get_terms()):
+            yield term, self.get_postings_list(term_number)
@@ -0,0 +1,213 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import sys
+import struct
+from array import array
+
+from classes.variable_byte import VariableByte
+from classes.elias_gamma import EliasGamma
+from classes.front_coding import FrontCoding
+
+
+class IndexWriter:
+    """
+    Write the final inverted index in a compressed binary format, one term at a time, in alphabetical order.
+
+    The index file is made of the following sections:
+        - header: format version, postings codec, block size, number of terms, and offsets of the sections below.
+        - postings: for every term, the gaps between its document IDs (the first gap being the document ID plus one,
+          so that no gap is ever 0), followed by the term frequency in each of those documents. They are encoded with
+          either variable byte or Elias gamma encoding, and every term's postings start on a new byte.
+        - dictionary: the terms, as a single string split into blocks of block_size terms, every block being front
+          coded (see FrontCoding).
+        - term pointers: offset of every block in the dictionary (4 bytes each).
+        - document frequencies: number of documents every term appears in (4 bytes each).
+        - maximum term frequencies: highest term frequency in every term's postings (4 bytes each).
+        - minimum document lengths: length of the shortest document in every term's postings (4 bytes each), or 0 if
+          document lengths weren't known when the index was written.
+        - postings pointers: offset of every term's postings in the file (8 bytes each), plus one offset marking the
+          end of the last term's postings.
+    The header and the last five sections are stored in little-endian byte order.
+
+    Finding a single term only requires a binary search on the first terms of the blocks, and decoding its postings
+    only requires reading the bytes between its postings pointer and the next one.
+    The maximum term frequency and minimum document length of a term are enough to bound the score any document can
+    get from it, with ranking functions such as BM25, without decoding its postings (see BM25.top_k()).
+    """
+
+    magic = b"SPIMIIDX"
+    version = 2
+    # magic, version, codec, block size, number of terms,
+    # offsets of: dictionary, term pointers, document frequencies, maximum term frequencies, minimum document lengths,
+    # postings pointers
+    header = struct.Struct("<8sHBBIQQQQQQ")
+    codecs = {"vb": VariableByte, "gamma": EliasGamma}
+    codec_ids = {"vb": 0, "gamma": 1}
+    copy_buffer_size = 2 ** 20
+    suffix = ".bin"
+
+    def __init__(self, output_index, codec="vb", block_size=8, document_lengths=None):
+        """
+        Open the index file and leave room for its header, which is written once every term has been added.
+        :param output_index: path of the index file.
+        :param codec: encoding of the postings, either "vb" (variable byte) or "gamma" (Elias gamma).
+        :param block_size: number of terms per front coded block of the dictionary.
+        :param document_lengths: dictionary of document ID -> length of the document in words, used to store the
+                                 minimum document length of every term.
+        """
+        self.output_index = output_index
+        self.document_lengths = document_lengths or {}
+        self.codec_name = codec
+        self.codec = self.codecs[codec]
+        self.block_size = block_size
+
+        self.file = open(self.output_index, "wb")
+        self.file.write(bytes(self.header.size))
+        self.position = self.header.size
+
+        self.dictionary = bytearray()
+        self.block = []
+        self.term_pointers = array("I")
+        self.document_frequencies = array("I")
+        self.max_term_frequencies = array("I")
+        self.min_document_lengths = array("I")
+        self.postings_pointers = array("Q")
+
+        # sizes (in bytes) used to report how much was saved compared to an index stored as text, with every line
+        # containing a term followed by its postings as pairs of document ID and term frequency (e.g. "oil 3:1 5:2")
+        self.statistics = {
+            "terms": 0,
+            "postings": 0,
+            "text dictionary size": 0,
+            "text postings size": 0,
+            "dictionary size": 0,
+            "postings size": 0,
+            "index size": 0
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, term, postings_list):
+        """
+        Add a term and its postings to the index. Terms have to be added in alphabetical order.
+        :param term: the term.
+        :param postings_list: list of tuples of (document ID, term frequency), sorted by document ID.
+        """
+        previous = -1
+        gaps = []
+        term_frequencies = []
+        for document_id, term_frequency in postings_list:
+            gaps.append(document_id - previous)
+            term_frequencies.append(term_frequency)
+            previous = document_id
+
+        postings = self.codec.encode(gaps + term_frequencies)
+        self.postings_pointers.append(self.position)
+        self.document_frequencies.append(len(postings_list))
+        self.max_term_frequencies.append(max(term_frequencies, default=0))
+        self.min_document_lengths.append(min([self.document_lengths.get(document_id, 0) for document_id, _ in postings_list], default=0))
+        self.file.write(postings)
+        self.position += len(postings)
+
+        self.add_to_dictionary(term)
+
+        self.statistics["postings"] += len(postings_list)
+        self.statistics["text postings size"] += sum(map(len, map(str, gaps + term_frequencies))) + len(postings_list) * 2
+
+    def add_to_dictionary(self, term):
+        """
+        Add a term to the block of terms waiting to be added to the dictionary.
+        :param term: the term.
+        """
+        term = term.encode("utf-8")
+        self.block.append(term)
+        if len(self.block) == self.block_size:
+            self.write_dictionary_block()
+
+        self.statistics["terms"] += 1
+        self.statistics["text dictionary size"] += len(term) + 1
+
+    def append_index(self, index_reader, statistics=None):
+        """
+        Add all of the terms of another index file, written with the same codec, after the terms added so far.
+        All of its terms must come after the terms added so far, alphabetically.
+
+        The postings section of the other index is copied as is, since the postings of a term don't depend on where
+        they're stored. Only its pointers are shifted, and its terms are front coded again, along with ours.
+
+        :param index_reader: IndexReader of the other index file.
+        :param statistics: statistics of the IndexWriter that wrote the other index file, if they're available.
+        """
+        if index_reader.codec is not self.codec:
+            raise ValueError("%s wasn't written with the %s codec." % (index_reader.index_file, self.codec_name))
+
+        start = index_reader.postings_pointers[0]
+        end = index_reader.postings_pointers[len(index_reader.postings_pointers) - 1]
+        shift = self.position - start
+
+        for term_number, term in enumerate(index_reader.get_terms()):
+            self.postings_pointers.append(index_reader.postings_pointers[term_number] + shift)
+            self.document_frequencies.append(index_reader.document_frequencies[term_number])
+            self.max_term_frequencies.append(index_reader.max_term_frequencies[term_number])
+            self.min_document_lengths.append(index_reader.min_document_lengths[term_number])
+            self.add_to_dictionary(term)
+
+        for offset in range(start, end, self.copy_buffer_size):
+            self.file.write(index_reader.data[offset:min(offset + self.copy_buffer_size, end)])
+        self.position += end - start
+
+        if statistics:
+            self.statistics["postings"] += statistics["postings"]
+            self.statistics["text postings size"] += statistics["text postings size"]
+
+    def write_dictionary_block(self):
+        """
+        Front code the terms waiting to be added to the dictionary, and append them to it as a new block.
+        """
+        if self.block:
+            self.term_pointers.append(len(self.dictionary))
+            self.dictionary += FrontCoding.encode(self.block)
+            self.block = []
+
+    def close(self):
+        """
+        Write the dictionary and the pointers after the postings, then go back to the start of the file to write the
+        header.
+        """
+        if self.file.closed:
+            return
+
+        self.write_dictionary_block()
+        self.postings_pointers.append(self.position)
+
+        dictionary_offset = self.position
+        term_pointers_offset = dictionary_offset + len(self.dictionary)
+        document_frequencies_offset = term_pointers_offset + len(self.term_pointers) * self.term_pointers.itemsize
+        max_term_frequencies_offset = document_frequencies_offset + len(self.document_frequencies) * self.document_frequencies.itemsize
+        min_document_lengths_offset = max_term_frequencies_offset + len(self.max_term_frequencies) * self.max_term_frequencies.itemsize
+        postings_pointers_offset = min_document_lengths_offset + len(self.min_document_lengths) * self.min_document_lengths.itemsize
+
+        self.file.write(self.dictionary)
+        for pointers in [self.term_pointers, self.document_frequencies, self.max_term_frequencies, self.min_document_lengths,
+                         self.postings_pointers]:
+            if sys.byteorder == "big":
+                pointers.byteswap()
+            self.file.write(pointers.tobytes())
+        index_size = self.file.tell()
+
+        self.file.seek(0)
+        self.file.write(self.header.pack(
+            self.magic, self.version, self.codec_ids[self.codec_name], self.block_size, len(self.document_frequencies),
+            dictionary_offset, term_pointers_offset, document_frequencies_offset, max_term_frequencies_offset,
+            min_document_lengths_offset, postings_pointers_offset
+        ))
+        self.file.close()
+
+        self.statistics["postings size"] = dictionary_offset - self.header.size
+        self.statistics["dictionary size"] = index_size - dictionary_offset
+        self.statistics["index size"] = index_size
@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+
+    def __init__(self, maxsize=1024):
+        """
+        Least recently used cache of at most maxsize entries, with explicit keys.
+
+        functools.lru_cache memoizes a function on its arguments, which doesn't work when the key of an entry (e.g. the
+        normalized terms of a query) isn't what the value is computed from (the query itself). Entries are kept in order
+        of use: a hit moves its entry to the end, and the entry at the start is evicted once the cache is full.
+        The cache can be shared between threads.
+
+        :param maxsize: maximum number of entries.
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        :param key: key of the entry.
+        :param default: value returned if there's no such entry.
+        :return: value of the entry, or default.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """
+        Add an entry, evicting the least recently used one if the cache is full.
+        :param key: key of the entry.
+        :param value: value of the entry.
+        """
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove every entry. Hits and misses are kept.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def get_statistics(self):
+        """
+        :return: tuple of (hits, misses, hit rate).
+        """
+        return self.hits, self.misses, self.hits / (self.hits + self.misses) if self.hits + self.misses else 0
+
+    def __len__(self):
+        return len(self.entries)
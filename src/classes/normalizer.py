@@ -0,0 +1,143 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from functools import lru_cache
+
+
+class Normalizer:
+
+    def __init__(self, load_stemmer, load_stopwords, cache_size=2 ** 18):
+        """
+        Normalization of terms (stemming, case folding, stopword and number checks), shared by the indexer and the
+        queries.
+
+        A corpus uses the same few thousand words over and over, so the result of every operation is memoized, in a
+        least recently used cache of at most cache_size terms. Stemming is by far the most expensive of them: the Porter
+        stemmer goes through several rounds of suffix rules for every word, where a cache hit is a single lookup.
+        The results are the exact same as calling the operations directly.
+
+        The stemmer and the stopwords are only loaded the first time a term is stemmed, or checked against them.
+
+        :param load_stemmer: function returning a stemmer whose stem() method stems a term (e.g. nltk's PorterStemmer).
+        :param load_stopwords: function returning the set of stopwords, in lowercase.
+        :param cache_size: maximum number of terms memoized per operation.
+        """
+        self.load_stemmer = load_stemmer
+        self.load_stopwords = load_stopwords
+        self.stemmer = None
+        self.stopwords = None
+        self.cache_size = cache_size
+
+        self.stem = lru_cache(maxsize=cache_size)(self.stem_term)
+        self.casefold = lru_cache(maxsize=cache_size)(str.casefold)
+        self.is_stopword = lru_cache(maxsize=cache_size)(self.check_stopword)
+        self.is_number = lru_cache(maxsize=cache_size)(self.check_number)
+
+        # every combination of operations used by normalize() (options -> memoized function normalizing one term)
+        self.pipelines = {}
+
+    def get_stemmer(self):
+        """
+        :return: the stemmer, loaded if it wasn't yet.
+        """
+        if self.stemmer is None:
+            self.stemmer = self.load_stemmer()
+        return self.stemmer
+
+    def get_stopwords(self):
+        """
+        :return: the set of stopwords, loaded if it wasn't yet.
+        """
+        if self.stopwords is None:
+            self.stopwords = self.load_stopwords()
+        return self.stopwords
+
+    def stem_term(self, term):
+        """
+        :param term: the term.
+        :return: the stem of the term.
+        """
+        return self.get_stemmer().stem(term)
+
+    def check_stopword(self, term):
+        """
+        :param term: the term.
+        :return: True if the term, in lowercase, is a stopword.
+        """
+        return term.lower() in self.get_stopwords()
+
+    @staticmethod
+    def check_number(term):
+        """
+        Given a term, once we take out all commas & periods, if it's just a string of digits, it's considered a number.
+        :param term: the term.
+        :return: True if the term is a number.
+        """
+        return term.replace(",", "").replace(".", "").isdigit()
+
+    def get_pipeline(self, remove_stopwords=False, stem=False, case_folding=False, remove_numbers=False):
+        """
+        Get a function which normalizes a single term, going through the operations in the same order as Reuters used
+        to on a whole list of terms: remove stopwords, stem, case fold, remove numbers.
+        The function is memoized too, so a term that was already normalized with the same options costs one lookup.
+        :param remove_stopwords: will we remove stopwords?
+        :param stem: will we stem the terms?
+        :param case_folding: will we lower terms to their lowercase variant?
+        :param remove_numbers: will we remove terms that are just numbers?
+        :return: function taking a term, and returning its normalized version, or None if the term is removed.
+        """
+        options = (remove_stopwords, stem, case_folding, remove_numbers)
+        if options not in self.pipelines:
+
+            def normalize_term(term):
+                if remove_stopwords and self.is_stopword(term):
+                    return None
+                if stem:
+                    term = self.stem(term)
+                if case_folding:
+                    term = self.casefold(term)
+                if remove_numbers and self.is_number(term):
+                    return None
+                return term
+
+            self.pipelines[options] = lru_cache(maxsize=self.cache_size)(normalize_term)
+        return self.pipelines[options]
+
+    def normalize(self, terms, remove_stopwords=False, stem=False, case_folding=False, remove_numbers=False):
+        """
+        Normalize a whole batch of terms (e.g. the tokens of a document) at once: every term goes through all of the
+        operations in a single pass, instead of the batch going through one operation at a time.
+        :param terms: list of terms.
+        :param remove_stopwords: will we remove stopwords?
+        :param stem: will we stem the terms?
+        :param case_folding: will we lower terms to their lowercase variant?
+        :param remove_numbers: will we remove terms that are just numbers?
+        :return: list of normalized terms, in the same order, without the terms that were removed.
+        """
+        normalize_term = self.get_pipeline(remove_stopwords, stem, case_folding, remove_numbers)
+        return [term for term in map(normalize_term, terms) if term is not None]
+
+    def get_statistics(self):
+        """
+        :return: dictionary of operation name -> tuple of (hits, misses, hit rate) of its cache.
+        """
+        caches = {"stem": self.stem, "casefold": self.casefold, "stopword": self.is_stopword, "number": self.is_number}
+        caches.update({"pipeline " + ("/".join(option for option, used in zip(["rs", "s", "c", "rn"], options) if used) or "none"): pipeline
+                       for options, pipeline in self.pipelines.items()})
+
+        statistics = {}
+        for name, cache in caches.items():
+            hits, misses = cache.cache_info()[:2]
+            statistics[name] = (hits, misses, hits / (hits + misses) if hits + misses else 0)
+        return statistics
+
+    def print_statistics(self):
+        """
+        Print the hit rate of every cache that was used.
+        """
+        print("Normalization cache hit rates:")
+        for name, (hits, misses, hit_rate) in self.get_statistics().items():
+            if hits + misses:
+                print("    %s: %s%% (%s hits, %s misses)"
+                      % (name, "{:.2f}".format(hit_rate * 100), "{:,}".format(hits), "{:,}".format(misses)))
+        print()
@@ -0,0 +1,353 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import json
+import threading
+import tracemalloc
+from time import perf_counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Profiler:
+
+    def __init__(self, enabled=True, cprofile=False, trace_memory=False):
+        """
+        Record where the time goes while the index is constructed and queried.
+
+        Phases are timed explicitly (see phase(), start_phase() and stop_phase()), and can be nested: the inversion is
+        a phase, and so is every block written during it. For each phase, the following is recorded:
+            - wall time, and CPU time (of this process, and of the worker processes that finished during the phase).
+            - peak resident set size of the process so far.
+            - bytes read and written by the process (from /proc/self/io, if there's one), unless the phase knows exactly
+              how many bytes of which files it read and wrote (e.g. a merge pass).
+            - any counter the phase is given (documents, tokens, ...), along with the number of tokens per second.
+        Stages are the steps that are repeated over and over within a phase, such as tokenizing a document, or fetching
+        a postings list. Their time is added up (see add_time()), along with the number of times they ran. Within a
+        scope (see scope()), such as a query, stages are added up separately, so that the time left over by the other
+        stages can be attributed to a stage of its own.
+
+        Optional hooks cover the rest:
+            - cprofile: run cProfile for the whole session, to find the functions the time goes to within a stage.
+            - trace_memory: trace allocations with tracemalloc, to record the peak memory allocated by Python objects
+              during every phase, and the lines that allocated the most.
+        Both slow everything down, so timings are only comparable between runs with the same hooks.
+
+        A disabled profiler records nothing, so that code can be profiled without checking whether it should be.
+        Profilers sent to worker processes are disabled: what happens in them is only seen through the CPU time.
+
+        :param enabled: record anything at all?
+        :param cprofile: run cProfile.
+        :param trace_memory: trace allocations with tracemalloc.
+        """
+        self.enabled = enabled
+        self.cprofile = cprofile and enabled
+        self.trace_memory = trace_memory and enabled
+
+        self.phases = []
+        self.number_of_phases = 0
+        self.stages = {}
+        self.lock = threading.Lock()
+        # stack of the phases being timed, and stages of the current scope, of every thread
+        self.local = threading.local()
+
+        self.profile = None
+        self.start_time = None
+        self.total_time = 0
+
+    def __reduce__(self):
+        return Profiler, (False,)
+
+    def start(self):
+        """
+        Start the hooks, if any.
+        """
+        self.start_time = perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.cprofile:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        """
+        Stop the hooks, if any.
+        """
+        if self.profile:
+            self.profile.disable()
+        if self.start_time is not None:
+            self.total_time = perf_counter() - self.start_time
+
+    @staticmethod
+    def get_io_counters():
+        """
+        :return: tuple of (bytes read, bytes written) by the process so far, or (None, None) if it isn't known.
+        """
+        try:
+            with open("/proc/self/io") as file:
+                counters = dict(line.split(":") for line in file)
+            return int(counters["rchar"]), int(counters["wchar"])
+        except (OSError, KeyError, ValueError):
+            return None, None
+
+    @staticmethod
+    def get_peak_rss():
+        """
+        :return: peak resident set size of the process, in bytes, or None if it isn't known.
+        """
+        if resource is None:
+            return None
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes everywhere but on macOS
+        return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+    @staticmethod
+    def get_cpu_time():
+        """
+        :return: CPU time of the process, and of its worker processes that finished, in seconds.
+        """
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def get_stack(self):
+        """
+        :return: stack of the phases being timed by this thread.
+        """
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def start_phase(self, name):
+        """
+        Start timing a phase. Every phase that's started has to be stopped (see stop_phase()), or discarded.
+        :param name: name of the phase.
+        :return: record of the phase, to be given to stop_phase().
+        """
+        record = {"name": name}
+        if not self.enabled:
+            return record
+
+        stack = self.get_stack()
+        with self.lock:
+            self.number_of_phases += 1
+            record["id"] = self.number_of_phases
+        record["parent"] = stack[-1]["id"] if stack else None
+        if self.trace_memory:
+            # the peak of the enclosing phase so far is kept, before the peak starts over for this one
+            if stack:
+                stack[-1]["traced_peak"] = max(stack[-1]["traced_peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            record["traced_peak"] = 0
+        stack.append(record)
+
+        record["_io"] = self.get_io_counters()
+        record["_cpu"] = self.get_cpu_time()
+        record["_wall"] = perf_counter()
+        return record
+
+    def stop_phase(self, record, discard=False, **counters):
+        """
+        Stop timing a phase, and keep its record.
+        :param record: record of the phase (see start_phase()).
+        :param discard: forget about the phase instead, e.g. if it turned out to be empty.
+        :param counters: counters of the phase, such as documents, tokens, bytes_read, or bytes_written (which then
+                         replace the ones of the process).
+        :return: the record.
+        """
+        if not self.enabled:
+            return record
+
+        wall_time = perf_counter() - record.pop("_wall")
+        cpu_time = self.get_cpu_time() - record.pop("_cpu")
+        bytes_read, bytes_written = record.pop("_io")
+
+        stack = self.get_stack()
+        stack.remove(record)
+        if discard:
+            return record
+
+        record["wall_time"] = wall_time
+        record["cpu_time"] = cpu_time
+        record["peak_rss"] = self.get_peak_rss()
+        if bytes_read is not None:
+            record["bytes_read"], record["bytes_written"] = [after - before for before, after in zip((bytes_read, bytes_written), self.get_io_counters())]
+        record.update(counters)
+        if "tokens" in record:
+            record["tokens_per_second"] = record["tokens"] / wall_time if wall_time else 0
+
+        if self.trace_memory:
+            record["traced_peak"] = max(record["traced_peak"], tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1]["traced_peak"] = max(stack[-1]["traced_peak"], record["traced_peak"])
+
+        with self.lock:
+            self.phases.append(record)
+        return record
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase (see start_phase() and stop_phase()).
+        :param name: name of the phase.
+        :return: dictionary of the counters of the phase, to be filled in by the phase.
+        """
+        record = self.start_phase(name)
+        counters = {}
+        try:
+            yield counters
+        finally:
+            self.stop_phase(record, **counters)
+
+    def add_time(self, stage, seconds, calls=1):
+        """
+        Add time to a stage, in the current scope if there's one (see scope()).
+        :param stage: name of the stage.
+        :param seconds: time it took.
+        :param calls: number of times it ran.
+        """
+        if not self.enabled:
+            return
+        stages = getattr(self.local, "scope", None)
+        if stages is not None:
+            totals = stages.setdefault(stage, [0, 0])
+            totals[0] += calls
+            totals[1] += seconds
+            return
+        with self.lock:
+            totals = self.stages.setdefault(stage, [0, 0])
+            totals[0] += calls
+            totals[1] += seconds
+
+    @contextmanager
+    def scope(self, name, remainder=None):
+        """
+        Add up the stages that run within a scope (e.g. a query) on their own, then add them to the stages of the
+        profiler, prefixed by the name of the scope. The total time of the scope is added as a stage too.
+        :param name: name of the scope, e.g. the type of query.
+        :param remainder: name of the stage to which the time of the scope that isn't spent in any other stage is added.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        previous_stages = getattr(self.local, "scope", None)
+        self.local.scope = stages = {}
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            total_time = perf_counter() - start
+            self.local.scope = previous_stages
+            if remainder:
+                stages[remainder] = [1, total_time - sum(seconds for _, seconds in stages.values())]
+            stages["total"] = [1, total_time]
+            for stage, (calls, seconds) in stages.items():
+                self.add_time("%s: %s" % (name, stage), seconds, calls)
+
+    def time_function(self, stage, function):
+        """
+        :param stage: name of the stage.
+        :param function: function to time.
+        :return: function which does the same, adding the time every call takes to the stage.
+        """
+        if not self.enabled:
+            return function
+
+        def timed_function(*arguments, **keyword_arguments):
+            start = perf_counter()
+            try:
+                return function(*arguments, **keyword_arguments)
+            finally:
+                self.add_time(stage, perf_counter() - start)
+        return timed_function
+
+    def time_iterator(self, stage, iterable):
+        """
+        :param stage: name of the stage.
+        :param iterable: iterable to time, such as a generator reading a file.
+        :return: iterator of the same items, adding the time it takes to get each one of them to the stage.
+        """
+        if not self.enabled:
+            return iter(iterable)
+
+        def timed_iterator(iterator):
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.add_time(stage, perf_counter() - start)
+                yield item
+        return timed_iterator(iter(iterable))
+
+    def get_report(self, top=20):
+        """
+        :param top: number of functions (cProfile) and lines (tracemalloc) reported.
+        :return: dictionary with the phases (in the order in which they started, each one with the ID of the phase it's
+                 part of), the stages, and the output of the hooks.
+        """
+        report = {
+            "total_time": self.total_time,
+            "peak_rss": self.get_peak_rss(),
+            "phases": sorted(self.phases, key=lambda record: record["id"]),
+            "stages": {stage: {"calls": calls, "seconds": seconds, "average": seconds / calls if calls else 0}
+                       for stage, (calls, seconds) in sorted(self.stages.items())}
+        }
+        if self.profile:
+            import pstats
+            statistics = pstats.Stats(self.profile).sort_stats("cumulative")
+            report["cprofile"] = [{"function": "%s:%d(%s)" % function, "calls": total_calls, "total_time": total_time,
+                                   "cumulative_time": cumulative_time}
+                                  for function, (_, total_calls, total_time, cumulative_time, _)
+                                  in sorted(statistics.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]]
+        if self.trace_memory and tracemalloc.is_tracing():
+            report["tracemalloc"] = [{"line": str(statistic.traceback), "size": statistic.size, "count": statistic.count}
+                                     for statistic in tracemalloc.take_snapshot().statistics("lineno")[:top]]
+        return report
+
+    def write_report(self, file):
+        """
+        Write the report (see get_report()) as JSON. With cProfile, its statistics are also written next to it, in
+        the pstats format, e.g. for snakeviz.
+        :param file: path of the JSON file.
+        """
+        with open(file, "w") as report_file:
+            json.dump(self.get_report(), report_file, indent=4)
+        if self.profile:
+            self.profile.dump_stats(os.path.splitext(file)[0] + ".pstats")
+
+    def print_report(self):
+        """
+        Print the time, CPU time, and peak memory of every phase, and the time spent in every stage.
+        """
+        print("Profile (%.3f s):" % self.total_time)
+        for record in sorted(self.phases, key=lambda record: record["id"]):
+            if record["parent"] is None:
+                self.print_phase(record, "    ")
+        for stage, (calls, seconds) in sorted(self.stages.items()):
+            print("    %-32s %10.3f s in %s call(s)" % (stage, seconds, "{:,}".format(calls)))
+        print()
+
+    def print_phase(self, record, indentation):
+        """
+        Print a phase, then the phases it contains, further indented.
+        :param record: record of the phase.
+        :param indentation: indentation of the phase.
+        """
+        peak_rss = record["peak_rss"]
+        print("%s%-*s %10.3f s, %10.3f s CPU%s%s"
+              % (indentation, 36 - len(indentation), record["name"], record["wall_time"], record["cpu_time"],
+                 ", peak RSS of %s MB" % "{:,.1f}".format(peak_rss / 2 ** 20) if peak_rss is not None else "",
+                 ", %s tokens per second" % "{:,.0f}".format(record["tokens_per_second"]) if "tokens_per_second" in record else ""))
+        for child in sorted(self.phases, key=lambda child: child["id"]):
+            if child["parent"] == record["id"]:
+                self.print_phase(child, indentation + "    ")
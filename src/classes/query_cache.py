@@ -0,0 +1,201 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import os
+import threading
+from contextlib import contextmanager
+
+from classes.query import AndQuery, OrQuery
+from classes.bm25 import BM25
+from classes.stemmed_index import StemmedIndex
+from classes.cached_index import CachedIndex
+from classes.lru_cache import LRUCache
+from classes.profiler import Profiler
+
+
+class QueryCache:
+
+    # stage of a query to which the time that isn't spent tokenizing it, or fetching postings lists, goes
+    remaining_stages = {"and": "intersect", "or": "union", "bm25": "score"}
+
+    def __init__(self, spimi, stemmed=False, cache_size=1024, postings_cache_size=256, k1=0.5, b=0.5, vectorized=False,
+                 profiler=None):
+        """
+        Run queries against the index of a SPIMI object, remembering the results of the most recent ones.
+
+        Users repeat the same few queries over and over, so the results of the last cache_size queries are kept (see
+        LRUCache). Queries are looked up by their normalized terms, so that queries which only differ by the way their
+        terms are written (e.g. "Oil prices" and "oil price") share their results:
+            - AND and OR queries: the set of stemmed terms, since neither the order nor duplicate terms change results.
+            - BM25: the list of stemmed terms without stopwords (the order changes the way scores are added up, so it's
+              kept), along with the parameters of the ranking function, and the number of documents ranked.
+        The postings lists of the terms looked up the most recently are kept too (see CachedIndex).
+
+        Results are only valid for the index they were computed on. Before every query, the generation of the index is
+        checked (see SPIMI.get_generation()): whenever segments are added or merged, the index is opened again, and
+        both caches start over. The index that was replaced is closed (so that the files of the segments that were
+        merged can go away) as soon as the queries that were running against it are done (see use_index()).
+
+        :param spimi: SPIMI object whose index is queried.
+        :param stemmed: were the terms of the index stemmed? If not, they're stemmed when the index is opened, like the
+                        terms of queries are (see StemmedIndex).
+        :param cache_size: maximum number of query results kept.
+        :param postings_cache_size: maximum number of postings lists kept.
+        :param k1: BM25 parameter k1 (see BM25).
+        :param b: BM25 parameter b (see BM25).
+        :param vectorized: compute BM25 with NumPy arrays (see VectorizedBM25).
+        :param profiler: Profiler to which the time spent in each stage of a query is added, by type of query:
+                         tokenizing it, fetching postings lists, and the rest (intersecting, merging, or scoring them).
+        """
+        self.spimi = spimi
+        self.stemmed = stemmed
+        self.postings_cache_size = postings_cache_size
+        self.k1 = k1
+        self.b = b
+        self.vectorized = vectorized
+        self.profiler = profiler or Profiler(enabled=False)
+
+        self.results = LRUCache(cache_size)
+        self.lock = threading.Lock()
+
+        # signature of the segment list the generation was last read from, so it's only read again if it changed
+        self.signature = None
+        self.generation = None
+        self.index = None
+        self.bm25 = None
+        # number of queries running against every index opened (id of the CachedIndex -> number of queries)
+        self.running_queries = {}
+        self.refresh()
+
+    def get_signature(self):
+        """
+        :return: tuple identifying the current version of the segment list, without reading it, or None if there's none.
+        """
+        try:
+            status = os.stat(self.spimi.output_segments)
+        except OSError:
+            return None
+        return status.st_ino, status.st_mtime_ns, status.st_size
+
+    def refresh(self):
+        """
+        Open the index again, and empty the caches, if its generation changed since it was opened.
+        :return: True if the index was opened again.
+        """
+        with self.lock:
+            signature = self.get_signature()
+            if self.index is not None and signature == self.signature:
+                return False
+            self.signature = signature
+
+            generation = self.spimi.get_generation()
+            if self.index is not None and generation == self.generation:
+                return False
+            self.generation = generation
+
+            previous_index = self.index
+            index = self.spimi.get_index()
+            if not self.stemmed:
+                index = StemmedIndex(index)
+            self.index = CachedIndex(index, self.postings_cache_size, self.profiler)
+
+            document_statistics = self.spimi.get_document_statistics()
+            if self.vectorized:
+                # NumPy is only imported when it's used
+                from classes.vectorized_bm25 import VectorizedBM25
+                self.bm25 = VectorizedBM25(reuters=document_statistics, index=self.index, n=document_statistics.number_of_documents,
+                                           k1=self.k1, b=self.b, cache_size=self.postings_cache_size)
+            else:
+                self.bm25 = BM25(reuters=document_statistics, index=self.index, n=document_statistics.number_of_documents,
+                                 k1=self.k1, b=self.b)
+            self.bm25.get_query_terms = self.profiler.time_function("tokenize", self.bm25.get_query_terms)
+
+            # otherwise, the last query running against it closes it
+            if previous_index is not None and id(previous_index) not in self.running_queries:
+                previous_index.close()
+
+            self.results.clear()
+            return True
+
+    @contextmanager
+    def use_index(self):
+        """
+        Hold on to the index while a query runs against it, after opening it again if its generation changed (see
+        refresh()). An index that was replaced in the meantime is closed once the last query running against it is done.
+        :return: tuple of (CachedIndex, BM25) of the index.
+        """
+        self.refresh()
+        with self.lock:
+            index, bm25 = self.index, self.bm25
+            self.running_queries[id(index)] = self.running_queries.get(id(index), 0) + 1
+        try:
+            yield index, bm25
+        finally:
+            with self.lock:
+                self.running_queries[id(index)] -= 1
+                if not self.running_queries[id(index)]:
+                    del self.running_queries[id(index)]
+                    if index is not self.index:
+                        index.close()
+
+    def get_query(self, query_type, query):
+        """
+        Run an AND or an OR query, unless its results were kept.
+        :param query_type: "and" or "or".
+        :param query: the user's query.
+        :return: AndQuery or OrQuery object whose most recent results are the ones of the query (see print_results()).
+                 The results are shared with the cache, and shouldn't be modified.
+        """
+        with self.use_index() as (index, _):
+            query_object = {"and": AndQuery, "or": OrQuery}[query_type](index)
+            query_object.get_terms = self.profiler.time_function("tokenize", query_object.get_terms)
+
+            with self.profiler.scope(query_type, self.remaining_stages[query_type]):
+                terms = query_object.get_terms(query)
+                key = (query_type, tuple(sorted(set(terms))))
+                results = self.results.get(key)
+                if results is None:
+                    # the query isn't split and stemmed again
+                    results = query_object.execute(terms)
+                    self.results.put(key, results)
+        query_object.most_recent_results = results
+        return query_object
+
+    def execute(self, query_type, query, k=None):
+        """
+        Run a query, unless its results were kept.
+        :param query_type: "and", "or", or "bm25".
+        :param query: the user's query.
+        :param k: number of documents ranked by BM25 (see BM25.top_k()), or None to rank all of them.
+        :return: list of document IDs for AND and OR queries, list of tuples of (document ID, score) for BM25. The
+                 results are shared with the cache, and shouldn't be modified.
+        """
+        if query_type != "bm25":
+            return self.get_query(query_type, query).most_recent_results
+
+        with self.use_index() as (_, bm25):
+            with self.profiler.scope(query_type, self.remaining_stages[query_type]):
+                terms = bm25.get_query_terms(query)
+                key = (query_type, tuple(terms), bm25.K1, bm25.B, k)
+                results = self.results.get(key)
+                if results is None:
+                    # the query isn't split, and its terms aren't stemmed or checked against the stopwords again
+                    results = bm25.top_k(terms, k) if k is not None else bm25.get_ranking(terms)
+                    self.results.put(key, results)
+        return results
+
+    def get_statistics(self):
+        """
+        :return: dictionary of cache name -> tuple of (hits, misses, hit rate).
+        """
+        return {"results": self.results.get_statistics(), "postings": self.index.postings_lists.get_statistics()}
+
+    def print_statistics(self):
+        """
+        Print the hit rate of both caches.
+        """
+        print("Query cache hit rates (generation %d of the index):" % self.generation)
+        for name, (hits, misses, hit_rate) in self.get_statistics().items():
+            print("    %s: %s%% (%s hits, %s misses)"
+                  % (name, "{:.2f}".format(hit_rate * 100), "{:,}".format(hits), "{:,}".format(misses)))
+        print()
@@ -0,0 +1,417 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import json
+import asyncio
+from time import perf_counter
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from definitions import tokenizer
+from classes.query_cache import QueryCache
+from classes.batch_query import BatchQuery
+
+
+class QueryServer:
+
+    # query cache of a worker process, opened once when the process starts (see start_worker())
+    worker_query_cache = None
+
+    def __init__(self, query_cache, host="127.0.0.1", port=8080, unix_socket=None, workers=0, threads=4, timeout=5.0,
+                 batch_window=0.002, max_batch_size=32, k=10, max_request_size=2 ** 20):
+        """
+        Long-running server answering AND, OR and BM25 queries over HTTP, on a TCP port or a Unix socket, so that the
+        index and the document statistics are opened once, and shared by every query, instead of once per process.
+
+        Connections are handled by an asyncio event loop, which never runs a query itself: queries are handed out to a
+        pool of workers, so that slow queries don't hold up the other connections.
+            - threads (workers = 0): queries run in threads of this process, all reading the same QueryCache, and its
+              caches. Threads take turns running Python code, so they mostly help when queries wait on the disk.
+            - processes (workers > 0): every worker process opens the index once, with its own QueryCache, and queries
+              run on as many cores as there are workers. Index files are memory-mapped, so processes share their pages.
+        Queries are the same as everywhere else (AndQuery, OrQuery, BM25.top_k() and BM25.get_ranking(), through
+        QueryCache), so results are the same as the ones of an interactive or a batch session.
+
+        Requests are batched: queries that arrive within batch_window seconds of each other (at most max_batch_size of
+        them) are sent to a worker together, which cuts down the cost of handing out work, especially to processes.
+        A request that isn't answered within timeout seconds gets a 504 response (the query still runs to completion).
+
+        Endpoints (responses are JSON):
+            - GET /search?type={and,or,bm25}&q=QUERY[&k=K]: results of a query, like the ones of a batch (see
+              BatchQuery.write_results()): document IDs, or [document ID, score] pairs for BM25.
+            - POST /search, with a JSON body {"type": ..., "queries": [...], "k": ...}: results of several queries.
+            - GET /health: whether the server is up, and the generation of the index it serves.
+            - GET /metrics: number of requests, errors and timeouts, batches, latency percentiles, and cache hit rates.
+
+        :param query_cache: QueryCache of the index (see QueryCache).
+        :param host: address the server listens on.
+        :param port: TCP port the server listens on (0 to pick any free port).
+        :param unix_socket: path of a Unix socket to listen on instead of a TCP port.
+        :param workers: number of worker processes running queries, or 0 to run them in threads of this process.
+        :param threads: number of threads running queries, when there are no worker processes.
+        :param timeout: time in seconds after which a request is given up on, or a connection with no request is closed.
+        :param batch_window: time in seconds queries wait for other queries to be batched with.
+        :param max_batch_size: maximum number of queries per batch.
+        :param k: number of documents ranked by BM25 when the request doesn't say (see BM25.top_k()).
+        :param max_request_size: maximum size of the body of a request, in bytes.
+        """
+        self.query_cache = query_cache
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.workers = workers
+        self.threads = max(threads, 1)
+        self.timeout = timeout
+        self.batch_window = batch_window
+        self.max_batch_size = max(max_batch_size, 1)
+        self.k = k
+        self.max_request_size = max_request_size
+
+        self.loop = None
+        self.executor = None
+        self.pending_queries = None
+        self.stopped = None
+        self.address = None
+        # writers and handlers of the open connections, closed when the server stops
+        self.connections = {}
+        # threading.Event set once the server listens, for whoever started it in another thread
+        self.ready = None
+
+        self.start_time = None
+        self.requests = 0
+        self.queries = {query_type: 0 for query_type in QueryCache.remaining_stages}
+        self.errors = 0
+        self.timeouts = 0
+        self.batches = 0
+        self.batched_queries = 0
+        # latencies of the most recent queries, in seconds
+        self.latencies = deque(maxlen=10000)
+
+    @staticmethod
+    def start_worker(spimi, query_cache_arguments, regex_tokenizer=False):
+        """
+        Open the index in a worker process.
+        :param spimi: SPIMI object whose index is queried.
+        :param query_cache_arguments: keyword arguments of the QueryCache of the worker.
+        :param regex_tokenizer: tokenize queries with regular expressions, like the documents of the index were.
+        """
+        tokenizer.regex = regex_tokenizer
+        QueryServer.worker_query_cache = QueryCache(spimi, **query_cache_arguments)
+
+    @staticmethod
+    def run_batch(batch, query_cache=None):
+        """
+        Run a batch of queries, one after the other. This is the job done by the workers.
+        :param batch: list of tuples of (query type, query, k).
+        :param query_cache: QueryCache running the queries (defaults to the one of the worker process).
+        :return: list of tuples of (error message or None, results), one per query.
+        """
+        query_cache = query_cache or QueryServer.worker_query_cache
+        results = []
+        for query_type, query, k in batch:
+            try:
+                results.append((None, query_cache.execute(query_type, query, k)))
+            except Exception as exception:
+                results.append(("%s: %s" % (exception.__class__.__name__, exception), None))
+        return results
+
+    def get_executor(self):
+        """
+        :return: pool of workers running the queries.
+        """
+        if self.workers <= 0:
+            return ThreadPoolExecutor(self.threads)
+        query_cache = self.query_cache
+        query_cache_arguments = {"stemmed": query_cache.stemmed, "cache_size": query_cache.results.maxsize,
+                                 "postings_cache_size": query_cache.postings_cache_size, "k1": query_cache.k1,
+                                 "b": query_cache.b, "vectorized": query_cache.vectorized}
+        return ProcessPoolExecutor(self.workers, initializer=QueryServer.start_worker,
+                                   initargs=(query_cache.spimi, query_cache_arguments, tokenizer.regex))
+
+    async def serve(self):
+        """
+        Listen for requests until the server is stopped (see stop()).
+        """
+        self.loop = asyncio.get_running_loop()
+        self.pending_queries = asyncio.Queue()
+        self.stopped = asyncio.Event()
+        self.executor = self.get_executor()
+        self.start_time = perf_counter()
+
+        if self.unix_socket:
+            server = await asyncio.start_unix_server(self.handle_connection, self.unix_socket)
+            self.address = self.unix_socket
+        else:
+            server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+            self.address = "http://%s:%d" % server.sockets[0].getsockname()[:2]
+        batcher = asyncio.ensure_future(self.batch_queries())
+
+        print("Serving queries on %s with %s." % (self.address, "%d worker process(es)" % self.workers if self.workers > 0
+                                                  else "%d thread(s)" % self.threads))
+        if self.ready:
+            self.ready.set()
+        try:
+            async with server:
+                await self.stopped.wait()
+                for writer in list(self.connections.values()):
+                    writer.close()
+                await asyncio.gather(*self.connections, return_exceptions=True)
+        finally:
+            batcher.cancel()
+            # queries still waiting for a worker can only be cancelled since Python 3.9, they're run otherwise
+            if sys.version_info >= (3, 9):
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            else:
+                self.executor.shutdown(wait=False)
+            if self.unix_socket and os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
+
+    def run(self):
+        """
+        Run the server in this thread, until it's interrupted (e.g. with Ctrl+C) or stopped from another thread.
+        """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    def stop(self):
+        """
+        Stop the server. Can be called from any thread.
+        """
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def batch_queries(self):
+        """
+        Take the queries waiting to be run, in batches, and hand every batch out to a worker as soon as it's formed.
+        A batch is formed by waiting batch_window seconds after the first query, unless other queries are already
+        waiting, and taking all of the queries waiting by then (at most max_batch_size of them).
+        """
+        while True:
+            batch = [await self.pending_queries.get()]
+            if self.pending_queries.empty() and self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch_size and not self.pending_queries.empty():
+                batch.append(self.pending_queries.get_nowait())
+
+            # queries whose requests timed out while they were waiting aren't run
+            batch = [(query, future) for query, future in batch if not future.done()]
+            if batch:
+                asyncio.ensure_future(self.run_batch_in_worker(batch))
+
+    async def run_batch_in_worker(self, batch):
+        """
+        :param batch: list of tuples of (query, future), the future getting the results of the query.
+        """
+        self.batches += 1
+        self.batched_queries += len(batch)
+        queries = [query for query, _ in batch]
+        try:
+            if self.workers <= 0:
+                results = await self.loop.run_in_executor(self.executor, self.run_batch, queries, self.query_cache)
+            else:
+                results = await self.loop.run_in_executor(self.executor, self.run_batch, queries)
+        except Exception as exception:
+            results = [("%s: %s" % (exception.__class__.__name__, exception), None)] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def execute(self, query_type, query, k):
+        """
+        Run a query in a worker, along with the other queries of its batch.
+        :param query_type: "and", "or", or "bm25".
+        :param query: the query.
+        :param k: number of documents ranked by BM25, or None to rank all of them.
+        :return: results of the query (see QueryCache.execute()).
+        """
+        future = self.loop.create_future()
+        await self.pending_queries.put(((query_type, query, k), future))
+        error, results = await future
+        if error:
+            raise RuntimeError(error)
+        return results
+
+    def parse_queries(self, method, parameters, body):
+        """
+        :param method: HTTP method of the request.
+        :param parameters: dictionary of the parameters of the URL.
+        :param body: body of the request.
+        :return: tuple of (query type, list of queries, k).
+        """
+        if method == "POST":
+            try:
+                parameters = json.loads(body or b"{}")
+            except ValueError:
+                raise ValueError("the body isn't valid JSON")
+            if not isinstance(parameters, dict):
+                raise ValueError("the body should be a JSON object")
+            queries = parameters.get("queries", [parameters["query"]] if "query" in parameters else [])
+            if not isinstance(queries, list):
+                raise ValueError("queries should be a list of strings")
+        else:
+            parameters = {name: values[-1] for name, values in parameters.items()}
+            queries = [parameters["q"]] if "q" in parameters else []
+
+        query_type = str(parameters.get("type", "bm25")).lower()
+        if query_type not in self.queries:
+            raise ValueError("type should be and, or, or bm25")
+        if not all(isinstance(query, str) for query in queries):
+            raise ValueError("queries should be strings")
+        if not queries or not all(query.strip() for query in queries):
+            raise ValueError("no query given")
+
+        k = None
+        if query_type == "bm25":
+            k = parameters.get("k", self.k)
+            try:
+                k = int(k) if k is not None else None
+            except (TypeError, ValueError):
+                raise ValueError("k should be a number")
+        return query_type, queries, k
+
+    async def search(self, method, parameters, body):
+        """
+        :param method: HTTP method of the request.
+        :param parameters: dictionary of the parameters of the URL.
+        :param body: body of the request.
+        :return: tuple of (HTTP status, response).
+        """
+        try:
+            query_type, queries, k = self.parse_queries(method, parameters, body)
+        except ValueError as exception:
+            return HTTPStatus.BAD_REQUEST, {"error": str(exception)}
+
+        start = perf_counter()
+        try:
+            results = await asyncio.wait_for(asyncio.gather(*[self.execute(query_type, query, k) for query in queries]),
+                                             self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return HTTPStatus.GATEWAY_TIMEOUT, {"error": "the query took more than %g s" % self.timeout}
+        except RuntimeError as exception:
+            self.errors += 1
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(exception)}
+        self.queries[query_type] += len(queries)
+        self.latencies.append(perf_counter() - start)
+
+        if method == "POST":
+            return HTTPStatus.OK, {"type": query_type, "results": [{"query": query, "results": query_results}
+                                                                   for query, query_results in zip(queries, results)]}
+        return HTTPStatus.OK, {"type": query_type, "query": queries[0], "results": results[0]}
+
+    def get_health(self):
+        """
+        :return: dictionary saying the server is up, with the generation of the index, and the number of documents.
+        """
+        return {"status": "ok", "generation": self.query_cache.generation,
+                "documents": self.query_cache.bm25.N, "uptime": perf_counter() - self.start_time}
+
+    def get_metrics(self):
+        """
+        :return: dictionary of the number of requests, queries, errors, timeouts and batches so far, percentiles (in
+                 milliseconds) of the latency of the most recent requests, and hit rates of the caches of this process
+                 (worker processes have their own caches).
+        """
+        latencies = sorted(self.latencies)
+        return {
+            "uptime": perf_counter() - self.start_time,
+            "requests": self.requests,
+            "queries": self.queries,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "pending_queries": self.pending_queries.qsize(),
+            "batches": self.batches,
+            "average_batch_size": self.batched_queries / self.batches if self.batches else 0,
+            "workers": self.workers,
+            "threads": self.threads if self.workers <= 0 else 0,
+            "latency": {"p50": BatchQuery.get_percentile(latencies, 50) * 1000,
+                        "p95": BatchQuery.get_percentile(latencies, 95) * 1000,
+                        "p99": BatchQuery.get_percentile(latencies, 99) * 1000},
+            "caches": {name: {"hits": hits, "misses": misses, "hit_rate": hit_rate}
+                       for name, (hits, misses, hit_rate) in self.query_cache.get_statistics().items()}
+        }
+
+    async def handle_request(self, method, target, body):
+        """
+        :param method: HTTP method of the request.
+        :param target: path of the request, with its parameters.
+        :param body: body of the request.
+        :return: tuple of (HTTP status, response).
+        """
+        self.requests += 1
+        url = urlsplit(target)
+        if url.path == "/search":
+            if method not in ["GET", "POST"]:
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use GET or POST"}
+            return await self.search(method, parse_qs(url.query), body)
+        if url.path in ["/health", "/metrics"]:
+            if method != "GET":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use GET"}
+            # the index is opened again if its segments changed, without holding up the other connections
+            await self.loop.run_in_executor(None, self.query_cache.refresh)
+            return HTTPStatus.OK, self.get_health() if url.path == "/health" else self.get_metrics()
+        return HTTPStatus.NOT_FOUND, {"error": "no such endpoint, try /search, /health, or /metrics"}
+
+    @staticmethod
+    def write_response(writer, status, response, keep_alive):
+        """
+        :param writer: stream of the connection.
+        :param status: HTTP status.
+        :param response: response, which will be sent as JSON.
+        :param keep_alive: keep the connection open for more requests?
+        """
+        body = json.dumps(response).encode("utf-8")
+        writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n"
+                      % (status.value, status.phrase, len(body), "keep-alive" if keep_alive else "close")).encode("latin-1") + body)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Answer the requests of a connection, one after the other, until the client closes it, asks for it to be closed,
+        or doesn't send a request for timeout seconds.
+        :param reader: stream of the connection, from the client.
+        :param writer: stream of the connection, to the client.
+        """
+        handler = asyncio.current_task()
+        self.connections[handler] = writer
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                headers = {name.strip().lower(): value.strip()
+                           for name, _, value in (header_line.partition(":") for header_line in header_lines)}
+                try:
+                    method, target, version = request_line.split()
+                    content_length = int(headers.get("content-length", 0))
+                except ValueError:
+                    self.write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "malformed request"}, False)
+                    break
+                if content_length > self.max_request_size:
+                    self.write_response(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "request too large"}, False)
+                    break
+
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(content_length), self.timeout) if content_length else b""
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                status, response = await self.handle_request(method.upper(), target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self.write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            del self.connections[handler]
+            writer.close()
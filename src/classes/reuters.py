@@ -2,33 +2,45 @@
 # coding: utf-8
 
 import os
-import wget
-import tarfile
-from bs4 import BeautifulSoup
+from collections import deque
+from multiprocessing import Pool
 
-from definitions import ROOT_DIR, word_tokenize, stopwords, ps
+from definitions import ROOT_DIR, tokenizer, normalizer
+from classes.sgml_reader import SGMLReader
+from classes.profiler import Profiler
 
 
 class Reuters:
 
     def __init__(self, number_of_files=22, docs_per_block=500,
-                 remove_stopwords=False, stem=False, case_folding=False, remove_numbers=False
+                 remove_stopwords=False, stem=False, case_folding=False, remove_numbers=False, workers=1,
+                 reuters_directory=None, profiler=None, regex_tokenizer=False
     ):
         """
         Initiate the Reuters objects which will contain the reuters files.
-        :param number_of_files: number of Reuters files that will be parsed.
-        :param docs_per_block: number of documents per generated block.
+        :param number_of_files: number of Reuters files that will be parsed, or None to parse all of them.
+        :param docs_per_block: number of documents per generated block, unless SPIMI is given a memory budget.
         :param remove_stopwords: will we include stopwords?
         :param stem: will we stem the terms?
         :param case_folding: will we lower terms to their lowercase variant?
         :param remove_numbers: will we remove terms that are just numbers?
+        :param workers: number of processes parsing the reuters files in parallel.
+        :param reuters_directory: directory containing the .sgm files (defaults to the Reuters files, downloaded into the
+                                  root directory of the project if they aren't there yet), e.g. a corpus generated by
+                                  CorpusGenerator.
+        :param profiler: Profiler to which the time spent reading, tokenizing, and compressing documents is added.
+                         Worker processes don't report to it.
+        :param regex_tokenizer: tokenize documents with regular expressions instead of nltk's word_tokenize() (see
+                                Tokenizer).
         """
         self.reuters_url = "http://www.daviddlewis.com/resources/testcollections/reuters21578/reuters21578.tar.gz"
-        self.reuters_directory = "/".join([ROOT_DIR, "reuters21578"])
+        self.reuters_directory = reuters_directory or "/".join([ROOT_DIR, "reuters21578"])
 
         self.reuters_files = self.__init_reuters_files()[:number_of_files]
 
         self.docs_per_block = docs_per_block
+        self.workers = workers
+        self.profiler = profiler or Profiler(enabled=False)
         self.number_of_documents = 0
         self.number_of_tokens = 0
 
@@ -36,11 +48,10 @@ class Reuters:
         self.stem = stem
         self.case_folding = case_folding
         self.remove_numbers = remove_numbers
+        self.regex_tokenizer = regex_tokenizer
 
         self.will_compress = self.remove_stopwords or self.stem or self.case_folding or self.remove_numbers
 
-        self.list_of_lists_of_tokens = []
-
         # dictionary with key -> doc ID and value -> length of that document in words
         self.document_lengths = {}
         self.average_document_length = 0
@@ -52,6 +63,10 @@ class Reuters:
         Delete tar file.
         """
         if not os.path.exists(self.reuters_directory):
+            # only needed once, so they're not imported otherwise
+            import wget
+            import tarfile
+
             print("Downloading Reuters files...")
             file = wget.download(self.reuters_url, ROOT_DIR)
             print()
@@ -73,75 +88,106 @@ class Reuters:
 
         return sorted(reuters_files)
 
-    def get_tokens(self):
-        """
-        Find all tokens in the reuters files (self.reuters_files).
-        For each file:
-            - Find all REUTERS tags, each representing a document.
-            - For each document, get its document ID (NEWID attribute).
-            - Get tuples of (term, document ID) from the content in a document's TEXT tag, which represent tokens.
-
-        :return: list of lists of tokens (tuples of (term, postings list)). Yes, list of lists of. It's a list of lists.
-        Each list in the list represents a block that will be generated.
-        """
-        tokens = []
-        current_document = 0
-        print("Parsing Reuters files...")
-
-        for file in self.reuters_files:
-            """
-            We will use ISO-8859-1 encoding, because reut2-017.sgm is yielding a UnicodeDecodeError.
-            We could always just put the 'errors' parameter to 'ignore' in the open() method.
-            But after running a diff command, the only difference is the presence if a 'ü' character. We'll include it.
-            """
-            soup = BeautifulSoup(open(file, encoding="ISO-8859-1"), "html.parser")
-            documents = soup.find_all("reuters")
-
-            for document in documents:
-                document_id = int(document['newid'])
-
-                content = document.find("text").text
-                terms = word_tokenize(content)
-                if self.will_compress:
-                    terms = self.compress(terms)
-                token_pairs = [(term, document_id) for term in terms]
-                tokens.extend(token_pairs)
-                self.number_of_documents += 1
+    def __getstate__(self):
+        """
+        When the Reuters object is sent to worker processes (see get_documents()), only send its configuration, not the
+        statistics gathered while parsing, which only the main process keeps up to date.
+        :return: state of the object that will be pickled.
+        """
+        state = self.__dict__.copy()
+        state["document_lengths"] = {}
+        return state
 
-                self.document_lengths[document_id] = len(token_pairs)
+    def parse_file(self, file):
+        """
+        Stream the documents in a reuters file, one at a time.
+            - Read the file one REUTERS tag at a time, each representing a document (see SGMLReader).
+            - For each document, get its document ID (NEWID attribute), and the content of its TEXT tag.
+            - Tokenize that content (and compress it, if asked to).
+        :param file: path of the reuters file.
+        :return: generator of tuples of (document ID, list of terms), in the order in which they appear in the file.
+        """
+        """
+        We will use ISO-8859-1 encoding, because reut2-017.sgm is yielding a UnicodeDecodeError.
+        We could always just put the 'errors' parameter to 'ignore' in the open() method.
+        But after running a diff command, the only difference is the presence if a 'ü' character. We'll include it.
+        """
+        tokenize = tokenizer.tokenize_with_regex if self.regex_tokenizer else tokenizer.tokenize_with_nltk
+        tokenize = self.profiler.time_function("parse: tokenize", tokenize)
+        compress = self.profiler.time_function("parse: compress", self.compress)
+        for document_id, content in self.profiler.time_iterator("parse: read", SGMLReader(file, encoding="ISO-8859-1")):
+            terms = tokenize(content)
+            if self.will_compress:
+                terms = compress(terms)
 
-                current_document += 1
-                if current_document == self.docs_per_block:
-                    self.number_of_tokens += len(tokens)
-                    self.list_of_lists_of_tokens.append(tokens)
-                    tokens = []
-                    current_document = 0
+            yield document_id, terms
 
-        if tokens:
-            self.number_of_tokens += len(tokens)
-            self.list_of_lists_of_tokens.append(tokens)
+    def tokenize_file(self, file):
+        """
+        Parse a whole reuters file at once. This is the job done by each worker process.
+        :param file: path of the reuters file.
+        :return: list of tuples of (document ID, list of terms), in the order in which they appear in the file.
+        """
+        return list(self.parse_file(file))
 
-        self.average_document_length = self.number_of_tokens / self.number_of_documents
-        print("Found %s documents and %s tokens. %d block file(s) will be generated.\n"
-              % ("{:,}".format(self.number_of_documents), "{:,}".format(self.number_of_tokens), len(self.list_of_lists_of_tokens)))
+    def get_parsed_files(self):
+        """
+        Parse the reuters files (self.reuters_files), in order.
 
-        return self.list_of_lists_of_tokens
+        With a single worker, files are parsed in this process, and documents are streamed one at a time.
+        Otherwise, files are handed out to a pool of worker processes, and their documents come back one file at a
+        time. Results are collected in the order in which files were handed out, so documents come out in the same
+        order as they would with a single worker. At most twice as many files as there are workers are handed out
+        ahead of the one we're waiting for, so that parsed files don't pile up in memory if they're parsed faster than
+        they're indexed.
+
+        :return: generator of iterables of tuples of (document ID, list of terms), one per file.
+        """
+        if self.workers <= 1:
+            for file in self.reuters_files:
+                yield self.parse_file(file)
+            return
+
+        with Pool(self.workers) as pool:
+            pending_files = deque()
+            for file in self.reuters_files:
+                pending_files.append(pool.apply_async(self.tokenize_file, (file,)))
+                if len(pending_files) > 2 * self.workers:
+                    yield pending_files.popleft().get()
+            while pending_files:
+                yield pending_files.popleft().get()
+
+    def get_documents(self):
+        """
+        Stream the documents in the reuters files (self.reuters_files), one at a time (see parse_file()).
+
+        Document lengths are recorded as documents go by, and the average document length is computed once the last
+        document has been yielded.
+
+        :return: generator of tuples of (document ID, list of terms), in the order in which they appear in the files.
+        """
+        print("Parsing Reuters files%s..." % (" with %d workers" % self.workers if self.workers > 1 else ""))
+
+        for documents in self.get_parsed_files():
+            for document_id, terms in documents:
+                self.number_of_documents += 1
+                self.number_of_tokens += len(terms)
+                self.document_lengths[document_id] = len(terms)
+
+                yield document_id, terms
+
+        # an empty corpus or file selection has no documents to average
+        self.average_document_length = self.number_of_tokens / self.number_of_documents if self.number_of_documents else 0
+        print("Found %s documents and %s tokens.\n"
+              % ("{:,}".format(self.number_of_documents), "{:,}".format(self.number_of_tokens)))
 
     def compress(self, terms):
         """
         Remove stopwords from terms list, or stem terms in terms list, or lower terms to their lowercase variant, or
         remove terms that are just numbers.
         Or do any combination of all.
+        The whole list goes through the shared normalizer in one pass (see Normalizer.normalize()).
         :param terms: list of terms to be compressed.
         :return: compressed list of terms.
         """
-        if self.remove_stopwords:
-            terms = [term for term in terms if term.lower() not in stopwords]
-        if self.stem:
-            terms = [ps.stem(term) for term in terms]
-        if self.case_folding:
-            terms = [term.casefold() for term in terms]
-        if self.remove_numbers:
-            terms = [term for term in terms if not term.replace(",", "").replace(".", "").isdigit()]
-
-        return terms
+        return normalizer.normalize(terms, self.remove_stopwords, self.stem, self.case_folding, self.remove_numbers)
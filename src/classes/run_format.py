@@ -0,0 +1,182 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+from itertools import accumulate
+
+from classes.variable_byte import VariableByte
+
+
+class TextRunFormat:
+    """
+    Human readable format of block files (and of the runs produced while merging them).
+    Every line contains a term, followed by its postings as space-separated pairs of document ID and term frequency.
+    E.g.: "oil 3:1 5:2 12:1".
+
+    Postings are kept as strings from the moment they're read until they're written again, so that merging runs in this
+    format does no string to int conversion either.
+    """
+
+    suffix = ".txt"
+
+    @staticmethod
+    def open(run_file, mode):
+        """
+        Open a run file.
+        :param run_file: path of the run file.
+        :param mode: "r" to read, "w" to write.
+        :return: open stream of the run file.
+        """
+        return open(run_file, mode)
+
+    @staticmethod
+    def encode(postings_list):
+        """
+        :param postings_list: list of tuples of (document ID, term frequency), sorted by document ID.
+        :return: postings, as stored in this format.
+        """
+        return " ".join(["%d:%d" % posting for posting in postings_list])
+
+    @staticmethod
+    def decode(postings):
+        """
+        :param postings: postings, as stored in this format.
+        :return: list of tuples of (document ID, term frequency), sorted by document ID.
+        """
+        return [tuple(map(int, posting.split(":"))) for posting in postings.split()]
+
+    @staticmethod
+    def concatenate(postings):
+        """
+        Concatenate the postings of a term coming from several runs.
+        :param postings: list of postings, as stored in this format, in increasing order of document IDs.
+        :return: postings, as stored in this format.
+        """
+        return " ".join(postings)
+
+    @staticmethod
+    def write(run_file, term, postings):
+        """
+        Write a term and its postings at the end of a run file.
+        :param run_file: stream opened with open().
+        :param term: the term.
+        :param postings: postings, as stored in this format.
+        """
+        run_file.write("%s %s\n" % (term, postings))
+
+    @staticmethod
+    def read(run_file):
+        """
+        Stream the terms of a run file.
+        :param run_file: stream opened with open().
+        :return: generator of tuples of (term, postings), in the order in which they appear in the run file.
+        """
+        for line in run_file:
+            term, _, postings = line[:-1].partition(" ")
+            yield term, postings
+
+
+class BinaryRunFormat:
+    """
+    Compact format of block files (and of the runs produced while merging them).
+    Every term is stored as a record of variable byte encoded integers (see VariableByte) and raw bytes:
+        - the length of the term in bytes, followed by the UTF-8 encoded term.
+        - the number of postings, and the last document ID of the postings list.
+        - the length in bytes of the encoded postings, followed by the postings, encoded as pairs of the gap between
+          consecutive document IDs (the first one being the document ID itself) and the term frequency.
+
+    In memory, postings are kept as tuples of (number of postings, last document ID, encoded postings). Since the first
+    gap is the only one that depends on what comes before it, two postings lists can be concatenated by re-encoding that
+    single gap, without decoding any of the others.
+    """
+
+    suffix = ".bin"
+    buffer_size = 2 ** 16
+
+    @staticmethod
+    def open(run_file, mode):
+        """
+        Open a run file, through a buffered binary stream.
+        :param run_file: path of the run file.
+        :param mode: "r" to read, "w" to write.
+        :return: open stream of the run file.
+        """
+        return open(run_file, mode + "b", buffering=BinaryRunFormat.buffer_size)
+
+    @staticmethod
+    def encode(postings_list):
+        """
+        :param postings_list: list of tuples of (document ID, term frequency), sorted by document ID.
+        :return: postings, as stored in this format.
+        """
+        numbers = []
+        previous = 0
+        for document_id, term_frequency in postings_list:
+            numbers.append(document_id - previous)
+            numbers.append(term_frequency)
+            previous = document_id
+        return len(postings_list), previous, VariableByte.encode(numbers)
+
+    @staticmethod
+    def decode(postings):
+        """
+        :param postings: postings, as stored in this format.
+        :return: list of tuples of (document ID, term frequency), sorted by document ID.
+        """
+        numbers = VariableByte.decode(postings[2])
+        return list(zip(accumulate(numbers[::2]), numbers[1::2]))
+
+    @staticmethod
+    def concatenate(postings):
+        """
+        Concatenate the postings of a term coming from several runs.
+        The first gap of every postings list but the first is re-encoded relative to the last document ID before it.
+        :param postings: list of postings, as stored in this format, in increasing order of document IDs.
+        :return: postings, as stored in this format.
+        """
+        if len(postings) == 1:
+            return postings[0]
+
+        number_of_postings, last_document_id, encoded_postings = postings[0]
+        concatenated_postings = [encoded_postings]
+
+        for next_number_of_postings, next_last_document_id, next_encoded_postings in postings[1:]:
+            first_document_id, offset = VariableByte.decode_number(next_encoded_postings)
+            concatenated_postings.append(VariableByte.encode_number(first_document_id - last_document_id))
+            concatenated_postings.append(next_encoded_postings[offset:])
+            number_of_postings += next_number_of_postings
+            last_document_id = next_last_document_id
+
+        return number_of_postings, last_document_id, b"".join(concatenated_postings)
+
+    @staticmethod
+    def write(run_file, term, postings):
+        """
+        Write a term and its postings at the end of a run file.
+        :param run_file: stream opened with open().
+        :param term: the term.
+        :param postings: postings, as stored in this format.
+        """
+        term = term.encode("utf-8")
+        number_of_postings, last_document_id, encoded_postings = postings
+        run_file.write(b"".join([
+            VariableByte.encode([len(term)]), term,
+            VariableByte.encode([number_of_postings, last_document_id, len(encoded_postings)]), encoded_postings
+        ]))
+
+    @staticmethod
+    def read(run_file):
+        """
+        Stream the terms of a run file.
+        :param run_file: stream opened with open().
+        :return: generator of tuples of (term, postings), in the order in which they appear in the run file.
+        """
+        read_number = VariableByte.read_number
+        while True:
+            term_length = read_number(run_file)
+            if term_length is None:
+                return
+            term = run_file.read(term_length).decode("utf-8")
+            number_of_postings = read_number(run_file)
+            last_document_id = read_number(run_file)
+            encoded_postings = run_file.read(read_number(run_file))
+            yield term, (number_of_postings, last_document_id, encoded_postings)
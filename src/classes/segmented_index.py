@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import heapq
+from itertools import groupby
+from collections.abc import Mapping
+
+
+class SegmentedIndex(Mapping):
+
+    def __init__(self, segments):
+        """
+        View of several segments of an index as a single index.
+
+        Every segment is an index file of its own (see IndexReader), constructed out of a different set of documents.
+        Segments are never modified once they've been written: documents are added to an index by writing a new segment
+        (see SPIMI), not by rewriting the existing ones.
+
+        Looking up a term looks it up in every segment, and merges the postings found by document ID, every time (keeping
+        postings lists is up to CachedIndex). Since a document only ever appears in one segment, postings don't have to
+        be combined. The document frequency and the bounds of
+        a term (see BM25.top_k()) are combined from the ones stored in the segments, without decoding any postings.
+
+        :param segments: list of IndexReader, one per segment.
+        """
+        self.segments = segments
+        self.number_of_terms = None
+
+    def close(self):
+        """
+        Close every segment.
+        """
+        for segment in self.segments:
+            segment.close()
+
+    def get_document_frequency(self, term):
+        """
+        :param term: the term.
+        :return: number of documents the term appears in, in all of the segments, or 0 if it isn't in the index.
+        """
+        return sum(segment.get_document_frequency(term) for segment in self.segments)
+
+    def get_term_bounds(self, term):
+        """
+        :param term: the term.
+        :return: tuple of (maximum term frequency, minimum document length) of the term in all of the segments, or (0, 0)
+                 if it isn't in the index.
+        """
+        bounds = [segment.get_term_bounds(term) for segment in self.segments if term in segment]
+        if not bounds:
+            return 0, 0
+        return max(max_term_frequency for max_term_frequency, _ in bounds), min(min_document_length for _, min_document_length in bounds)
+
+    def __getitem__(self, term):
+        postings_lists = [segment[term] for segment in self.segments if term in segment]
+        if not postings_lists:
+            raise KeyError(term)
+        if len(postings_lists) == 1:
+            return postings_lists[0]
+        return list(heapq.merge(*postings_lists))
+
+    def __contains__(self, term):
+        return any(term in segment for segment in self.segments)
+
+    def __iter__(self):
+        return (term for term, _ in groupby(heapq.merge(*self.segments)))
+
+    def __len__(self):
+        if self.number_of_terms is None:
+            self.number_of_terms = sum(1 for _ in self)
+        return self.number_of_terms
@@ -0,0 +1,112 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import re
+from html.entities import html5
+
+
+class SGMLReader:
+    """
+    Streaming reader of the documents in a Reuters (SGML) file.
+
+    The file is read in chunks, and every document is extracted as soon as its closing REUTERS tag has been read, so only
+    a single document (plus a chunk) is ever held in memory. Only the two things the indexer needs are pulled out of a
+    document: the NEWID attribute of its REUTERS tag, and the text inside its TEXT tag.
+
+    The text is the same as the one BeautifulSoup (with html.parser) returns for document.find("text").text:
+        - tags are removed, and the text inside them is kept (e.g. the TITLE, DATELINE and BODY tags).
+        - comments, declarations and processing instructions are removed. CDATA sections are kept as they are.
+        - named entities (e.g. &lt;) are replaced by their character. Unknown entities become "&name".
+        - numeric character references (e.g. &#3;) are replaced by their character. References between 128 and 159
+          are read as Windows-1252 characters, and invalid ones become U+FFFD REPLACEMENT CHARACTER.
+    """
+
+    chunk_size = 2 ** 16
+
+    document_end = re.compile(r"</reuters\s*>", re.IGNORECASE)
+    document_start = re.compile(r"<reuters\b[^>]*?\bnewid\s*=\s*[\"']?(\d+)", re.IGNORECASE)
+    text = re.compile(r"<text\b[^>]*>(.*?)</text\s*>", re.IGNORECASE | re.DOTALL)
+    markup = re.compile(r"<!--.*?-->|<!\[CDATA\[(.*?)\]\]>|</?[a-zA-Z][^>]*>|<[!?][^>]*>", re.DOTALL)
+    reference = re.compile(r"&#([0-9]+|[xX][0-9a-fA-F]+)(?=[^0-9a-fA-F]|$);?|&([a-zA-Z][-.a-zA-Z0-9]*)(?=[^a-zA-Z0-9]|$);?")
+
+    entities = {name.rstrip(";"): character for name, character in html5.items()}
+
+    def __init__(self, file, encoding="ISO-8859-1"):
+        """
+        :param file: path of the reuters file.
+        :param encoding: encoding of the reuters file.
+        """
+        self.file = file
+        self.encoding = encoding
+
+    def __iter__(self):
+        """
+        Stream the documents of the file.
+        :return: generator of tuples of (document ID, text), in the order in which they appear in the file.
+        """
+        with open(self.file, encoding=self.encoding) as sgm_file:
+            buffer = ""
+            for chunk in iter(lambda: sgm_file.read(self.chunk_size), ""):
+                buffer += chunk
+                start = 0
+                for document_end in self.document_end.finditer(buffer):
+                    document = buffer[start:document_end.start()]
+                    start = document_end.end()
+                    document_id = self.document_start.search(document)
+                    if document_id:
+                        yield int(document_id.group(1)), self.get_text(document)
+                buffer = buffer[start:]
+
+    @classmethod
+    def get_text(cls, document):
+        """
+        Get the text inside the TEXT tag of a document, without its markup.
+        :param document: SGML of the document.
+        :return: the text, or an empty string if the document has no TEXT tag.
+        """
+        text = cls.text.search(document)
+        if not text:
+            return ""
+        text = text.group(1)
+
+        pieces = []
+        position = 0
+        for markup in cls.markup.finditer(text):
+            pieces.append(cls.unescape(text[position:markup.start()]))
+            if markup.group(1) is not None:
+                pieces.append(markup.group(1))
+            position = markup.end()
+        pieces.append(cls.unescape(text[position:]))
+
+        return "".join(pieces)
+
+    @classmethod
+    def unescape(cls, data):
+        """
+        Replace the entities and character references in a piece of text.
+        :param data: text, without markup.
+        :return: text with the entities and character references replaced.
+        """
+        if "&" not in data:
+            return data
+        return cls.reference.sub(cls.replace_reference, data)
+
+    @classmethod
+    def replace_reference(cls, reference):
+        """
+        :param reference: match of an entity (e.g. &lt;) or a numeric character reference (e.g. &#3;).
+        :return: the character it stands for.
+        """
+        number, name = reference.groups()
+        if name is not None:
+            return cls.entities.get(name, "&" + name)
+
+        number = int(number[1:], 16) if number[0] in "xX" else int(number)
+        if number == 0 or number > 0x10ffff or 0xd800 <= number <= 0xdfff:
+            return "�"
+        if 0x80 <= number <= 0x9f:
+            try:
+                return bytes([number]).decode("cp1252")
+            except UnicodeDecodeError:
+                pass
+        return chr(number)
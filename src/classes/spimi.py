@@ -2,44 +2,252 @@
 # coding: utf-8
 
 import os
+import sys
+import json
+import heapq
+import shutil
+import struct
+from contextlib import ExitStack
+from collections import Counter
+from itertools import groupby, dropwhile, takewhile, islice
+from multiprocessing import Pool
+from operator import itemgetter
 
 from definitions import ROOT_DIR
+from classes.run_format import TextRunFormat, BinaryRunFormat
+from classes.index_writer import IndexWriter
+from classes.index_reader import IndexReader
+from classes.document_statistics import DocumentStatistics
+from classes.build_manifest import BuildManifest
+from classes.segmented_index import SegmentedIndex
+from classes.profiler import Profiler
 
 
 class SPIMI:
 
-    def __init__(self, reuters):
+    def __init__(self, reuters, block_memory=None, merge_fan_in=128, text_blocks=False, postings_codec="vb",
+                 merge_workers=1, output_directory=None, append=False, profiler=None):
         """
-        Initialize the SPIMI inverter with a list of tokens.
+        Initialize the SPIMI inverter with a source of tokens.
         :param reuters: Reuters object which will contain reuters files and methods to obtain tokens.
+        :param block_memory: memory budget (in bytes) of the in-memory dictionary. When given, a block is written
+                             whenever the dictionary reaches that size, instead of every reuters.docs_per_block documents.
+        :param merge_fan_in: maximum number of files merged together (and opened at the same time) during the merge,
+                             at least 2, otherwise merge passes would never reduce the number of files.
+        :param text_blocks: write block files in the human readable TextRunFormat, instead of the compact
+                            BinaryRunFormat. Useful for debugging.
+        :param postings_codec: encoding of the postings in the index file, either "vb" (variable byte) or "gamma"
+                               (Elias gamma).
+        :param merge_workers: number of processes merging the block files in parallel, each one taking care of its own
+                              range of terms.
+        :param output_directory: directory in which block files and the index file will be generated (defaults to
+                                 DISK, in the root directory of the project). When constructing an index out of the
+                                 Reuters files, they are generated in a subdirectory named after the fingerprint of the
+                                 build (see BuildManifest), so that indexes constructed with different options don't
+                                 overwrite each other.
+        :param append: when there's no index of the Reuters files yet, but there's one of some of them (constructed with
+                       the same options), extend it with a segment containing the other files, instead of constructing
+                       a new index out of all of them (see construct_index()).
+        :param profiler: Profiler timing the inversion (block by block) and the merge (pass by pass).
         """
+        if merge_fan_in < 2:
+            raise ValueError("The fan-in of the merge must be at least 2, not %d." % merge_fan_in)
+
         self.reuters = reuters
+        self.block_memory = block_memory
+        self.merge_fan_in = merge_fan_in
+        self.postings_codec = postings_codec
+        self.merge_workers = merge_workers
+
+        self.append = append
+        self.profiler = profiler or Profiler(enabled=False)
 
-        self.output_directory = "DISK"
-        self.output_directory = "/".join([ROOT_DIR, self.output_directory])
+        self.indexes_directory = output_directory or "/".join([ROOT_DIR, "DISK"])
+        self.output_directory = self.indexes_directory
+        self.manifest = BuildManifest(self.reuters, self.postings_codec) if self.reuters else None
+        if self.manifest:
+            self.output_directory = "/".join([self.indexes_directory, self.manifest.fingerprint])
 
         self.block_prefix = "BLOCK"
         self.block_number = 0
-        self.block_suffix = ".txt"
-
-        self.output_index = "index"
-        self.output_index = "/".join([self.output_directory, self.output_index + self.block_suffix])
-        self.mkdir_output_directory(self.output_directory)
+        self.run_format = TextRunFormat if text_blocks else BinaryRunFormat
+        self.block_suffix = self.run_format.suffix
+        self.run_prefix = "RUN"
+        self.partition_prefix = "PARTITION"
+        self.segment_prefix = "SEGMENT"
+        self.documents_prefix = "DOCUMENTS"
+
+        # every sample_step-th term of every block, used to split terms into ranges of about the same size
+        self.sample_step = 64
+        self.term_samples = []
+
+        # estimated size of the dictionary currently in memory, and statistics about each block written
+        self.dictionary_size = 0
+        self.block_statistics = []
+        self.pointer_size = struct.calcsize("P")
+        self.empty_postings_list_size = sys.getsizeof([])
+        self.posting_size = sys.getsizeof((0, 0))
+
+        self.output_manifest = "/".join([self.output_directory, BuildManifest.file_name])
+        self.output_segments = "/".join([self.output_directory, "segments.json"])
+
+        # sizes of the index file compared to a text index, only available if the index was constructed (not reused)
+        self.index_statistics = None
+        if self.is_index_valid():
+            self.mkdir_output_directory(self.output_directory, [self.output_manifest, self.output_segments] + self.get_segment_files())
+        else:
+            self.mkdir_output_directory(self.output_directory)
+            if self.append:
+                self.link_segments(self.find_extended_index())
+
+        # list of the segments of the index, with the files each of them was constructed out of
+        self.segments = self.read_segments(self.output_segments)
 
-        self.list_of_lists_of_tokens = self.reuters.get_tokens()
+        """
+        Files that will be written: the index file, and the document statistics, of the next segment.
+        Without a Reuters object (e.g. when block files are merged on their own), there are no segments.
+        """
+        if self.manifest:
+            self.segment_number = max([segment["number"] for segment in self.segments["segments"]], default=0) + 1
+            self.output_index = self.get_segment_index(self.output_directory, self.segment_number)
+            self.output_document_statistics = self.get_segment_document_statistics(self.output_directory, self.segment_number)
+        else:
+            self.output_index = "/".join([self.output_directory, "index" + IndexWriter.suffix])
+            self.output_document_statistics = "/".join([self.output_directory, "documents" + IndexWriter.suffix])
 
     @staticmethod
-    def mkdir_output_directory(output_directory):
+    def mkdir_output_directory(output_directory, kept_files=()):
         """
         Make an output directory in which we will store disk blocks.
-        If it already exists, ask user if we should overwrite it.
+        If it already exists, delete the files left in it (e.g. block files of an interrupted run), except for the kept
+        files, so that an index which was already constructed can be reused.
         :param output_directory: directory in which output files will be generated.
+        :param kept_files: paths of the files which shouldn't be deleted.
         """
         try:
-            os.mkdir(output_directory)
+            os.makedirs(output_directory)
         except FileExistsError:
+            kept_files = {os.path.abspath(file) for file in kept_files}
             for file in os.listdir(output_directory):
-                os.unlink(os.path.join(output_directory, file))
+                file = os.path.join(output_directory, file)
+                if os.path.abspath(file) not in kept_files:
+                    os.unlink(file)
+
+    def is_index_valid(self):
+        """
+        An index in the output directory can be reused if it's complete (its manifest is only written once its segments
+        are), and was constructed with the same options, out of the same files, with the same file formats (see
+        BuildManifest).
+        :return: True if the index in the output directory can be reused.
+        """
+        return (self.manifest is not None and self.manifest.matches(self.output_manifest)
+                and all(os.path.exists(file) for file in self.get_segment_files()))
+
+    def get_segment_index(self, directory, segment_number):
+        """
+        :param directory: directory of the index.
+        :param segment_number: number of the segment.
+        :return: path of the index file of the segment.
+        """
+        return "/".join([directory, "".join([self.segment_prefix, str(segment_number), IndexWriter.suffix])])
+
+    def get_segment_document_statistics(self, directory, segment_number):
+        """
+        :param directory: directory of the index.
+        :param segment_number: number of the segment.
+        :return: path of the document statistics of the segment.
+        """
+        return "/".join([directory, "".join([self.documents_prefix, str(segment_number), IndexWriter.suffix])])
+
+    def get_segment_files(self, directory=None):
+        """
+        :param directory: directory of the index (defaults to the output directory).
+        :return: list of the files of the segments of the index, or an empty list if it has no segment list.
+        """
+        directory = directory or self.output_directory
+        segments = self.read_segments("/".join([directory, os.path.basename(self.output_segments)]))
+        return [file for segment in segments["segments"]
+                for file in [self.get_segment_index(directory, segment["number"]),
+                             self.get_segment_document_statistics(directory, segment["number"])]]
+
+    @staticmethod
+    def read_segments(segments_file):
+        """
+        :param segments_file: path of the segment list of an index.
+        :return: segment list, i.e. dictionary with the generation of the index (incremented whenever its segments
+                 change) and its list of segments, or an empty one if there's no segment list.
+        """
+        try:
+            with open(segments_file) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {"generation": 0, "segments": []}
+
+    def get_generation(self):
+        """
+        :return: generation of the index, which changes whenever its segments do (see add_segment() and Compaction).
+        """
+        return self.read_segments(self.output_segments)["generation"]
+
+    @staticmethod
+    def write_segments(segments_file, segments):
+        """
+        Replace the segment list of an index, atomically: it's written to a temporary file first, which then takes the
+        place of the old one, so readers either see the old list, or the new one.
+        :param segments_file: path of the segment list.
+        :param segments: segment list (see read_segments()).
+        """
+        temporary_file = segments_file + ".tmp"
+        with open(temporary_file, "w") as file:
+            json.dump(segments, file, indent=4)
+        os.replace(temporary_file, segments_file)
+
+    def find_extended_index(self):
+        """
+        Find the index, among the ones constructed with the same options, that was constructed out of the most of our
+        Reuters files (and no other), so that it can be extended with the ones it's missing (see BuildManifest.extends()).
+        :return: directory of the index, or None if there's none.
+        """
+        extended_index = None
+        most_files = 0
+        for directory in os.listdir(self.indexes_directory):
+            directory = "/".join([self.indexes_directory, directory])
+            if directory == self.output_directory or not os.path.isdir(directory):
+                continue
+            number_of_files = self.manifest.extends("/".join([directory, BuildManifest.file_name]))
+            if number_of_files and number_of_files > most_files and all(os.path.exists(file) for file in self.get_segment_files(directory)):
+                extended_index, most_files = directory, number_of_files
+        return extended_index
+
+    def link_segments(self, directory):
+        """
+        Make the segments of another index the first segments of ours. Segments are never modified once they're written,
+        so they're hard linked instead of copied (unless the file system doesn't support it).
+        :param directory: directory of the other index, or None.
+        """
+        if directory is None:
+            return
+
+        for file in self.get_segment_files(directory):
+            linked_file = "/".join([self.output_directory, os.path.basename(file)])
+            try:
+                os.link(file, linked_file)
+            except OSError:
+                shutil.copyfile(file, linked_file)
+
+        segments = self.read_segments("/".join([directory, os.path.basename(self.output_segments)]))
+        self.write_segments(self.output_segments, segments)
+        print("Extending the index in %s.\n" % directory)
+
+    def add_segment(self, files, number_of_documents):
+        """
+        Add the segment that was just written to the segment list, and increment the generation of the index.
+        :param files: names of the Reuters files the segment was constructed out of.
+        :param number_of_documents: number of documents in the segment.
+        """
+        self.segments["generation"] += 1
+        self.segments["segments"].append({"number": self.segment_number, "files": files, "documents": number_of_documents})
+        self.write_segments(self.output_segments, self.segments)
 
     @staticmethod
     def add_to_dictionary(dictionary, term):
@@ -63,13 +271,14 @@ class SPIMI:
         return dictionary[term]
 
     @staticmethod
-    def add_to_postings_list(postings_list, document_id):
+    def add_to_postings_list(postings_list, document_id, term_frequency):
         """
-        Add document ID to term's postings list.
+        Add document ID to term's postings list, along with the number of times the term appears in the document.
         :param postings_list: list of postings of the term.
         :param document_id: document in which term appears.
+        :param term_frequency: number of times the term appears in the document.
         """
-        postings_list.append(document_id)
+        postings_list.append((document_id, term_frequency))
 
     @staticmethod
     def sort_terms(dictionary):
@@ -81,149 +290,366 @@ class SPIMI:
         return [term for term in sorted(dictionary)]
 
     @staticmethod
-    def write_block_to_output_directory(sorted_terms, dictionary, block_file):
+    def write_block_to_output_directory(sorted_terms, dictionary, block_file, run_format=BinaryRunFormat):
         """
-        Create BLOCK*.txt file(s) in the output directory.
-        The text file(s) will contain terms, with the document IDs in which they appear.
-        :param terms: list of sorted terms.
+        Create BLOCK* file(s) in the output directory.
+        The file(s) will contain terms, with the document IDs in which they appear and their term frequencies.
+        :param sorted_terms: list of sorted terms.
         :param dictionary: dictionary containing terms as keys, and their corresponding list of postings as values.
         :param block_file: file in which data will be written.
-        :return:
+        :param run_format: format of the block file, either BinaryRunFormat or TextRunFormat.
+        :return: path of the block file.
         """
-        with open(block_file, 'w') as file:
+        with run_format.open(block_file, "w") as file:
             for term in sorted_terms:
-                line = "%s %s\n" % (term, ' '.join([str(document_id) for document_id in dictionary[term]]))
-                file.write(line)
+                run_format.write(file, term, run_format.encode(dictionary[term]))
         return block_file
 
+    def write_block(self, dictionary):
+        """
+        Sort the terms of the in-memory dictionary and dump it into the next BLOCK* file.
+        Also keep track of the size the dictionary had reached, so that it can be reported once indexing is done.
+        :param dictionary: dictionary containing terms as keys, and their corresponding list of postings as values.
+        :return: path of the block file that was written.
+        """
+        self.block_number += 1
+        terms = self.sort_terms(dictionary)
+
+        block_file = "/".join([self.output_directory, "".join([self.block_prefix, str(self.block_number), self.block_suffix])])
+        self.term_samples.extend(terms[::self.sample_step])
+        self.block_statistics.append({
+            "terms": len(dictionary),
+            "postings": sum(len(dictionary[term]) for term in terms),
+            "size": self.dictionary_size
+        })
+
+        return self.write_block_to_output_directory(terms, dictionary, block_file, self.run_format)
+
+    def is_block_full(self, documents_in_block):
+        """
+        Decide whether the dictionary currently in memory should be flushed to disk.
+        If a memory budget was given, the block is full once the estimated size of the dictionary reaches it.
+        Otherwise, the block is full once it contains the tokens of docs_per_block documents.
+        :param documents_in_block: number of documents whose tokens are in the current dictionary.
+        :return: True if the dictionary should be written to a block file.
+        """
+        if self.block_memory:
+            return self.dictionary_size >= self.block_memory
+        return documents_in_block >= self.reuters.docs_per_block
+
     def construct_index(self):
         """
         Run the single-pass in-memory indexing (SPIMI) inversion algorithm.
         We start off with an empty dictionary.
 
-        For each list of tokens in the list of lists of tokens, generate a dictionary, which will be dumpled into a
-        block file.
+        The Reuters object streams its documents one at a time. The tokens of each document are counted, and every
+        term of the document is added to the dictionary with a posting of (document ID, term frequency). As soon as the
+        block is full (see is_block_full()), the dictionary is dumped into a block file
+        and we start over with an empty one. That way, only one block is ever held in memory.
+
+        While adding tokens, we keep an estimate of the dictionary's size in memory:
+            - every new term costs the size of the string, plus the size of its (empty) postings list.
+            - every posting costs a tuple, and a pointer to it in its postings list.
+            - every document costs the size of its document ID, which all of its postings point to.
+            - on top of that, the size of the dictionary's own hash table.
+        The check is done between documents, so a block can go over the memory budget by at most one document.
 
-        At the end of the method, the block files are used to construct the final inverted index.
+        At the end of the method, the block files are used to construct the final inverted index. The length of every
+        document is written next to it (see DocumentStatistics), and finally the manifest of the build, so that both
+        can be reused without parsing the Reuters files again, as long as the manifest is still valid (see
+        is_index_valid()).
 
-        :return: a method call to merge the generated block files.
+        The index file and the document statistics make up a segment of the index. When an existing index is extended
+        (see the append parameter), only the Reuters files that aren't in its segments are parsed, into a new segment,
+        so the time it takes depends on the size of the new files, not on the size of the whole index.
+
+        :return: the inverted index (see get_index()).
         """
-        if os.path.exists(self.output_index):
+        if self.is_index_valid():
+            print("Reusing the index in %s.\n" % self.output_directory)
             return self.get_index()
 
-        block_files = []
-
-        for list_of_tokens in self.list_of_lists_of_tokens:
-            dictionary = {}
+        indexed_files = {file for segment in self.segments["segments"] for file in segment["files"]}
+        self.reuters.reuters_files = [file for file in self.reuters.reuters_files if os.path.basename(file) not in indexed_files]
+        if indexed_files:
+            print("Indexing %d new Reuters file(s) into segment %d.\n" % (len(self.reuters.reuters_files), self.segment_number))
 
-            for token in list_of_tokens:
+        block_files = []
+        write_block = self.profiler.time_function("invert: write block", self.write_block)
 
-                if token[0] not in dictionary:
-                    postings_list = self.add_to_dictionary(dictionary, token[0])
-                else:
-                    postings_list = self.get_postings_list(dictionary, token[0])
+        dictionary = {}
+        entries_size = 0
+        documents_in_block = 0
+        tokens_in_block = 0
 
-                self.add_to_postings_list(postings_list, token[1])
+        inversion = self.profiler.start_phase("invert")
+        block = self.profiler.start_phase("block %d" % (self.block_number + 1))
+        for document_id, terms in self.reuters.get_documents():
+            entries_size += sys.getsizeof(document_id)
+            tokens_in_block += len(terms)
 
-            self.block_number += 1
-            terms = self.sort_terms(dictionary)
+            term_frequencies = Counter(terms)
 
-            block_file = "/".join([self.output_directory, "".join([self.block_prefix, str(self.block_number), self.block_suffix])])
-            block_files.append(self.write_block_to_output_directory(terms, dictionary, block_file))
+            for term, term_frequency in term_frequencies.items():
 
-        return self.merge_blocks(block_files)
+                if term not in dictionary:
+                    postings_list = self.add_to_dictionary(dictionary, term)
+                    entries_size += sys.getsizeof(term) + self.empty_postings_list_size
+                else:
+                    postings_list = self.get_postings_list(dictionary, term)
+
+                self.add_to_postings_list(postings_list, document_id, term_frequency)
+
+            entries_size += (self.pointer_size + self.posting_size) * len(term_frequencies)
+            documents_in_block += 1
+            self.dictionary_size = sys.getsizeof(dictionary) + entries_size
+
+            if self.is_block_full(documents_in_block):
+                block_files.append(write_block(dictionary))
+                self.profiler.stop_phase(block, documents=documents_in_block, tokens=tokens_in_block,
+                                         bytes_written=os.path.getsize(block_files[-1]))
+                dictionary = {}
+                entries_size = 0
+                documents_in_block = 0
+                tokens_in_block = 0
+                block = self.profiler.start_phase("block %d" % (self.block_number + 1))
+
+        if dictionary:
+            block_files.append(write_block(dictionary))
+            self.profiler.stop_phase(block, documents=documents_in_block, tokens=tokens_in_block,
+                                     bytes_written=os.path.getsize(block_files[-1]))
+        else:
+            self.profiler.stop_phase(block, discard=True)
+        del dictionary
+        self.profiler.stop_phase(inversion, documents=self.reuters.number_of_documents, tokens=self.reuters.number_of_tokens,
+                                 blocks=len(block_files))
+
+        DocumentStatistics.from_document_lengths(self.reuters.document_lengths).write(self.output_document_statistics)
+
+        self.print_block_statistics()
+
+        with self.profiler.phase("merge"):
+            self.merge_blocks(block_files).close()
+        self.add_segment([os.path.basename(file) for file in self.reuters.reuters_files], len(self.reuters.document_lengths))
+        self.manifest.write(self.output_manifest)
+        return self.get_index()
 
-    def merge_blocks(self, block_files):
+    def print_block_statistics(self):
+        """
+        Print how many block files were generated, and the peak size the dictionary reached for each one of them.
+        """
+        print("%d block file(s) generated." % len(self.block_statistics))
+        for block_number, statistics in enumerate(self.block_statistics, 1):
+            print("    %s%d%s: %s terms, %s postings, peak dictionary size of %s MB"
+                  % (self.block_prefix, block_number, self.block_suffix, "{:,}".format(statistics["terms"]),
+                     "{:,}".format(statistics["postings"]), "{:,.2f}".format(statistics["size"] / 2 ** 20)))
+        print()
+
+    def merge_runs(self, run_files, lower_term=None, upper_term=None, throttle=None):
+        """
+        Merge sorted block files (or runs from a previous merge pass) using a priority queue, keyed on the term alone.
+        The merge can be limited to a range of terms, in which case terms that come before it are skipped, and files
+        stop being read as soon as a term that comes after it is found.
+
+        heapq.merge() keeps a heap containing the next line of every file, so finding the next term costs O(log k)
+        for k files. When several files contain the same term, they come out in the order in which the files were given.
+        Since blocks are generated in increasing order of document ID, the postings of a term can simply be
+        concatenated in that order, and they remain sorted. Postings stay in the run format while they're merged, they
+        are never converted back into lists of tuples.
+
+        :param run_files: list of block files to merge, in the order in which they were generated.
+        :param lower_term: first term of the range (inclusive), or None to start from the first term.
+        :param upper_term: last term of the range (exclusive), or None to go all the way to the last term.
+        :param throttle: function called with the number of bytes of every term read from the files, which can sleep to
+                         limit the rate at which they're read (see Compaction.throttle()), or None.
+        :return: generator of tuples of (term, postings), sorted alphabetically by term, with one tuple per term.
+        """
+        with ExitStack() as stack:
+            runs = [self.run_format.read(stack.enter_context(self.run_format.open(run_file, "r"))) for run_file in run_files]
+            if lower_term is not None:
+                runs = [dropwhile(lambda record: record[0] < lower_term, run) for run in runs]
+            if upper_term is not None:
+                runs = [takewhile(lambda record: record[0] < upper_term, run) for run in runs]
+            for term, group in groupby(heapq.merge(*runs, key=itemgetter(0)), key=itemgetter(0)):
+                postings = [postings for _, postings in group]
+                if throttle:
+                    throttle(sum(len(term) + len(run_postings) for run_postings in postings))
+                yield term, self.run_format.concatenate(postings)
+
+    def merge_blocks(self, block_files, output_index=None, document_lengths=None, throttle=None):
         """
         Merging the block files.
 
-        First, we initialize a list containing an open stream of all block files, which we will subsequently read.
-        Next, we initialize a list containing the first line of each of those block files.
-        NOTE: When we see a [:-1], it is used to delete the trailing newline in the string returned when reading a file.
-
-        We keep a variable containing the most recent term also. At first, we initialize it to an empty string "".
-
-        We run a check to ensure that each file isn't empty. When you read an empty file, you get returned an empty
-        string "". We want to delete those files from the list from the beginning.
-
-        Then, we open the index file, with write permissions.
-        We run the following sequence as long as there are still block files to be read:
-            - In the list of lines, we find the index of the one which comes first alphabetically, compared to the rest.
-              We do this by finding the minimum value in the list.
-            - Using that, we compare the term in the line to the most recent term:
-                • If they're not equal, we create a new line in the index with the new word, and its postings from the
-                  current block file.
-                • If they're equal, then since it's the most recent term, it's the most recent (last) line in the index
-                  file currently. So we just extend the term's postings list by adding on to it in the index file.
-            - After all of that, we replace the line we just used in the list of lines, with the next line of the block
-              file. If there are no more lines to be read, we'd get an empty string "", in which case we'd close and
-              delete the block file from the list of block files, as well as its line from the list of lines.
-            - Once there are no more block files, we close the index file.
+        At most merge_fan_in files are ever opened at the same time, so that we never run out of file descriptors.
+        As long as there are more block files than that, we do a merge pass:
+            - The files are split into groups of merge_fan_in files.
+            - Each group is merged into a single RUN file (in the same format as the block files).
+            - The RUN files then take the place of the files they were merged from, which are deleted once they've
+              been merged, block files included.
+
+        Once there are few enough files left, they are merged straight into the compressed index file, through an
+        IndexWriter. Every term is added once, with all of its postings (see merge_runs()). The files are then deleted
+        too, so no block or RUN file is left once the index file is written.
+        With more than one merge worker, that last merge is split by range of terms instead (see merge_partitions()),
+        unless it's throttled: the rate at which files are read can't be shared among worker processes.
 
         :param block_files: list of block files which will be merged together to create an index file.
-        :return: a method call to create a dictionary object from the merged index.
+        :param output_index: path of the index file (defaults to output_index, the index file of the next segment).
+        :param document_lengths: dictionary of document ID -> length of the document in words (defaults to the ones
+                                 gathered by the Reuters object).
+        :param throttle: function limiting the rate at which the files are read, in every pass (see merge_runs()), or
+                         None.
+        :return: IndexReader of the merged index file.
         """
-        block_files = [open(block_file) for block_file in block_files]
-        lines = [block_file.readline()[:-1] for block_file in block_files]
-        most_recent_term = ""
+        output_index = output_index or self.output_index
+        if document_lengths is None:
+            document_lengths = self.get_document_lengths()
+        merge_pass = 0
+
+        while len(block_files) > self.merge_fan_in:
+            merge_pass += 1
+            run_files = []
+            merge_pass_phase = self.profiler.start_phase("merge pass %d" % merge_pass)
+
+            for run_number, start in enumerate(range(0, len(block_files), self.merge_fan_in), 1):
+                run_file = "/".join([self.output_directory, "".join([self.run_prefix, str(merge_pass), "-", str(run_number), self.block_suffix])])
+                with self.run_format.open(run_file, "w") as output_run:
+                    for term, postings in self.merge_runs(block_files[start:start + self.merge_fan_in], throttle=throttle):
+                        self.run_format.write(output_run, term, postings)
+                run_files.append(run_file)
+            self.profiler.stop_phase(merge_pass_phase, files=len(block_files), runs=len(run_files),
+                                     bytes_read=sum(map(os.path.getsize, block_files)),
+                                     bytes_written=sum(map(os.path.getsize, run_files)))
+
+            for block_file in block_files:
+                os.unlink(block_file)
+            block_files = run_files
+
+        with self.profiler.phase("merge into index") as counters:
+            if self.merge_workers > 1 and not throttle:
+                self.merge_partitions(block_files, output_index, document_lengths)
+            else:
+                self.index_statistics = self.merge_partition(block_files, None, None, output_index, document_lengths, throttle)
+            counters.update(files=len(block_files), terms=self.index_statistics["terms"],
+                            postings=self.index_statistics["postings"], bytes_read=sum(map(os.path.getsize, block_files)),
+                            bytes_written=os.path.getsize(output_index))
 
-        index = 0
         for block_file in block_files:
-            if lines[index] == "":
-                block_files.pop(index)
-                lines.pop(index)
-            else:
-                index += 1
+            os.unlink(block_file)
+        if merge_pass > 0:
+            print("%d merge pass(es) done before merging into the index.\n" % merge_pass)
 
-        with open(self.output_index, "w") as output_index:
-            while len(block_files) > 0:
+        return IndexReader(output_index)
 
-                min_index = lines.index(min(lines))
-                line = lines[min_index]
-                current_term = line.split()[0]
-                current_postings = " ".join(map(str, sorted(list(map(int, line.split()[1:])))))
+    def get_document_lengths(self):
+        """
+        :return: dictionary of document ID -> length of the document in words, or None if there's no Reuters object.
+        """
+        return self.reuters.document_lengths if self.reuters else None
 
-                if current_term != most_recent_term:
-                    output_index.write("\n%s %s" % (current_term, current_postings))
-                    most_recent_term = current_term
-                else:
-                    output_index.write(" %s" % current_postings)
+    def merge_partition(self, block_files, lower_term, upper_term, partition_file, document_lengths=None, throttle=None):
+        """
+        Merge a range of terms of the block files into an index file.
+        :param block_files: list of block files which will be merged together.
+        :param lower_term: first term of the range (inclusive), or None to start from the first term.
+        :param upper_term: last term of the range (exclusive), or None to go all the way to the last term.
+        :param partition_file: index file in which the range of terms will be written.
+        :param document_lengths: dictionary of document ID -> length of the document in words (see IndexWriter).
+        :param throttle: function limiting the rate at which the block files are read (see merge_runs()), or None.
+        :return: statistics of the IndexWriter that wrote the index file.
+        """
+        with IndexWriter(partition_file, self.postings_codec, document_lengths=document_lengths) as index_writer:
+            for term, postings in self.merge_runs(block_files, lower_term, upper_term, throttle):
+                index_writer.add(term, self.run_format.decode(postings))
+        return index_writer.statistics
+
+    def get_partition_boundaries(self, block_files, number_of_partitions):
+        """
+        Split terms into ranges containing about the same number of terms, using a sample of the terms: every
+        sample_step-th term of every block. Samples are taken as blocks are written. If the block files weren't written
+        by this object, they are read to take the samples.
+        :param block_files: list of block files which will be merged together.
+        :param number_of_partitions: number of ranges of terms.
+        :return: sorted list of terms at which a range ends and the next one starts.
+        """
+        term_samples = self.term_samples
+        if not term_samples:
+            for block_file in block_files:
+                with self.run_format.open(block_file, "r") as run_file:
+                    term_samples.extend(islice(map(itemgetter(0), self.run_format.read(run_file)), 0, None, self.sample_step))
+
+        term_samples = sorted(set(term_samples))
+        boundaries = [term_samples[len(term_samples) * partition // number_of_partitions]
+                      for partition in range(1, number_of_partitions)]
+        return sorted(set(boundaries) - {term_samples[0]}) if term_samples else []
+
+    def merge_partitions(self, block_files, output_index, document_lengths):
+        """
+        Merge the block files in parallel, by range of terms.
 
-                lines[min_index] = block_files[min_index].readline()[:-1]
+        The terms are split into ranges of about the same size (see get_partition_boundaries()), one per merge worker.
+        Each worker process merges its own range of terms from all of the block files into a PARTITION* index file.
+        Since ranges don't overlap, and are in alphabetical order, the partitions are then simply concatenated into the
+        final index file: their postings are copied as they are, and their terms are added to a combined dictionary
+        (see IndexWriter.append_index()).
 
-                if lines[min_index] == "":
-                    block_files[min_index].close()
-                    block_files.pop(min_index)
-                    lines.pop(min_index)
+        :param block_files: list of block files which will be merged together to create an index file.
+        :param output_index: path of the index file.
+        :param document_lengths: dictionary of document ID -> length of the document in words (see IndexWriter).
+        """
+        boundaries = self.get_partition_boundaries(block_files, self.merge_workers)
+        ranges = list(zip([None] + boundaries, boundaries + [None]))
+        partition_files = ["/".join([self.output_directory, "".join([self.partition_prefix, str(partition_number), IndexWriter.suffix])])
+                           for partition_number in range(1, len(ranges) + 1)]
+
+        """
+        Document lengths are passed explicitly, since they aren't sent along with the Reuters object.
+        """
+        with Pool(len(ranges)) as pool:
+            partition_statistics = pool.starmap(self.merge_partition, [(block_files, lower_term, upper_term, partition_file, document_lengths)
+                                                                       for (lower_term, upper_term), partition_file in zip(ranges, partition_files)])
 
-            output_index.close()
+        with IndexWriter(output_index, self.postings_codec) as index_writer:
+            for partition_file, statistics in zip(partition_files, partition_statistics):
+                index_reader = IndexReader(partition_file)
+                index_writer.append_index(index_reader, statistics)
+                index_reader.close()
+                os.unlink(partition_file)
+        self.index_statistics = index_writer.statistics
 
-        return self.get_index()
+        print("Merged %d range(s) of terms in parallel.\n" % len(ranges))
 
     def get_index(self):
         """
-        This method will read the index file and create a dictionary object from it, containing terms as keys and their
-        corresponding postings as values.
-
-        We first initialize an empty dictionary, which will be the inverted index.
-        Then we open the index file and return a stream. We read the first line since it's just a newline generated in
-        the file from the merge_blocks() method.
+        Open the index file, without reading it all in memory.
 
-        For every line of the index file:
-        - We split it, using a space (" ") as the delimiter (default).
-        - The first value in the list is the term (-> key).
-        - The rest of the values in the list are the postings (-> value).
-            • We make sure to make the postings are sorted.
+        The IndexReader memory-maps the index file, and only decodes the postings of a term once it is looked up. It can
+        be used like a dictionary containing terms as keys, and their corresponding postings as values.
+        An index with several segments is opened as a SegmentedIndex, which can be used the same way. The segment list is
+        read again, in case segments were merged since (see Compaction), and the segments it lists are opened right
+        away, so the index keeps using them even if they're merged later on.
 
-        :return: the inverted index, i.e. the dictionary containing terms as keys, and a set of postings as values.
+        :return: the inverted index, i.e. an IndexReader (or SegmentedIndex) mapping terms to sorted lists of
+                 (document ID, term frequency).
         """
-        inverted_index = {}
+        if not self.manifest:
+            return IndexReader(self.output_index)
 
-        index_file = open(self.output_index)
-        index_file.readline()
+        self.segments = self.read_segments(self.output_segments)
+        segments = [IndexReader(self.get_segment_index(self.output_directory, segment["number"]))
+                    for segment in self.segments["segments"]]
+        return segments[0] if len(segments) == 1 else SegmentedIndex(segments)
 
-        for line in index_file:
-            line = line.split()
-            inverted_index[line[0]] = sorted(map(int, (line[1:])))
+    def get_document_statistics(self):
+        """
+        Load the statistics about the documents of the index (see DocumentStatistics), which can be used instead of the
+        Reuters object to rank documents. The statistics of the segments of the index are combined.
+        :return: DocumentStatistics object.
+        """
+        if not self.manifest:
+            return DocumentStatistics.read(self.output_document_statistics)
 
-        return inverted_index
+        self.segments = self.read_segments(self.output_segments)
+        statistics = [DocumentStatistics.read(self.get_segment_document_statistics(self.output_directory, segment["number"]))
+                      for segment in self.segments["segments"]]
+        return statistics[0] if len(statistics) == 1 else DocumentStatistics.combine(statistics)
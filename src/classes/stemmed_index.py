@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import heapq
+import threading
+from itertools import groupby
+from operator import itemgetter
+from collections.abc import Mapping
+
+from definitions import normalizer
+
+
+class StemmedIndex(Mapping):
+
+    def __init__(self, index):
+        """
+        View of an index with all of its terms stemmed, which will produce more consistent results when we conduct
+        queries. Terms that have the same stem have their postings combined, adding up their term frequencies.
+        For example, an index of: {'connect': [(1, 1)], 'connected': [(1, 2), (3, 1)], 'connection': [(5, 1)]}
+        is seen as: {'connect': [(1, 3), (3, 1), (5, 1)]}.
+        Note: This is only used for the queries. The index that appears in the index file hasn't been modified.
+
+        The terms are all stemmed the first time a stem is looked up, rather than when the index is opened, so that a
+        process that never runs a query doesn't load the stemmer. The postings of a stem are combined every time it is
+        looked up (keeping postings lists is up to CachedIndex).
+
+        :param index: dictionary (or IndexReader) containing terms and the postings in which they appear.
+        """
+        self.index = index
+
+        # stem -> list of terms of the index that have that stem (see get_terms())
+        self.terms = None
+        self.lock = threading.Lock()
+
+    def close(self):
+        """
+        Close the index it's a view of, if it can be (e.g. an IndexReader).
+        """
+        if hasattr(self.index, "close"):
+            self.index.close()
+
+    def get_terms(self):
+        """
+        :return: dictionary of stem -> list of terms of the index that have that stem, built if it wasn't yet.
+        """
+        with self.lock:
+            if self.terms is None:
+                terms = {}
+                for term in self.index:
+                    terms.setdefault(normalizer.stem(term), []).append(term)
+                self.terms = terms
+        return self.terms
+
+    def __getitem__(self, stem):
+        terms = self.get_terms()[stem]
+        if len(terms) == 1:
+            return self.index[terms[0]]
+        postings = heapq.merge(*[self.index[term] for term in terms], key=itemgetter(0))
+        return [(document_id, sum(term_frequency for _, term_frequency in group))
+                for document_id, group in groupby(postings, key=itemgetter(0))]
+
+    def get_document_frequency(self, stem):
+        """
+        Get the number of documents a stem appears in, without combining its postings.
+        When the stem has several terms, a document can contain more than one of them, so the sum of their document
+        frequencies is only an upper bound, good enough to order terms by (see AndQuery).
+        :param stem: the stem.
+        :return: the stem's document frequency (or an upper bound of it), or 0 if it isn't in the index.
+        """
+        terms = self.get_terms()
+        if stem not in terms:
+            return 0
+        if not hasattr(self.index, "get_document_frequency"):
+            return len(self[stem])
+        return sum(self.index.get_document_frequency(term) for term in terms[stem])
+
+    def get_term_bounds(self, stem):
+        """
+        Bound the term frequencies and document lengths of a stem, without combining its postings.
+        A document's term frequency for the stem is the sum of its term frequencies for the stem's terms, so it can't be
+        higher than the sum of their maximum term frequencies.
+        :param stem: the stem.
+        :return: tuple of (maximum term frequency, minimum document length), or (0, 0) if it isn't in the index.
+        """
+        terms = self.get_terms()
+        if stem not in terms:
+            return 0, 0
+        if not hasattr(self.index, "get_term_bounds"):
+            return max(term_frequency for _, term_frequency in self[stem]), 0
+        bounds = [self.index.get_term_bounds(term) for term in terms[stem]]
+        return sum(max_term_frequency for max_term_frequency, _ in bounds), min(min_document_length for _, min_document_length in bounds)
+
+    def __iter__(self):
+        return iter(self.get_terms())
+
+    def __len__(self):
+        return len(self.get_terms())
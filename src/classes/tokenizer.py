@@ -0,0 +1,238 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import re
+from functools import lru_cache
+
+
+class Tokenizer:
+
+    # characters the Treebank tokenizer always splits off, whatever is around them
+    separated_characters = ";@#$%&*[](){}<>\u2012\u2013\u2014\u2015"
+    # other characters at least one rule acts upon, depending on what's around them (quotes and punctuation)
+    special_characters = "«“‘„`\"'.,:?!»”’"
+    # characters no rule acts upon, or that are always split off, and hyphens (but double dashes), commas and colons
+    # followed by a digit or ending the chunk, or periods followed by a character no rule acts upon
+    quiet_characters = r"[^\s{0}\-]*(?:(?:-(?!-)|[,:](?=\d|\s|\Z)|\.(?=[^\s{0}{1}]))[^\s{0}\-]*)*".format(
+        re.escape(special_characters), re.escape(separated_characters))
+    # a chunk of text between two whitespaces, with at least one special character (and the quiet characters before it)
+    # the quiet characters are matched in a lookahead, then by a backreference, so that they're never given back to \S+
+    # (like a possessive quantifier, which Python only has since 3.11)
+    special_chunk = re.compile(r"(?<!\S)(?=(%s))\1\S+" % quiet_characters)
+    # commas and colons ending the quiet chunks, split off once the special chunks are done, along with the characters
+    # that always are (with plain replacements, which run a lot faster than templates)
+    final_comma = re.compile(r",(?!\S)")
+    final_colon = re.compile(r":(?!\S)")
+
+    # rules of nltk's NLTKWordTokenizer (nltk/tokenize/destructive.py), in the same order
+    starting_quotes = [
+        (re.compile("([«“‘„]|[`]+)", re.U), r" \1 "),
+        (re.compile(r"^\""), r"``"),
+        (re.compile(r"(``)"), r" \1 "),
+        (re.compile(r"([ \(\[{<])(\"|\'{2})"), r"\1 `` "),
+        (re.compile(r"(?i)(?<!\w)(\')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)", re.U), r"\1 "),
+    ]
+    # the rules splitting the period at the end of a sentence off (the first and the seventh) only apply to its last chunk
+    final_punctuation = [
+        (re.compile(r'([^\.])(\.)([\]\)}>"\'' "»”’ " r"]*)\s*$", re.U), r"\1 \2 \3 "),
+        (re.compile(r"([:,])([^\d])"), r" \1 \2"),
+        (re.compile(r"([:,])$"), r" \1 "),
+        (re.compile(r"\.{2,}", re.U), r" \g<0> "),
+        (re.compile(r"[;@#$%&]"), r" \g<0> "),
+        (re.compile(r"[\u2012-\u2015]", re.U), r" \g<0> "),
+        (re.compile(r'([^\.])(\.)([\]\)}>"\']*)\s*$'), r"\1 \2\3 "),
+        (re.compile(r"[?!]"), r" \g<0> "),
+        (re.compile(r"([^'])' "), r"\1 ' "),
+        (re.compile(r"[*]", re.U), r" \g<0> "),
+    ]
+    punctuation = [rule for number, rule in enumerate(final_punctuation) if number not in (0, 6)]
+    parens_brackets = (re.compile(r"[\]\[\(\)\{\}\<\>]"), r" \g<0> ")
+    double_dashes = (re.compile(r"--"), r" -- ")
+    ending_quotes = [
+        (re.compile("([»”’])", re.U), r" \1 "),
+        (re.compile(r"''"), " '' "),
+        (re.compile(r'"'), " '' "),
+        (re.compile(r"\s+"), " "),
+        (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r"\1 \2 "),
+        (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r"\1 \2 "),
+    ]
+    # CONTRACTIONS2 (merged into a single rule) and CONTRACTIONS3, applied to the whole text at the end, if it has any of
+    # the contractions
+    contractions = [
+        re.compile(r"(?i)\b(?:(can)(not)\b|(d)('ye)\b|(gim)(me)\b|(gon)(na)\b|(got)(ta)\b|(lem)(me)\b|(more)('n)\b|(wan)(na)(?!\S))"),
+        re.compile(r"(?i)(?<!\S)('t)(is)\b"),
+        re.compile(r"(?i)(?<!\S)('t)(was)\b"),
+    ]
+    contraction_words = ("cannot", "d'ye", "gimme", "gonna", "gotta", "lemme", "more'n", "wanna", "'tis", "'twas")
+    non_ascii = re.compile(r"[^\x00-\x7f]")
+
+    # what may follow the last period of a sentence, for it to still be split off (closing brackets and quotes)
+    closing_chunks = re.compile(r"(?:[\]\)}>»”’'\"]| (?!''|\"))*\s*\Z")
+    next_character = re.compile(r"\s*(\S)")
+    number = re.compile(r"-?[\.,]?\d[\d,\.-]*\.?")
+    # abbreviations a period is part of, instead of ending a sentence (along with initials, and words such as U.S.)
+    abbreviations = {"mr", "mrs", "ms", "messrs", "dr", "prof", "st", "jr", "sr", "gov", "sen", "rep", "gen", "col", "lt",
+                     "inc", "corp", "co", "cos", "ltd", "bros", "vs", "jan", "feb", "aug", "sept", "oct", "nov", "dec",
+                     "calif", "conn", "fla", "mich", "minn", "pa", "va", "ariz", "colo", "ga", "md", "tenn", "okla"}
+
+    def __init__(self, regex=False, cache_size=2 ** 18):
+        """
+        Split text into tokens, either with nltk's word_tokenize(), or with compiled regular expressions doing the same.
+
+        nltk is only imported the first time it's needed: it takes a while to import, and word_tokenize() needs the
+        punkt data to split text into sentences, before each sentence goes through the Treebank rules.
+
+        The regular expressions apply the same Treebank rules, but not to the whole text at once. Tokens never span
+        whitespace, so the text is cut into chunks between whitespaces. Most chunks are words, numbers, or words
+        followed by a comma, which are left as they are (but for the comma, brackets, ... split off), without leaving
+        the regular expression engine. Only the chunks with quotes or punctuation whose tokens depend on what's around
+        them go through the rules one by one, along with all the rules can see of the text around them: the whitespace
+        around them, and whether they end a sentence. The same chunks come up over and over in a corpus, so their tokens
+        are memoized, in a least recently used cache of at most cache_size chunks.
+        A sentence comes out the exact same as with nltk's NLTKWordTokenizer (see tokenize_sentence()). Sentences are
+        split the way punkt mostly does: after a question or exclamation mark, or after a period that doesn't end an
+        abbreviation, an initial, or a number followed by a lowercase word. punkt learned its abbreviations, and which
+        words start sentences, from a corpus, so a few periods are split off differently than by word_tokenize():
+            - after an abbreviation that isn't in the list below, such as "approx.", which is split off.
+            - after an abbreviation or an initial that does end a sentence, which is left attached.
+            - after a word (but a number) followed by a lowercase word, which punkt may not take for a sentence end.
+
+        :param regex: tokenize with the regular expressions by default, instead of word_tokenize() (see tokenize()).
+        :param cache_size: maximum number of chunks memoized.
+        """
+        self.regex = regex
+        self.word_tokenize = None
+        self.transform_chunk = lru_cache(maxsize=cache_size)(self.transform_chunk)
+
+    def tokenize(self, text):
+        """
+        :param text: the text.
+        :return: list of tokens of the text, with the regular expressions if self.regex is set, or with word_tokenize().
+        """
+        return self.tokenize_with_regex(text) if self.regex else self.tokenize_with_nltk(text)
+
+    def tokenize_with_nltk(self, text):
+        """
+        :param text: the text.
+        :return: list of tokens of the text, split by nltk's word_tokenize().
+        """
+        if self.word_tokenize is None:
+            from nltk.tokenize import word_tokenize
+            self.word_tokenize = word_tokenize
+        return self.word_tokenize(text)
+
+    def tokenize_with_regex(self, text):
+        """
+        :param text: the text.
+        :return: list of tokens of the text, split into sentences, like word_tokenize() would.
+        """
+        return self.transform(text, split_sentences=True).split()
+
+    def tokenize_sentence(self, text):
+        """
+        :param text: the text, as a single sentence.
+        :return: list of tokens of the text, like nltk's NLTKWordTokenizer().tokenize() (or word_tokenize() with
+                 preserve_line) would.
+        """
+        return self.transform(text, split_sentences=False).split()
+
+    def transform(self, text, split_sentences):
+        """
+        :param text: the text.
+        :param split_sentences: split the text into sentences, and the period at the end of each one of them off?
+        :return: the text, with whitespace between every token.
+        """
+        # end of the last chunk that ended a sentence, as long as no other special chunk came after it
+        sentence_end = None
+
+        def transform_match(match):
+            nonlocal sentence_end
+            chunk = match.group()
+
+            # the whitespace around the chunk only matters to some of the rules, so it's left out of the memoized chunk
+            # otherwise
+            lead = trail = " "
+            if chunk[0] in "\"'.":
+                start = match.start()
+                if start == 0 or (sentence_end is not None and text[sentence_end:start].isspace()):
+                    lead = ""
+                elif text[start - 1] != " ":
+                    lead = "\n"
+            if chunk[-1] == "'":
+                end = match.end()
+                trail = "" if end == len(text) else " " if text[end] == " " else "\n"
+            sentence_end = None
+
+            final = False
+            core = chunk.rstrip("\"')]}>»”’")
+            if core.endswith((".", "?", "!")):
+                end = match.end()
+                final = self.closing_chunks.match(text, end) is not None
+                if split_sentences and not final and self.ends_sentence(core, self.next_character.match(text, end).group(1)):
+                    final = True
+                    trail = ""
+                    sentence_end = end
+            return self.transform_chunk(lead, chunk, trail, final)
+
+        text = self.special_chunk.sub(transform_match, text)
+        text = self.final_colon.sub(" : ", self.final_comma.sub(" , ", text))
+        for character in self.separated_characters:
+            if character in text:
+                text = text.replace(character, " %s " % character)
+
+        # letters of other alphabets may match the contractions regardless of case, without their lowercase doing so
+        if self.non_ascii.search(text) or any(word in text.lower() for word in self.contraction_words):
+            for regexp in self.contractions:
+                text = regexp.sub(self.split_contraction, text)
+        return text
+
+    @staticmethod
+    def split_contraction(match):
+        """
+        :param match: match of a contraction.
+        :return: its two parts, with whitespace around them.
+        """
+        return " %s %s " % tuple(part for part in match.groups() if part)
+
+    def transform_chunk(self, lead, chunk, trail, final):
+        """
+        Go through the Treebank rules, but the contractions, on a single chunk.
+        :param lead: the whitespace before the chunk (a space, or a newline standing for any other), or nothing if the
+                     chunk starts a sentence.
+        :param chunk: the chunk, without whitespace.
+        :param trail: the whitespace after the chunk (a space, or a newline standing for any other), or nothing if the
+                      chunk ends the text, or a sentence.
+        :param final: is it the last chunk of its sentence (but the closing brackets and quotes)?
+        :return: the chunk, with whitespace between its tokens.
+        """
+        text = lead + chunk + trail
+        for regexp, substitution in self.starting_quotes:
+            text = regexp.sub(substitution, text)
+        for regexp, substitution in self.final_punctuation if final else self.punctuation:
+            text = regexp.sub(substitution, text)
+        for regexp, substitution in (self.parens_brackets, self.double_dashes):
+            text = regexp.sub(substitution, text)
+        text = " " + text + " "
+        for regexp, substitution in self.ending_quotes:
+            text = regexp.sub(substitution, text)
+        return text
+
+    def ends_sentence(self, core, next_character):
+        """
+        :param core: the chunk, followed by another one, without its closing brackets and quotes.
+        :param next_character: first character of the next chunk.
+        :return: True if a sentence ends with the chunk.
+        """
+        if core.endswith(("?", "!")):
+            return True
+        if not core.endswith(".") or core.endswith(".."):
+            return False
+
+        word = core[:-1].lstrip("(\"`{[:;&#*@)}]-,").lower()
+        if self.number.fullmatch(word):
+            return not next_character.islower()
+        if word in self.abbreviations or word.rsplit("-", 1)[-1] in self.abbreviations:
+            return False
+        if len(word) == 1 and word.isalpha() or "." in word and word.replace(".", "").isalpha():
+            return False
+        return True
@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+
+class VariableByte:
+    """
+    Variable byte encoding of non-negative integers.
+
+    A number is split into 7-bit chunks, most significant first, each stored in its own byte. The high bit of a byte is
+    set only on the last byte of a number, which is how we know where one number ends and the next one starts.
+    For example, 5 is encoded as 10000101, and 214577 as 00001101 00001100 10110001.
+
+    This information has been taken from the textbook:
+        - An Introduction to Information Retrieval (section 5.3.1), by:
+            Christopher D. Manning, Prabhakar Raghavan, and Hinrich Schütze
+    """
+
+    @staticmethod
+    def encode_number(number):
+        """
+        Encode a single number.
+        :param number: non-negative integer.
+        :return: bytes representing the number.
+        """
+        encoded = [number & 127 | 128]
+        number >>= 7
+        while number:
+            encoded.append(number & 127)
+            number >>= 7
+        encoded.reverse()
+        return bytes(encoded)
+
+    @staticmethod
+    def encode(numbers):
+        """
+        Encode a list of numbers, one after the other.
+        :param numbers: list of non-negative integers.
+        :return: bytes representing the numbers.
+        """
+        encode_number = VariableByte.encode_number
+        return b"".join([encode_number(number) for number in numbers])
+
+    @staticmethod
+    def decode(data, start=0, end=None, count=None):
+        """
+        Decode the numbers found in a sequence of bytes.
+        :param data: bytes-like object containing variable byte encoded numbers.
+        :param start: offset of the first byte to decode.
+        :param end: offset right after the last byte to decode (defaults to the end of data).
+        :param count: maximum number of numbers to decode (defaults to all of them).
+        :return: list of decoded numbers.
+        """
+        numbers = []
+        append = numbers.append
+        number = 0
+        for byte in data[start:end]:
+            if byte < 128:
+                number = (number << 7) | byte
+            else:
+                append((number << 7) | (byte & 127))
+                number = 0
+                if len(numbers) == count:
+                    break
+        return numbers
+
+    @staticmethod
+    def decode_number(data, offset=0):
+        """
+        Decode a single number from a sequence of bytes.
+        :param data: bytes-like object containing variable byte encoded numbers.
+        :param offset: offset of the first byte of the number.
+        :return: tuple of (decoded number, offset of the byte right after the number).
+        """
+        number = 0
+        byte = data[offset]
+        while byte < 128:
+            number = (number << 7) | byte
+            offset += 1
+            byte = data[offset]
+        return (number << 7) | (byte & 127), offset + 1
+
+    @staticmethod
+    def read_number(stream):
+        """
+        Read a single number from a binary stream.
+        :param stream: file opened in binary mode.
+        :return: decoded number, or None if the end of the stream was reached.
+        """
+        number = 0
+        byte = stream.read(1)
+        if not byte:
+            return None
+        while byte[0] < 128:
+            number = (number << 7) | byte[0]
+            byte = stream.read(1)
+        return (number << 7) | (byte[0] & 127)
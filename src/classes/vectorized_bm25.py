@@ -0,0 +1,159 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import numpy as np
+
+from definitions import normalizer
+from classes.bm25 import BM25
+from classes.lru_cache import LRUCache
+
+
+class VectorizedBM25(BM25):
+
+    # arrays of a term that hasn't been converted (None means that it isn't in the index)
+    unknown = object()
+
+    def __init__(self, reuters, index, n, k1=0.5, b=0.5, cache_size=256):
+        """
+        Okapi BM25 ranking function, computed with NumPy arrays instead of one document at a time (see BM25).
+
+        Document lengths are kept in a dense array indexed by document ID, and the postings of every term that is
+        looked up are converted into two arrays: its document IDs and its term frequencies. The arrays of the cache_size
+        terms looked up the most recently are kept (see LRUCache). The score of a term in
+        all of the documents it appears in is then computed with a handful of array operations, which run in compiled
+        code instead of the Python interpreter.
+
+        Scores are computed with the same operations, in the same order, as BM25.compute_bm25(), so they're the same
+        (down to floating point rounding). Documents with the same score are ranked by document ID, like
+        BM25.get_ranking() and BM25.top_k() do.
+
+        :param reuters: Reuters object which will contain relevant information such as document length, average length.
+        :param index: dictionary with terms as keys, and their postings list as values.
+        :param n: Number of documents in the collection.
+        :param k1: Positive parameter used to scale the document frequency scaling.
+        :param b: 0 ≤ b ≤ 1. Used to determine the scaling by document length.
+        :param cache_size: maximum number of terms whose arrays are kept.
+        """
+        BM25.__init__(self, reuters, index, n, k1, b)
+
+        if isinstance(self.document_lengths, dict):
+            self.lengths = np.zeros(max(self.document_lengths, default=0) + 1)
+            self.lengths[list(self.document_lengths)] = list(self.document_lengths.values())
+        else:
+            # already indexed by document ID (see DocumentStatistics)
+            self.lengths = np.array(self.document_lengths, dtype=np.float64)
+
+        # postings converted the most recently (term -> tuple of (array of document IDs, array of term frequencies))
+        self.postings_arrays = LRUCache(cache_size)
+
+    def get_postings_arrays(self, term):
+        """
+        Get the postings of a term as arrays.
+        :param term: the term (it's stemmed before being looked up, like in compute_bm25()).
+        :return: tuple of (array of document IDs, array of term frequencies), or None if the term isn't in the index.
+        """
+        key = normalizer.stem(term)
+        postings_arrays = self.postings_arrays.get(key, self.unknown)
+        if postings_arrays is self.unknown:
+            try:
+                postings_list = self.index[key]
+            except KeyError:
+                postings_list = None
+            postings_arrays = None
+            if postings_list:
+                postings = np.array(postings_list, dtype=np.int64)
+                postings_arrays = postings[:, 0], postings[:, 1].astype(np.float64)
+            self.postings_arrays.put(key, postings_arrays)
+        return postings_arrays
+
+    def compute_term_scores(self, term):
+        """
+        Compute the score of a term in every document it appears in.
+        :param term: the term.
+        :return: tuple of (array of document IDs, array of scores), or None if the term isn't in the index.
+        """
+        postings = self.get_postings_arrays(term)
+        if postings is None:
+            return None
+        document_ids, term_frequencies = postings
+
+        numerators = (self.K1 + 1) * term_frequencies
+        denominators = self.K1 * ((1 - self.B) + self.B * (self.lengths[document_ids] / self.L_ave)) + term_frequencies
+        return document_ids, self.compute_idf_weight(term) * numerators / denominators
+
+    def compute_scores(self, terms, term_scores=None):
+        """
+        Add up the scores of the terms of a query, in every document.
+        :param terms: stemmed terms of the query (see get_query_terms()).
+        :param term_scores: dictionary of term -> scores (see compute_term_scores()) computed so far, shared between
+                            queries.
+        :return: tuple of (array of the scores of all documents, boolean array of documents that contain a term).
+        """
+        if term_scores is None:
+            term_scores = {}
+
+        scores = np.zeros(len(self.lengths))
+        matches = np.zeros(len(self.lengths), dtype=bool)
+        for term in terms:
+            if term not in term_scores:
+                term_scores[term] = self.compute_term_scores(term)
+            if term_scores[term] is not None:
+                document_ids, document_scores = term_scores[term]
+                scores[document_ids] += document_scores
+                matches[document_ids] = True
+
+        return scores, matches
+
+    @staticmethod
+    def rank(scores, matches, k=None):
+        """
+        Rank the documents that contain a term of the query.
+        :param scores: array of the scores of all documents.
+        :param matches: boolean array of documents that contain a term of the query.
+        :param k: number of documents to return, or None to return all of them.
+        :return: list of tuples of (document ID, score), sorted by decreasing score, then by document ID.
+        """
+        if k is not None and k <= 0:
+            return []
+
+        document_ids = np.flatnonzero(matches)
+        document_scores = scores[document_ids]
+        if k is not None and k < len(document_ids):
+            """
+            Only sort the k best documents, along with every document tied with the k-th one, so that ties are still
+            broken by document ID.
+            """
+            kth_score = np.partition(document_scores, len(document_scores) - k)[len(document_scores) - k]
+            best = document_scores >= kth_score
+            document_ids, document_scores = document_ids[best], document_scores[best]
+
+        order = np.lexsort((document_ids, -document_scores))[:k]
+        return list(zip(document_ids[order].tolist(), document_scores[order].tolist()))
+
+    def get_ranking(self, query):
+        """
+        Compute the Okapi BM25 ranking formula to rank retrieved documents by relevance, with array operations.
+        :param query: query to be conducted, or the list of its terms (see BM25.get_query_terms()).
+        :return: list of tuples of (document ID, score), sorted by decreasing score, then by document ID.
+        """
+        return self.rank(*self.compute_scores(self.get_query_terms(query)))
+
+    def top_k(self, query, k=10):
+        """
+        Get the k best ranked documents of a query. Every document is scored, but only the best ones are sorted.
+        :param query: query to be conducted, or the list of its terms (see BM25.get_query_terms()).
+        :param k: number of documents to return.
+        :return: list of at most k tuples of (document ID, score), sorted by decreasing score, then by document ID.
+        """
+        return self.rank(*self.compute_scores(self.get_query_terms(query)), k=k)
+
+    def compute_bm25_batch(self, queries, k=None):
+        """
+        Rank the documents of a whole batch of queries at once, e.g. for an offline evaluation.
+        The scores of a term are only computed once for the whole batch, no matter how many queries it appears in.
+        :param queries: list of queries.
+        :param k: number of documents to return per query, or None to return all of them.
+        :return: list of rankings (see rank()), one per query, in the same order as the queries.
+        """
+        term_scores = {}
+        return [self.rank(*self.compute_scores(self.get_query_terms(query), term_scores), k=k) for query in queries]
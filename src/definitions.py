@@ -2,13 +2,35 @@
 # coding: utf-8
 
 import os
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
+
+from classes.tokenizer import Tokenizer
+from classes.normalizer import Normalizer
 
 THIS_DIR = os.path.dirname(os.path.realpath(__file__))
 ROOT_DIR = os.path.dirname(os.path.realpath(THIS_DIR))
 
-word_tokenize = word_tokenize
-stopwords = set(stopwords.words("english"))
-ps = PorterStemmer()
+
+def load_stemmer():
+    """
+    :return: nltk's PorterStemmer.
+    """
+    from nltk.stem import PorterStemmer
+    return PorterStemmer()
+
+
+def load_stopwords():
+    """
+    :return: set of nltk's English stopwords.
+    """
+    from nltk.corpus import stopwords
+    return set(stopwords.words("english"))
+
+
+"""
+nltk takes a while to import, and its corpora have to be on disk, so it's only imported once a term is actually
+tokenized by word_tokenize(), stemmed, or checked against the stopwords (see Tokenizer and Normalizer), which queries on
+an index that was already constructed may never do.
+"""
+tokenizer = Tokenizer()
+word_tokenize = tokenizer.tokenize
+normalizer = Normalizer(load_stemmer, load_stopwords)
@@ -1,58 +1,141 @@
 #! /usr/bin/env python3
 # coding: utf-8
 
-from definitions import ps
 from classes.reuters import Reuters
 from classes.spimi import SPIMI
-from classes.query import Query, AndQuery, OrQuery
-from classes.compression_table import CompressionTable
+from classes.query import Query
+from classes.compression_table import CompressionTable, IndexSizeTable
 from classes.bm25 import BM25
+from classes.compaction import Compaction
+from classes.query_cache import QueryCache
+from classes.batch_query import BatchQuery
+from classes.profiler import Profiler
+from definitions import normalizer, tokenizer
 
+import sys
 import argparse
 
 
-def stem_index(index):
+def memory_size(value):
     """
-    We will use this method to convert all index keys to lowercase, which will produce more consistent results when we
-    conduct queries.
-    Note: This is only used for the queries. The index that appears in the index.txt file hasn't been modified.
+    Convert a human readable memory size to a number of bytes, to be used as an argparse type.
+    :param value: memory size, such as "256MB", "1.5GB", "512KB", or a plain number of bytes.
+    :return: number of bytes.
+    """
+    units = {"B": 1, "KB": 2 ** 10, "MB": 2 ** 20, "GB": 2 ** 30}
+    value = value.strip().upper()
+    unit = "B"
+    for suffix in sorted(units, key=len, reverse=True):
+        if value.endswith(suffix):
+            value, unit = value[:-len(suffix)], suffix
+            break
+    try:
+        size = int(float(value) * units[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid memory size, try something like 256MB")
+    if size <= 0:
+        raise argparse.ArgumentTypeError("memory size must be positive")
+    return size
 
-    :param index: dictionary containing terms and the postings in which they appear.
 
-    :return: index with all keys stemmed, making sure the postings combine as well. For example:
-    {'hello': [1, 2], 'Hello': [1, 3], 'HELLO': [2, 3, 5]} would return a dictionary of: {'hello': [1, 2, 3, 5]}.
+def fan_in(value):
+    """
+    Check the number of files merged at once, to be used as an argparse type. Merging fewer than 2 files at once would
+    never reduce the number of files left to merge.
+    :param value: number of files.
+    :return: number of files.
     """
-    new_index = {}
-    for k, v in index.items():
-        if ps.stem(k) not in new_index.keys():
-            new_index[ps.stem(k)] = index[k]
-        else:
-            new_index[ps.stem(k)] = new_index[ps.stem(k)] + index[k]
+    try:
+        number_of_files = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid fan-in, try something like 128")
+    if number_of_files < 2:
+        raise argparse.ArgumentTypeError("fan-in must be at least 2")
+    return number_of_files
 
-    return new_index
+
+def write_profile(profiler, profile_file):
+    """
+    Stop profiling, print the profile, and write it as JSON (see Profiler.write_report()).
+    :param profiler: the Profiler.
+    :param profile_file: path of the JSON file.
+    """
+    profiler.stop()
+    profiler.print_report()
+    profiler.write_report(profile_file)
+    print("Profile written to %s." % profile_file)
 
 
 parser = argparse.ArgumentParser(description="Configure Reuters parser and set document limit per block.")
 
 parser.add_argument("-d", "--docs", type=int, help="documents per block", default=500)
+parser.add_argument("-bm", "--block-memory", type=memory_size, help="memory budget of a block, e.g. 256MB (overrides -d)", default=None)
+parser.add_argument("-f", "--fan-in", type=fan_in, help="maximum number of files merged at once", default=128)
+parser.add_argument("-mw", "--merge-workers", type=int, help="number of processes merging block files", default=1)
+parser.add_argument("-tb", "--text-blocks", action="store_true", help="write block files as text (for debugging)", default=False)
+parser.add_argument("-pc", "--postings-codec", help="encoding of the postings in the index file", choices=["vb", "gamma"], default="vb")
 parser.add_argument("-r", "--reuters", type=int, help="number of Reuters files to parse, choice from 1 to 22", choices=range(1, 23), default=22)
 parser.add_argument("-rs", "--remove-stopwords", action="store_true", help="remove stopwords", default=False)
 parser.add_argument("-s", "--stem", action="store_true", help="stem terms", default=False)
 parser.add_argument("-c", "--case-folding", action="store_true", help="use case folding", default=False)
 parser.add_argument("-rn", "--remove-numbers", action="store_true", help="remove numbers", default=False)
+parser.add_argument("-rt", "--regex-tokenizer", action="store_true", help="tokenize with regular expressions instead of nltk", default=False)
+parser.add_argument("-ap", "--append", action="store_true", help="extend an index of some of the Reuters files with the others", default=False)
+parser.add_argument("-cp", "--compact", action="store_true", help="merge segments of the index in the background", default=False)
+parser.add_argument("-mf", "--merge-factor", type=int, help="number of segments of a tier merged together", default=4)
+parser.add_argument("-w", "--workers", type=int, help="number of processes parsing Reuters files", default=1)
+parser.add_argument("-k", "--top-k", type=int, help="only rank the k best documents with BM25", default=None)
+parser.add_argument("-qc", "--query-cache", type=int, help="number of query results kept", default=1024)
+parser.add_argument("-vs", "--vectorized-scoring", action="store_true", help="compute BM25 with NumPy arrays", default=False)
+parser.add_argument("-bq", "--batch", help="file of queries (one per line) to run without prompts, - for stdin", default=None)
+parser.add_argument("-qt", "--query-type", help="type of the batch queries", choices=["and", "or", "bm25"], default="bm25")
+parser.add_argument("-o", "--output", help="file in which batch results are written (defaults to stdout)", default=None)
+parser.add_argument("-of", "--output-format", help="format of the batch results", choices=["tsv", "json"], default="tsv")
+parser.add_argument("-th", "--threads", type=int, help="number of threads running batch queries", default=1)
+parser.add_argument("-sv", "--serve", action="store_true", help="serve queries over HTTP instead of prompting", default=False)
+parser.add_argument("-ho", "--host", help="address the query server listens on", default="127.0.0.1")
+parser.add_argument("-p", "--port", type=int, help="port the query server listens on", default=8080)
+parser.add_argument("-us", "--unix-socket", help="Unix socket the query server listens on instead of a port", default=None)
+parser.add_argument("-sw", "--server-workers", type=int, help="number of processes running queries for the server (0 for threads)", default=0)
+parser.add_argument("-to", "--timeout", type=float, help="time in seconds after which a query of the server is given up on", default=5)
+parser.add_argument("-pf", "--profile", help="JSON file in which a profile of every phase is written", default=None)
+parser.add_argument("-ph", "--profile-hooks", nargs="+", help="also profile functions (cProfile) or memory (tracemalloc)", choices=["cprofile", "tracemalloc"], default=[])
 parser.add_argument("-a", "--all", action="store_true", help="use all compression techniques", default=False)
 
-args = parser.parse_args()
-
 
 if __name__ == '__main__':
 
+    args = parser.parse_args()
+
     if args.all:
         args.remove_stopwords = True
         args.stem = True
         args.case_folding = True
         args.remove_numbers = True
 
+    """
+    In batch mode, results are written to the standard output (unless an output file is given), so everything else is
+    printed to the standard error, and results can be piped into another program.
+    """
+    results_output = sys.stdout
+    if args.batch:
+        sys.stdout = sys.stderr
+
+    """
+    When profiling, the time and resources spent in every phase (and in the stages repeated within them) are recorded,
+    and written to a JSON report at the end.
+    """
+    profiler = Profiler(enabled=args.profile is not None, cprofile="cprofile" in args.profile_hooks,
+                        trace_memory="tracemalloc" in args.profile_hooks)
+    profiler.start()
+
+    """
+    Documents and queries are tokenized by nltk's word_tokenize(), or by regular expressions doing the same, a lot faster
+    (see Tokenizer). Both have to be tokenized the same way, so an index constructed with one is never reused with the
+    other.
+    """
+    tokenizer.regex = args.regex_tokenizer
+
     """
     Upon initialization, downloads Reuters files if they're not downloaded, and stores them in a list.
     """
@@ -62,31 +145,108 @@ if __name__ == '__main__':
         remove_stopwords=args.remove_stopwords,
         stem=args.stem,
         case_folding=args.case_folding,
-        remove_numbers=args.remove_numbers
+        remove_numbers=args.remove_numbers,
+        workers=args.workers,
+        profiler=profiler,
+        regex_tokenizer=args.regex_tokenizer
     )
 
     """
-    Upon initialization, makes the Reuters object tokenize the files mentioned above, and stores them in a variable.
-    Also creates the output directory if it hasn't been initialized.
+    Upon initialization, creates the output directory if it hasn't been initialized.
+    The Reuters object tokenizes the files mentioned above while the index is being constructed.
+    If an index was already constructed in the output directory, it's reused instead.
+    When appending, an index constructed out of fewer Reuters files is extended with a segment containing the others.
     """
-    spimi = SPIMI(reuters=reuters)
+    spimi = SPIMI(reuters=reuters, block_memory=args.block_memory, merge_fan_in=args.fan_in, text_blocks=args.text_blocks,
+                  postings_codec=args.postings_codec, merge_workers=args.merge_workers, append=args.append,
+                  profiler=profiler)
 
-    index = spimi.construct_index()
+    with profiler.phase("construct_index"):
+        index = spimi.construct_index()
 
     if args.remove_stopwords or args.stem or args.case_folding or args.remove_numbers:
         print("Your index has already been compressed, will use that as unfiltered.")
 
-    table = CompressionTable(index)
-    print(table.generate_table())
-    print()
+    if not args.batch and not args.serve:
+        table = CompressionTable(index)
+        print(table.generate_table())
+        print()
+
+    if spimi.index_statistics:
+        table = IndexSizeTable(spimi.index_statistics)
+        print(table.generate_table())
+        print()
+
+    """
+    Hit rates of the caches of the normalizer, which every term went through while the index was being constructed.
+    With more than one worker, terms are normalized in the worker processes, whose caches aren't reported here.
+    """
+    normalizer.print_statistics()
+
+    """
+    Segments are merged in a background thread, while queries keep running against the segments they opened. The query
+    cache (see below) opens the merged segments once they've replaced the old ones.
+    """
+    compaction = None
+    if args.compact:
+        compaction = Compaction(spimi, merge_factor=args.merge_factor)
+        compaction.start()
 
     """
     Stemming every term in the index so that it's easy to compare them in queries.
     Queries will also be stemmed.
     Google, for example, uses this technique in their search engine.
+
+    Queries go through a cache of the results of the most recent queries, which opens the index again whenever its
+    segments change (e.g. once they've been merged).
+    Document lengths are loaded from the statistics stored with the index, so they're available even when the index was
+    reused, and the Reuters files weren't parsed.
     """
-    if not args.stem:
-        index = stem_index(index)
+    with profiler.phase("open index"):
+        query_cache = QueryCache(spimi, stemmed=args.stem, cache_size=args.query_cache, vectorized=args.vectorized_scoring,
+                                 profiler=profiler)
+
+    """
+    Run a whole batch of queries, write their results, and report the throughput and latency, instead of prompting.
+    """
+    if args.batch:
+        batch_query = BatchQuery(query_cache, query_type=args.query_type, k=args.top_k or 10, threads=args.threads)
+        queries = BatchQuery.read_queries(args.batch)
+        with profiler.phase("batch queries") as counters:
+            results = batch_query.run(queries)
+            counters["queries"] = len(queries)
+
+        if args.output:
+            results_output = open(args.output, "w", encoding="utf-8")
+        batch_query.write_results(results_output, queries, results, args.output_format)
+        results_output.flush()
+        if args.output:
+            results_output.close()
+
+        batch_query.print_statistics()
+        query_cache.print_statistics()
+        if compaction:
+            compaction.thread.join()
+        if args.profile:
+            write_profile(profiler, args.profile)
+        sys.exit()
+
+    """
+    Serve queries over HTTP, with the index opened once, until the server is interrupted (Ctrl+C).
+    """
+    if args.serve:
+        # asyncio is only imported by the server
+        from classes.query_server import QueryServer
+
+        server = QueryServer(query_cache, host=args.host, port=args.port, unix_socket=args.unix_socket,
+                             workers=args.server_workers, threads=args.threads, timeout=args.timeout, k=args.top_k or 10)
+        server.run()
+        query_cache.print_statistics()
+        if compaction:
+            compaction.thread.join()
+        if args.profile:
+            write_profile(profiler, args.profile)
+        sys.exit()
 
     """
     Allow user to conduct queries.
@@ -99,17 +259,9 @@ if __name__ == '__main__':
         if user_input == "":
             break
         elif user_input.lower() in ["and", "or"]:
-            and_query = AndQuery(index)
-            or_query = OrQuery(index)
             user_query = Query.ask_user()
-            if user_input.lower() == "and":
-                and_query.execute(user_query)
-                and_query.print_results()
-            elif user_input.lower() == "or":
-                or_query.execute(user_query)
-                or_query.print_results()
-
-    bm25 = BM25(reuters=reuters, index=index, n=reuters.number_of_documents)
+            query_cache.get_query(user_input.lower(), user_query).print_results()
+
     while True:
         choices = {"y": True, "n": False}
         user_input = input("Would you like to experiment with the Okapi BM25 ranking function? [y/n] ")
@@ -117,6 +269,19 @@ if __name__ == '__main__':
             pass
         elif choices[user_input.lower()]:
             user_query = Query.ask_user()
-            bm25.compute_bm25(user_query)
+            if args.top_k:
+                BM25.print_top_k(query_cache.execute("bm25", user_query, args.top_k))
+            else:
+                BM25.print_ranking(query_cache.execute("bm25", user_query))
         elif not choices[user_input.lower()]:
             break
+
+    query_cache.print_statistics()
+
+    if compaction:
+        print("Waiting for the segments to be merged...")
+        compaction.thread.join()
+        print("%d merge(s) done." % compaction.merges)
+
+    if args.profile:
+        write_profile(profiler, args.profile)
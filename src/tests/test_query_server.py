@@ -0,0 +1,148 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import io
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+import http.client
+import importlib.util
+from contextlib import redirect_stdout
+from urllib.parse import urlencode
+
+from definitions import tokenizer
+from classes.reuters import Reuters
+from classes.spimi import SPIMI
+from classes.query_cache import QueryCache
+from classes.corpus_generator import CorpusGenerator
+from classes.query_server import QueryServer
+
+
+def has_stopwords():
+    """
+    :return: True if nltk and its stopwords, which BM25 leaves out of queries, are installed.
+    """
+    if not importlib.util.find_spec("nltk"):
+        return False
+    from nltk.data import find
+
+    try:
+        find("corpora/stopwords")
+        return True
+    except LookupError:
+        return False
+
+
+class TestParseQueries(unittest.TestCase):
+
+    def setUp(self):
+        # parsing requests doesn't need an index
+        self.server = QueryServer(None, k=10)
+
+    def parse(self, body):
+        return self.server.parse_queries("POST", {}, json.dumps(body).encode("utf-8"))
+
+    def test_get(self):
+        self.assertEqual(self.server.parse_queries("GET", {"q": ["oil prices"], "type": ["AND"]}, b""),
+                         ("and", ["oil prices"], None))
+        self.assertEqual(self.server.parse_queries("GET", {"q": ["oil"], "k": ["5"]}, b""), ("bm25", ["oil"], 5))
+
+    def test_post(self):
+        self.assertEqual(self.parse({"type": "or", "queries": ["oil", "gold"]}), ("or", ["oil", "gold"], None))
+        self.assertEqual(self.parse({"query": "oil"}), ("bm25", ["oil"], 10))
+
+    def test_invalid_requests(self):
+        for body in [{"queries": 5}, {"queries": "abc"}, {"queries": {"q": "oil"}}, {"queries": ["oil", 3]},
+                     {"query": 5}, {"query": ["oil"]}, {"queries": []}, {"queries": [" "]}, {}, ["oil"],
+                     {"type": "xor", "query": "oil"}, {"query": "oil", "k": "ten"}]:
+            with self.assertRaises(ValueError, msg=json.dumps(body)):
+                self.parse(body)
+        with self.assertRaises(ValueError):
+            self.server.parse_queries("POST", {}, b"{not json")
+
+
+@unittest.skipUnless(has_stopwords(), "nltk or its stopwords aren't installed")
+class TestQueryServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # documents and queries are tokenized with the regular expressions, which don't need nltk's punkt data
+        cls.regex_tokenizer = tokenizer.regex
+        tokenizer.regex = True
+
+        cls.directory = tempfile.mkdtemp()
+        corpus_directory = cls.directory + "/corpus"
+        CorpusGenerator(corpus_directory, 2 ** 17, vocabulary_size=2000, documents_per_file=100).generate()
+        with redirect_stdout(io.StringIO()):
+            cls.spimi = SPIMI(reuters=Reuters(number_of_files=None, reuters_directory=corpus_directory, regex_tokenizer=True),
+                              output_directory=cls.directory + "/index")
+            index = cls.spimi.construct_index()
+            # pairs of the most frequent words, so that AND queries find documents too
+            terms = sorted((term for term in index if term.isalpha()), key=index.get_document_frequency, reverse=True)[:20]
+            index.close()
+            cls.queries = [" ".join(terms[start:start + 2]) for start in range(0, len(terms), 2)]
+
+            cls.server = QueryServer(QueryCache(cls.spimi), port=0, k=5)
+            cls.server.ready = threading.Event()
+            cls.thread = threading.Thread(target=cls.server.run)
+            cls.thread.start()
+            cls.server.ready.wait()
+        cls.query_cache = QueryCache(cls.spimi)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        cls.thread.join()
+        shutil.rmtree(cls.directory)
+        tokenizer.regex = cls.regex_tokenizer
+
+    def request(self, method, target, body=None):
+        """
+        :return: tuple of (HTTP status, response) of a request to the server.
+        """
+        connection = http.client.HTTPConnection(*self.server.address[len("http://"):].rsplit(":", 1), timeout=10)
+        try:
+            connection.request(method, target, json.dumps(body) if body is not None else None)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read().decode("utf-8"))
+        finally:
+            connection.close()
+
+    def test_search(self):
+        for query_type in ["and", "or", "bm25"]:
+            for query in self.queries:
+                status, response = self.request("GET", "/search?" + urlencode({"type": query_type, "q": query}))
+                self.assertEqual(status, 200)
+                expected_results = self.query_cache.execute(query_type, query, 5 if query_type == "bm25" else None)
+                if query_type == "bm25":
+                    expected_results = [list(result) for result in expected_results]
+                self.assertEqual(response["results"], expected_results, "%s %s" % (query_type, query))
+
+    def test_batch(self):
+        status, response = self.request("POST", "/search", {"type": "bm25", "queries": self.queries, "k": 3})
+        self.assertEqual(status, 200)
+        self.assertEqual([result["results"] for result in response["results"]],
+                         [[list(result) for result in self.query_cache.execute("bm25", query, 3)] for query in self.queries])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.request("GET", "/search?type=xor&q=oil")[0], 400)
+        self.assertEqual(self.request("POST", "/search", {"queries": 5})[0], 400)
+        self.assertEqual(self.request("GET", "/nowhere")[0], 404)
+
+    def test_health_and_metrics(self):
+        status, health = self.request("GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(health["status"], "ok")
+        self.assertEqual(health["documents"], self.query_cache.bm25.N)
+
+        self.request("GET", "/search?" + urlencode({"type": "or", "q": self.queries[0]}))
+        status, metrics = self.request("GET", "/metrics")
+        self.assertEqual(status, 200)
+        self.assertGreater(metrics["requests"], 0)
+        self.assertGreater(metrics["queries"]["or"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+from classes.sgml_reader import SGMLReader
+
+# a multi-line TEXT with nested tags and entities, a document without a TEXT tag, and a brief with character references
+# (including one read as Windows-1252), in ISO-8859-1 like the Reuters files
+FIXTURE = ('<!DOCTYPE lewis SYSTEM "lewis.dtd">\n'
+           '<REUTERS TOPICS="YES" LEWISSPLIT="TRAIN" OLDID="5544" NEWID="1">\n'
+           '<DATE>26-FEB-1987 15:01:01.79</DATE>\n'
+           '<TOPICS><D>cocoa</D></TOPICS>\n'
+           '<TEXT>&#2;\n'
+           '<TITLE>BAHIA COCOA REVIEW</TITLE>\n'
+           '<DATELINE>    SALVADOR, Feb 26 - </DATELINE><BODY>Showers continued &lt;throughout&gt; the week\n'
+           'in the Bahia cocoa zone, M&amp;A of Z\xfcrich said.\n'
+           ' Reuter\n'
+           '&#3;</BODY></TEXT>\n'
+           '</REUTERS>\n'
+           '<REUTERS TOPICS="NO" OLDID="5545" NEWID="2">\n'
+           '<DATE>26-FEB-1987 15:02:20.00</DATE>\n'
+           '<UNKNOWN>no text here</UNKNOWN>\n'
+           '</REUTERS>\n'
+           '<REUTERS TOPICS="NO" OLDID="5546" NEWID="3">\n'
+           '<TEXT TYPE="BRIEF">&#2;<TITLE>A&amp;P &lt;GAP&gt; SAYS PROFIT &#150; UP 5&#37;</TITLE>&#3;</TEXT>\n'
+           '</REUTERS>\n')
+
+EXPECTED_DOCUMENTS = [
+    (1, "\x02\nBAHIA COCOA REVIEW\n    SALVADOR, Feb 26 - Showers continued <throughout> the week\n"
+        "in the Bahia cocoa zone, M&A of Zürich said.\n Reuter\n\x03"),
+    (2, ""),
+    (3, "\x02A&P <GAP> SAYS PROFIT – UP 5%\x03"),
+]
+
+
+def read_with_beautiful_soup(file):
+    """
+    Read the documents of a reuters file the way Reuters.parse_file() used to, with BeautifulSoup.
+    :param file: path of the reuters file.
+    :return: list of tuples of (document ID, text), with an empty text for documents without a TEXT tag.
+    """
+    from bs4 import BeautifulSoup
+
+    with open(file, encoding="ISO-8859-1") as sgm_file:
+        soup = BeautifulSoup(sgm_file, "html.parser")
+    return [(int(document['newid']), document.find("text").text if document.find("text") else "")
+            for document in soup.find_all("reuters")]
+
+
+class TestSGMLReader(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file = os.path.join(self.directory, "reut2-000.sgm")
+        with open(self.file, "w", encoding="ISO-8859-1") as sgm_file:
+            sgm_file.write(FIXTURE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_documents(self):
+        self.assertEqual(list(SGMLReader(self.file)), EXPECTED_DOCUMENTS)
+
+    def test_documents_across_chunks(self):
+        # documents, tags and entities cut in the middle by the chunks read from the file
+        for chunk_size in [1, 7, 64]:
+            reader = SGMLReader(self.file)
+            reader.chunk_size = chunk_size
+            self.assertEqual(list(reader), EXPECTED_DOCUMENTS, "chunks of %d characters" % chunk_size)
+
+    @unittest.skipUnless(importlib.util.find_spec("bs4"), "bs4 isn't installed")
+    def test_same_as_beautiful_soup(self):
+        self.assertEqual(list(SGMLReader(self.file)), read_with_beautiful_soup(self.file))
+
+
+if __name__ == '__main__':
+    unittest.main()
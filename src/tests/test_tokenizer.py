@@ -0,0 +1,126 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import unittest
+import importlib.util
+
+from classes.tokenizer import Tokenizer
+
+# sentences and the tokens nltk's NLTKWordTokenizer splits them into
+SENTENCES = [
+    ('He said, "The deal is off." Then he left.',
+     ["He", "said", ",", "``", "The", "deal", "is", "off.", "''", "Then", "he", "left", "."]),
+    ("'Tis the season, isn't it? 'Quoted' words and ``backticks'' too.",
+     ["'", "Tis", "the", "season", ",", "is", "n't", "it", "?", "'", "Quoted", "'", "words", "and", "``", "backticks",
+      "''", "too", "."]),
+    ("I can't, won't, and shouldn't. They'll say we're gonna and wanna, but I cannot. Gimme more'n that!",
+     ["I", "ca", "n't", ",", "wo", "n't", ",", "and", "shouldn't.", "They", "'ll", "say", "we", "'re", "gon", "na", "and",
+      "wan", "na", ",", "but", "I", "can", "not", ".", "Gim", "me", "more", "'n", "that", "!"]),
+    ("Prices rose... then fell... and rose again...",
+     ["Prices", "rose", "...", "then", "fell", "...", "and", "rose", "again", "..."]),
+    ("The market -- which was closed -- re-opened at 10:30 on Monday.",
+     ["The", "market", "--", "which", "was", "closed", "--", "re-opened", "at", "10:30", "on", "Monday", "."]),
+    ('The stock fell--sharply--on Monday, then "recovered."',
+     ["The", "stock", "fell", "--", "sharply", "--", "on", "Monday", ",", "then", "``", "recovered", ".", "''"]),
+    ("Shares rose 1,234.56 dlrs, or 3.5%, to 12,000; profit was 4.5 mln vs 3.2 mln.",
+     ["Shares", "rose", "1,234.56", "dlrs", ",", "or", "3.5", "%", ",", "to", "12,000", ";", "profit", "was", "4.5", "mln",
+      "vs", "3.2", "mln", "."]),
+    ("The ratio was 2:1, up from 1:1.",
+     ["The", "ratio", "was", "2:1", ",", "up", "from", "1:1", "."]),
+    ("It closed at $42.50.",
+     ["It", "closed", "at", "$", "42.50", "."]),
+    ("Visit http://www.reuters.com/news?id=1,2 or https://example.org/a.b/c. Mail info@example.com today.",
+     ["Visit", "http", ":", "//www.reuters.com/news", "?", "id=1,2", "or", "https", ":", "//example.org/a.b/c.", "Mail",
+      "info", "@", "example.com", "today", "."]),
+    ("U.S. Treasury Sec. James Baker said the U.S. economy would grow in 1987. Inc. and Co. Ltd. are in (parentheses) "
+     "and [brackets].",
+     ["U.S.", "Treasury", "Sec.", "James", "Baker", "said", "the", "U.S.", "economy", "would", "grow", "in", "1987.",
+      "Inc.", "and", "Co.", "Ltd.", "are", "in", "(", "parentheses", ")", "and", "[", "brackets", "]", "."]),
+    ("Shares of Texaco Inc. fell 2-1/8 to 31-3/4 in active trading.",
+     ["Shares", "of", "Texaco", "Inc.", "fell", "2-1/8", "to", "31-3/4", "in", "active", "trading", "."]),
+    ("“Curly quotes” and ‘single ones’ — and «guillemets».",
+     ["“", "Curly", "quotes", "”", "and", "‘", "single", "ones", "’", "—", "and", "«", "guillemets", "»", "."]),
+    ("He asked: why? Nobody knew! (Not even him.)",
+     ["He", "asked", ":", "why", "?", "Nobody", "knew", "!", "(", "Not", "even", "him", ".", ")"]),
+    ("The price, quoted in yen/dlr, was 150.25-30, unchanged.",
+     ["The", "price", ",", "quoted", "in", "yen/dlr", ",", "was", "150.25-30", ",", "unchanged", "."]),
+]
+
+# texts split into sentences, and their tokens
+TEXTS = [
+    ("He left at 5 p.m. yesterday. Prices fell.",
+     ["He", "left", "at", "5", "p.m.", "yesterday", ".", "Prices", "fell", "."]),
+    ("Net shr 1.50 dlrs vs 1.20 dlrs. Revs 10 mln. Mr. Smith said so.",
+     ["Net", "shr", "1.50", "dlrs", "vs", "1.20", "dlrs", ".", "Revs", "10", "mln", ".", "Mr.", "Smith", "said", "so",
+      "."]),
+    ("It rose 5 pct. The company said it was up.",
+     ["It", "rose", "5", "pct", ".", "The", "company", "said", "it", "was", "up", "."]),
+]
+
+# Reuters-like texts of several sentences, none of them ending with an abbreviation (see Tokenizer)
+REUTERS_TEXTS = [
+    "Texaco Inc said it raised the contract price it will pay for all grades of crude oil by 50 cts a barrel, effective "
+    "today. The increase brings Texaco's price for West Texas Intermediate to 18.00 dlrs a barrel. Reuter",
+    "The U.S. Agriculture Department said wheat exports rose 12 pct in the week. Officials declined to comment, saying "
+    "\"it's too early to tell.\" Shipments to the Soviet Union were not included. Reuter",
+    "Shr profit 1.23 dlrs vs loss 45 cts\nNet profit 12,345,000 vs loss 4,567,000\nRevs 456.7 mln vs 401.2 mln\n"
+    "NOTE: Mr. Smith, chairman of Acme Corp., said results were in line (see earlier story). Why? Costs fell sharply!",
+]
+
+
+def has_punkt():
+    """
+    :return: True if nltk and the punkt data word_tokenize() splits sentences with are installed.
+    """
+    if not importlib.util.find_spec("nltk"):
+        return False
+    from nltk.data import find
+
+    for resource in ["tokenizers/punkt_tab/english/", "tokenizers/punkt/english.pickle"]:
+        try:
+            find(resource)
+            return True
+        except LookupError:
+            pass
+    return False
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def test_sentences(self):
+        tokenizer = Tokenizer()
+        for sentence, tokens in SENTENCES:
+            self.assertEqual(tokenizer.tokenize_sentence(sentence), tokens, sentence)
+
+    def test_memoized_chunks(self):
+        # the same chunks, in another order, come out of the cache
+        tokenizer = Tokenizer()
+        for sentence, tokens in SENTENCES + SENTENCES[::-1]:
+            self.assertEqual(tokenizer.tokenize_sentence(sentence), tokens, sentence)
+        self.assertGreater(tokenizer.transform_chunk.cache_info().hits, 0)
+
+    def test_texts(self):
+        tokenizer = Tokenizer(regex=True)
+        for text, tokens in TEXTS:
+            self.assertEqual(tokenizer.tokenize(text), tokens, text)
+
+    @unittest.skipUnless(importlib.util.find_spec("nltk"), "nltk isn't installed")
+    def test_same_as_nltk(self):
+        from nltk.tokenize import NLTKWordTokenizer
+
+        nltk_tokenizer = NLTKWordTokenizer()
+        tokenizer = Tokenizer()
+        for sentence, _ in SENTENCES:
+            self.assertEqual(tokenizer.tokenize_sentence(sentence), nltk_tokenizer.tokenize(sentence), sentence)
+
+    @unittest.skipUnless(has_punkt(), "nltk or its punkt data isn't installed")
+    def test_same_as_word_tokenize(self):
+        from nltk.tokenize import word_tokenize
+
+        tokenizer = Tokenizer()
+        for text in REUTERS_TEXTS + [text for text, _ in TEXTS]:
+            self.assertEqual(tokenizer.tokenize_with_regex(text), word_tokenize(text), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+import unittest
+import importlib.util
+from types import SimpleNamespace
+
+# postings lists of terms that are their own stems, with documents of the same length and term frequency, so that
+# some of them have the same score
+INDEX = {
+    "oil": [(1, 2), (2, 1), (3, 1), (5, 2), (8, 1)],
+    "gold": [(2, 1), (3, 1), (4, 3), (8, 1)],
+    "wheat": [(6, 1), (7, 1)],
+}
+DOCUMENT_LENGTHS = {1: 10, 2: 10, 3: 10, 4: 12, 5: 10, 6: 8, 7: 8, 8: 10, 9: 20}
+QUERIES = ["oil", "oil gold", "gold wheat oil", "wheat", "corn"]
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy") and importlib.util.find_spec("nltk"), "numpy or nltk isn't installed")
+class TestVectorizedBM25(unittest.TestCase):
+
+    def setUp(self):
+        from classes.bm25 import BM25
+        from classes.vectorized_bm25 import VectorizedBM25
+
+        statistics = SimpleNamespace(document_lengths=DOCUMENT_LENGTHS,
+                                     average_document_length=sum(DOCUMENT_LENGTHS.values()) / len(DOCUMENT_LENGTHS))
+        self.bm25 = BM25(statistics, INDEX, len(DOCUMENT_LENGTHS))
+        self.vectorized_bm25 = VectorizedBM25(statistics, INDEX, len(DOCUMENT_LENGTHS))
+        # queries are already made of terms, so that nltk's stopwords aren't needed
+        for bm25 in [self.bm25, self.vectorized_bm25]:
+            bm25.get_query_terms = str.split
+
+    def assert_same_ranking(self, ranking, vectorized_ranking, message):
+        self.assertEqual([document_id for document_id, _ in vectorized_ranking], [document_id for document_id, _ in ranking], message)
+        for (_, score), (_, vectorized_score) in zip(ranking, vectorized_ranking):
+            self.assertAlmostEqual(vectorized_score, score, places=9, msg=message)
+
+    def test_top_k(self):
+        for query in QUERIES:
+            matches = len(self.bm25.top_k(query, len(DOCUMENT_LENGTHS)))
+            for k in [-1, 0, 1, 2, matches, matches + 1]:
+                self.assert_same_ranking(self.bm25.top_k(query, k), self.vectorized_bm25.top_k(query, k), "%s, k=%d" % (query, k))
+
+
+if __name__ == '__main__':
+    unittest.main()